@@ -81,7 +81,17 @@ class SwitchEnum:
 
 
 class LodItem:
-    def __init__(self, file_suffix: str, viewing_distance: int, collection: bpy.types.Collection):
+    def __init__(
+        self,
+        file_suffix: str,
+        viewing_distance: int,
+        collection: bpy.types.Collection,
+        cluster_max_triangles: int = 0,
+        cluster_max_size: float = 0.0,
+    ):
         self.file_suffix = file_suffix
         self.viewing_distance = viewing_distance
         self.collection = collection
+        # limits for splitting primitives into spatially compact clusters, 0 = no limit
+        self.cluster_max_triangles = cluster_max_triangles
+        self.cluster_max_size = cluster_max_size
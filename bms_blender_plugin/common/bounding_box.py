@@ -1,39 +1,48 @@
-from bms_blender_plugin.common.coordinates import vector_to_bms_coords
+import numpy as np
+from mathutils import Matrix, Vector
+
+from bms_blender_plugin.common.bounding_volumes import get_aabb, get_mesh_vertices, get_obb, transform_points
+from bms_blender_plugin.common.coordinates import BMS_VECTOR_TRANSFORM_MATRIX
 
 class BoundingBox:
-    """Represents a bounding box. Each instance is a single bounding box. Calculates core attributes on init."""
+    """Represents a bounding box. Each instance is a single bounding box. Calculates core attributes on init.
+    The vertices are kept as float64 arrays of shape (n, 3). Optionally, an oriented box of the vertices in BMS
+    coordinates is calculated as well."""
 
-    def __init__(self,obj):
+    def __init__(self, obj, oriented=False):
         self.blender_coords = self.get_blender_vertices(obj)
         self.bms_coords = self.transform_blender_vertices(self.blender_coords)
         self.min_bms_vertex = self.get_min_vertex(self.bms_coords)
         self.max_bms_vertex = self.get_max_vertex(self.bms_coords)
 
+        self.obb_center = None
+        self.obb_axes = None
+        self.obb_half_extents = None
+        if oriented:
+            center, axes, half_extents = get_obb(self.bms_coords)
+            self.obb_center = Vector(center)
+            self.obb_axes = Matrix(axes)
+            self.obb_half_extents = Vector(half_extents)
+
     def get_blender_vertices(self, obj):
         """Returns the vertices of the object in the world coordinate system"""
-        vertices = [obj.matrix_world.inverted() @ vertex.co for vertex in obj.data.vertices]
-        return vertices
+        return transform_points(get_mesh_vertices(obj), obj.matrix_world)
 
     def transform_blender_vertices(self, blender_vertices):
         """Transforms the vertices of the object to the BMS coordinate system"""
-        transformed_vertices = [vector_to_bms_coords(vertex) for vertex in blender_vertices]
-        return transformed_vertices
+        return blender_vertices @ np.array(BMS_VECTOR_TRANSFORM_MATRIX, dtype=np.float64)
 
     def get_min_vertex(self, bms_coords):
-        """ Assuming a simple cube primitive, the min vertex will always be the one with the smallest sum of coordinates."""
-        min_vector = bms_coords[0]
-        for vector in bms_coords[1:]:
-            if sum(min_vector) > sum(vector):
-                min_vector = vector
-        return min_vector
+        """Returns the minimum of each axis (the min corner of the axis aligned box) or the origin without vertices"""
+        if len(bms_coords) == 0:
+            return Vector((0, 0, 0))
+        return Vector(get_aabb(bms_coords)[0])
 
     def get_max_vertex(self, bms_coords):
-        """ Assuming a simple cube primitive, the max vertex will always be the one with the largest sum of coordinates."""
-        max_vector = bms_coords[0]
-        for vector in bms_coords[1:]:
-            if sum(max_vector) < sum(vector):
-                max_vector = vector
-        return max_vector
+        """Returns the maximum of each axis (the max corner of the axis aligned box) or the origin without vertices"""
+        if len(bms_coords) == 0:
+            return Vector((0, 0, 0))
+        return Vector(get_aabb(bms_coords)[1])
 
     def bbox_to_txtpb_format(self):
         """Returns a string representation of the bounding box in the correct format for <AC>.txtpb files."""
@@ -0,0 +1,269 @@
+import random
+
+import numpy as np
+
+# points which are this much (relative to the radius) outside of a sphere still count as inside
+SPHERE_TOLERANCE = 1e-7
+
+# maximum amount of points outside of the current sphere which are added to the support set per iteration
+SPHERE_SUPPORT_BATCH = 64
+
+# split planes which are evaluated per axis when a cluster of hitbox points is split
+CLUSTER_SPLIT_BINS = 64
+
+
+def get_mesh_vertices(obj):
+    """Returns the local vertex coordinates of a mesh object as a float64 array of shape (n, 3)"""
+    if obj.type != "MESH" or not obj.data:
+        return np.empty((0, 3), dtype=np.float64)
+
+    vertices = np.empty(len(obj.data.vertices) * 3, dtype=np.float32)
+    obj.data.vertices.foreach_get("co", vertices)
+    return vertices.reshape(-1, 3).astype(np.float64)
+
+
+def transform_points(points, matrix):
+    """Applies a 4x4 matrix (e.g. a Blender Matrix) to all points of an array of shape (n, 3)"""
+    matrix = np.array(matrix, dtype=np.float64)
+    return points @ matrix[:3, :3].T + matrix[:3, 3]
+
+
+def get_world_vertices(objects):
+    """Returns the world coordinates of all vertices of the mesh objects as a float64 array of shape (n, 3)"""
+    vertex_arrays = [
+        transform_points(get_mesh_vertices(obj), obj.matrix_world)
+        for obj in objects
+        if obj.type == "MESH" and obj.data
+    ]
+    if not vertex_arrays:
+        return np.empty((0, 3), dtype=np.float64)
+    return np.concatenate(vertex_arrays)
+
+
+def _get_sphere_through(boundary):
+    """Returns the smallest sphere with all (up to 4) boundary points on its surface as a tuple (center, radius)"""
+    if len(boundary) == 0:
+        return None, -1.0
+    origin = boundary[0]
+    if len(boundary) == 1:
+        return origin, 0.0
+
+    # the center is origin + edges.T @ weights with the same distance to all points
+    edges = np.array(boundary[1:]) - origin
+    weights = np.linalg.lstsq(edges @ edges.T, 0.5 * np.sum(edges * edges, axis=1), rcond=None)[0]
+    center = origin + edges.T @ weights
+    radius = max(np.linalg.norm(point - center) for point in boundary)
+    return center, radius
+
+
+def _is_outside(center, radius, point):
+    return center is None or np.linalg.norm(point - center) > radius * (1 + SPHERE_TOLERANCE) + SPHERE_TOLERANCE
+
+
+def _welzl(points, boundary):
+    """Recursive Welzl's algorithm (without move-to-front) for a small list of points"""
+    center, radius = _get_sphere_through(boundary)
+    if len(boundary) == 4:
+        return center, radius
+
+    for index, point in enumerate(points):
+        if _is_outside(center, radius, point):
+            center, radius = _welzl(points[:index], [*boundary, point])
+    return center, radius
+
+
+def get_ritter_sphere(points):
+    """Ritter's bounding sphere: a sphere around two distant points which is grown until it contains all points.
+    Returns a tuple (center, radius, indices of the points which defined the sphere)."""
+    # a point far away from the first one, then the point farthest away from that one
+    first = np.argmax(np.sum((points - points[0]) ** 2, axis=1))
+    second = np.argmax(np.sum((points - points[first]) ** 2, axis=1))
+    center = (points[first] + points[second]) / 2
+    radius = np.linalg.norm(points[second] - points[first]) / 2
+    indices = [first, second]
+
+    while True:
+        distances = np.linalg.norm(points - center, axis=1)
+        farthest = np.argmax(distances)
+        if distances[farthest] <= radius * (1 + SPHERE_TOLERANCE) + SPHERE_TOLERANCE:
+            return center, radius, indices
+
+        # grow the sphere just enough to touch the farthest point
+        new_radius = (radius + distances[farthest]) / 2
+        center = center + (points[farthest] - center) * ((new_radius - radius) / distances[farthest])
+        radius = new_radius
+        indices.append(farthest)
+
+
+def get_minimal_bounding_sphere(points):
+    """Returns the exact minimal bounding sphere of an array of points of shape (n, 3) as a tuple (center, radius).
+    The Ritter sphere and the extreme points of each axis form a support set. Welzl's algorithm finds the minimal
+    sphere of the support set, the points outside of it are added to the set until the sphere contains all points."""
+    points = np.asarray(points, dtype=np.float64)
+    if len(points) == 0:
+        return None, 0.0
+
+    _, _, ritter_indices = get_ritter_sphere(points)
+    support_indices = {int(index) for index in ritter_indices}
+    support_indices.update(int(index) for index in np.argmin(points, axis=0))
+    support_indices.update(int(index) for index in np.argmax(points, axis=0))
+
+    while True:
+        support = [points[index] for index in support_indices]
+        # Welzl's algorithm runs in expected linear time for a random order
+        random.Random(len(support)).shuffle(support)
+        center, radius = _welzl(support, [])
+
+        distances = np.linalg.norm(points - center, axis=1)
+        outside = np.flatnonzero(distances > radius * (1 + SPHERE_TOLERANCE) + SPHERE_TOLERANCE)
+        outside = outside[np.array([index not in support_indices for index in outside], dtype=bool)]
+        if len(outside) == 0:
+            # the tolerance (and degenerate boundary points) must never leave a point outside
+            return center, float(distances.max())
+
+        farthest = outside[np.argsort(distances[outside])[-SPHERE_SUPPORT_BATCH:]]
+        support_indices.update(int(index) for index in farthest)
+
+
+def get_aabb(points):
+    """Returns the axis aligned bounding box of an array of points of shape (n, 3) as a tuple (min, max)"""
+    points = np.asarray(points, dtype=np.float64)
+    return points.min(axis=0), points.max(axis=0)
+
+
+def get_obb(points):
+    """Returns an oriented bounding box of an array of points of shape (n, 3) as a tuple (center, axes, half extents).
+    The axes (rows of a 3x3 array) are the principal axes of the points - if the axis aligned box is not larger, it is
+    used instead."""
+    points = np.asarray(points, dtype=np.float64)
+    aabb_min, aabb_max = get_aabb(points)
+    aabb = ((aabb_min + aabb_max) / 2, np.identity(3), (aabb_max - aabb_min) / 2)
+    if len(points) < 4:
+        return aabb
+
+    centered = points - points.mean(axis=0)
+    # eigh sorts by eigenvalue, the largest spread becomes the first axis
+    _, eigenvectors = np.linalg.eigh(centered.T @ centered)
+    axes = eigenvectors.T[::-1]
+    if np.linalg.det(axes) < 0:
+        axes[2] = -axes[2]
+
+    projected = points @ axes.T
+    projected_min, projected_max = get_aabb(projected)
+    half_extents = (projected_max - projected_min) / 2
+    if np.prod(half_extents) >= np.prod(aabb[2]):
+        return aabb
+
+    center = ((projected_min + projected_max) / 2) @ axes
+    return center, axes, half_extents
+
+
+def get_box_surface_area(points):
+    """Surface area of the axis aligned bounding box of an array of points of shape (n, 3)"""
+    if len(points) == 0:
+        return 0.0
+    size = np.ptp(points, axis=0)
+    return 2 * (size[0] * size[1] + size[1] * size[2] + size[2] * size[0])
+
+
+def get_connected_components(vertex_count, edges):
+    """Labels each vertex with the smallest vertex index of its connected component.
+
+    edges is an int array of shape (n, 2) with the vertex indices of each edge.
+    Returns an int array of the component label of each vertex."""
+    labels = np.arange(vertex_count)
+    if len(edges) == 0:
+        return labels
+
+    while True:
+        # propagate the smaller label across each edge, then jump to the label of the label
+        edge_labels = np.minimum(labels[edges[:, 0]], labels[edges[:, 1]])
+        new_labels = labels.copy()
+        np.minimum.at(new_labels, edges[:, 0], edge_labels)
+        np.minimum.at(new_labels, edges[:, 1], edge_labels)
+        new_labels = new_labels[new_labels]
+        if np.array_equal(new_labels, labels):
+            return labels
+        labels = new_labels
+
+
+def _get_best_split(points):
+    """Finds the axis aligned plane which splits the points into the two boxes with the smallest total surface area
+    (binned surface area heuristic). Returns a tuple (surface area gain, boolean array of the points on the upper
+    side) or (0, None) if no split reduces the surface area."""
+    best_gain = 0.0
+    best_upper = None
+    parent_area = get_box_surface_area(points)
+
+    for axis in range(3):
+        coordinates = points[:, axis]
+        low, high = coordinates.min(), coordinates.max()
+        if high <= low:
+            continue
+        bins = np.minimum(((coordinates - low) / (high - low) * CLUSTER_SPLIT_BINS).astype(np.int64),
+                          CLUSTER_SPLIT_BINS - 1)
+
+        bin_min = np.full((CLUSTER_SPLIT_BINS, 3), np.inf)
+        bin_max = np.full((CLUSTER_SPLIT_BINS, 3), -np.inf)
+        np.minimum.at(bin_min, bins, points)
+        np.maximum.at(bin_max, bins, points)
+
+        # boxes of all bins below (prefix) and above (suffix) each plane
+        lower_min = np.minimum.accumulate(bin_min)[:-1]
+        lower_max = np.maximum.accumulate(bin_max)[:-1]
+        upper_min = np.minimum.accumulate(bin_min[::-1])[::-1][1:]
+        upper_max = np.maximum.accumulate(bin_max[::-1])[::-1][1:]
+
+        def _get_areas(box_min, box_max):
+            size = np.where(np.isfinite(box_min), box_max - box_min, 0)
+            return 2 * (size[:, 0] * size[:, 1] + size[:, 1] * size[:, 2] + size[:, 2] * size[:, 0])
+
+        # both sides need points
+        valid = np.isfinite(lower_min[:, 0]) & np.isfinite(upper_min[:, 0])
+        gains = np.where(valid, parent_area - _get_areas(lower_min, lower_max) - _get_areas(upper_min, upper_max), 0)
+        plane = int(np.argmax(gains))
+        if gains[plane] > best_gain:
+            best_gain = gains[plane]
+            best_upper = bins > plane
+
+    return best_gain, best_upper
+
+
+def cluster_points(points, component_labels, count):
+    """Splits points into up to count clusters for tight bounding boxes. Starting with all points, the cluster whose
+    best split plane saves the most box surface area is split until there are enough clusters (surface area
+    heuristic). Connected components which are smaller than an average cluster are never split, they stay with
+    the side of most of their vertices.
+    Returns an int array of the cluster index of each point (the indices are consecutive from 0)."""
+    points = np.asarray(points, dtype=np.float64)
+    labels = np.zeros(len(points), dtype=np.int64)
+    if len(points) == 0:
+        return labels
+
+    _, component_indices, component_sizes = np.unique(component_labels, return_inverse=True, return_counts=True)
+    is_small_component = component_sizes[component_indices] < len(points) / max(1, count)
+
+    cluster_count = 1
+    splits = {0: _get_best_split(points)}
+    while cluster_count < count:
+        cluster = max(splits, key=lambda index: splits[index][0])
+        gain, upper = splits[cluster]
+        if upper is None or gain <= 0:
+            break
+
+        indices = np.flatnonzero(labels == cluster)
+        # small components move to the side of most of their vertices
+        upper_votes = np.bincount(component_indices[indices], weights=upper, minlength=len(component_sizes))
+        total_votes = np.bincount(component_indices[indices], minlength=len(component_sizes))
+        component_upper = upper_votes * 2 > total_votes
+        upper = np.where(is_small_component[indices], component_upper[component_indices[indices]], upper)
+        if upper.all() or not upper.any():
+            splits[cluster] = (0.0, None)
+            continue
+
+        labels[indices[upper]] = cluster_count
+        splits[cluster] = _get_best_split(points[indices[~upper]])
+        splits[cluster_count] = _get_best_split(points[indices[upper]])
+        cluster_count += 1
+
+    return labels
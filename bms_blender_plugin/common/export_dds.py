@@ -4,8 +4,8 @@ import shutil
 import tempfile
 
 import bpy
-import numpy as np
 
+from bms_blender_plugin.common.image_pixels import flip_region, get_image_pixels, set_image_pixels
 from bms_blender_plugin.ext.blender_dds_addon.directx.dds import is_hdr, DDS
 from bms_blender_plugin.ext.blender_dds_addon.directx.texconv import Texconv
 
@@ -38,14 +38,7 @@ def save_dds(tex, file, dds_fmt, invert_normals=False, no_mip=False,
     is_array = "array" in texture_type
     is_3d = texture_type == "volume"
 
-    # Check color space
-    color_space = tex.colorspace_settings.name
-    if 'SRGB' in dds_fmt and color_space != 'sRGB':
-        print("Warning: Specified DXGI format uses sRGB as a color space,"
-              f"but the texture uses {color_space} in Blender")
-    elif 'SRGB' not in dds_fmt and color_space not in ['Non-Color', 'Raw']:
-        print("Warning: Specified DXGI format does not use any color space conversion,"
-              f"but the texture uses {color_space} in Blender")
+    check_color_space(tex, dds_fmt)
 
     if is_hdr(dds_fmt):
         ext = '.hdr'
@@ -89,10 +82,10 @@ def save_dds(tex, file, dds_fmt, invert_normals=False, no_mip=False,
         elif cubemap_layout == "v-cross-fnz":
             offset = [1, 0]
         temp_tex = tex.copy()
-        pix = np.array(tex.pixels).reshape(h, w, -1)
+        pix = get_image_pixels(tex)
         x, y = [c * face_size for c in offset]
-        pix[y: y + face_size, x: x + face_size] = pix[y: y + face_size, x: x + face_size][::-1, ::-1]
-        temp_tex.pixels = list(pix.flatten())
+        flip_region(pix, x, y, face_size, face_size)
+        set_image_pixels(temp_tex, pix)
         return temp_tex
 
     def save_temp_dds(tex, temp_dir, ext, fmt, texconv, verbose=True):
@@ -140,9 +133,13 @@ def save_dds(tex, file, dds_fmt, invert_normals=False, no_mip=False,
                 dds_path_list.append(temp_dds)
 
             if (is_array or is_3d) and len(dds_path_list) > 1:
-                dds_list = [DDS.load(dds_path) for dds_path in dds_path_list]
-                dds = DDS.assemble(dds_list, is_array=is_array)
-                dds.save(file)
+                # the slices are streamed from the mapped files, so only one of them is in memory at a time
+                dds_list = [DDS.load(dds_path, mmap_mode=True) for dds_path in dds_path_list]
+                try:
+                    DDS.assemble(dds_list, is_array=is_array).save(file)
+                finally:
+                    for dds in dds_list:
+                        dds.close()
             else:
                 shutil.copyfile(dds_path_list[0], file)
 
@@ -154,6 +151,17 @@ def save_dds(tex, file, dds_fmt, invert_normals=False, no_mip=False,
     return tex
 
 
+def check_color_space(tex, dds_fmt):
+    """Warns if the color space of a texture does not match the DXGI format."""
+    color_space = tex.colorspace_settings.name
+    if 'SRGB' in dds_fmt and color_space != 'sRGB':
+        print("Warning: Specified DXGI format uses sRGB as a color space,"
+              f"but the texture uses {color_space} in Blender")
+    elif 'SRGB' not in dds_fmt and color_space not in ['Non-Color', 'Raw']:
+        print("Warning: Specified DXGI format does not use any color space conversion,"
+              f"but the texture uses {color_space} in Blender")
+
+
 def save_texture(tex, file, fmt):
     """Save a texture.
 
@@ -14,8 +14,19 @@ class ExportSettings:
         export_unused_materials: bool = True,
         export_textures: bool = True,
         allow_slow_texture_codecs: bool = False,
+        texture_mip_filter: str = "LINEAR",
+        texture_quality: str = "FINAL",
+        draft_texture_size: int = 1024,
         export_parent_dat: bool = True,
-        export_hotspots: bool = True
+        bounding_sphere_lod_only: bool = False,
+        export_hotspots: bool = True,
+        bounded_memory: bool = False,
+        parallel_lods: bool = False,
+        lod_workers: int = 0,
+        incremental: bool = False,
+        texture_workers: int = 0,
+        texture_cache_directory: str = "",
+        texture_cache_size: int = 0
     ):
         self.export_models = export_models
         self.compression = compression
@@ -26,5 +37,28 @@ class ExportSettings:
         self.export_unused_materials = export_unused_materials
         self.export_textures = export_textures
         self.allow_slow_texture_codecs = allow_slow_texture_codecs
+        self.texture_mip_filter = texture_mip_filter
+        self.texture_quality = texture_quality
+        self.draft_texture_size = draft_texture_size
         self.export_parent_dat = export_parent_dat
+        self.bounding_sphere_lod_only = bounding_sphere_lod_only
         self.export_hotspots = export_hotspots
+        self.bounded_memory = bounded_memory
+        self.parallel_lods = parallel_lods
+        self.lod_workers = lod_workers
+        self.incremental = incremental
+        self.texture_workers = texture_workers
+        self.texture_cache_directory = texture_cache_directory
+        self.texture_cache_size = texture_cache_size
+
+    def to_dict(self):
+        """Returns the settings as a JSON serializable dict, e.g. to pass them to a background export"""
+        settings = dict(vars(self))
+        settings["compression"] = self.compression.name
+        return settings
+
+    @classmethod
+    def from_dict(cls, settings):
+        settings = dict(settings)
+        settings["compression"] = Compression[settings["compression"]]
+        return cls(**settings)
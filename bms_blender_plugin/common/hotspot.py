@@ -45,6 +45,32 @@ class Hotspot:
         self.blender_coords = Vector((self.blend_x, self.blend_y, self.blend_z))
         self.bms_coords = vector_to_bms_coords(self.blender_coords)
 
+    def to_dict(self):
+        """Returns the hotspot as a JSON serializable dict"""
+        return {
+            "callback_id": self.callback_id,
+            "x": self.blend_x,
+            "y": self.blend_y,
+            "z": self.blend_z,
+            "size": self.size,
+            "sound_id": self.sound_id,
+            "mouse_button": self.mouse_button.value,
+            "button_type": self.button_type.value,
+        }
+
+    @classmethod
+    def from_dict(cls, hotspot):
+        return cls(
+            hotspot["callback_id"],
+            hotspot["x"],
+            hotspot["y"],
+            hotspot["z"],
+            hotspot["size"],
+            hotspot["sound_id"],
+            MouseButton(hotspot["mouse_button"]),
+            ButtonType(hotspot["button_type"]),
+        )
+
     def __str__(self):
         """"Format according to 3dButtons.dat.
         BMS should have no problems reading different amounts of spaces, but it looks prettier..."""
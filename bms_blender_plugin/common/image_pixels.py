@@ -0,0 +1,26 @@
+import numpy as np
+
+
+def get_image_pixels(image, out=None):
+    """Reads the pixels of an image with foreach_get, without creating a Python float per pixel.
+    Returns a float32 array of shape (height, width, channels) with the rows from bottom to top (as Blender stores
+    them). A preallocated float32 array of the right size can be passed as out to reuse its memory."""
+    width, height = image.size
+    channels = image.channels
+    if out is None:
+        out = np.empty(width * height * channels, dtype=np.float32)
+    image.pixels.foreach_get(out.reshape(-1))
+    return out.reshape(height, width, channels)
+
+
+def set_image_pixels(image, pixels):
+    """Writes a float32 array of shape (height, width, channels) (rows from bottom to top) into an image with
+    foreach_set. The array is only copied if it is not a contiguous float32 array."""
+    image.pixels.foreach_set(np.ascontiguousarray(pixels, dtype=np.float32).reshape(-1))
+
+
+def flip_region(pixels, x, y, width, height):
+    """Rotates a rectangular region of a pixel array by 180 degrees in place, e.g. the -Z face of a cubemap"""
+    region = pixels[y: y + height, x: x + width]
+    region[:] = region[::-1, ::-1].copy()
+    return pixels
@@ -1,18 +1,21 @@
 """Source: https://github.com/matyalatte/Blender-DDS-Addon/blob/main/addons/blender_dds_addon/ui/import_dds.py"""
 
 import bpy
-import numpy as np
 
 import os
 import shutil
 import tempfile
 
+from bms_blender_plugin.common.image_pixels import flip_region, get_image_pixels, set_image_pixels
+from bms_blender_plugin.ext.blender_dds_addon.directx import bc_decoder
 from bms_blender_plugin.ext.blender_dds_addon.directx.dds import DDSHeader, DDS
 from bms_blender_plugin.ext.blender_dds_addon.directx.texconv import Texconv
 
 
 def load_dds(file, invert_normals=False, cubemap_layout='h-cross', texconv=None):
     """Import a texture form .dds file.
+    Formats which the built-in decoder supports are decoded directly, texconv is only used for other formats and
+    cubemaps.
 
     Args:
         file (string): file path to .dds file
@@ -23,6 +26,10 @@ def load_dds(file, invert_normals=False, cubemap_layout='h-cross', texconv=None)
     Returns:
         tex (bpy.types.Image): loaded texture
     """
+    dds_header = DDSHeader.read_from_file(file)
+    if bc_decoder.is_supported(dds_header.dxgi_format) and not dds_header.is_cube():
+        return decode_dds(file, invert_normals=invert_normals)
+
     tex_list = []
     try:
         with tempfile.TemporaryDirectory() as temp_dir:
@@ -44,16 +51,20 @@ def load_dds(file, invert_normals=False, cubemap_layout='h-cross', texconv=None)
 
             # Disassemble if it's a non-2D texture
             if dds_header.is_3d() or dds_header.is_array():
-                dds = DDS.load(temp)
-                dds_list = dds.get_disassembled_dds_list()
-                base_name = os.path.basename(temp)
-                for new_dds, i in zip(dds_list, range(len(dds_list))):
-                    new_name = ".".join(base_name.split(".")[:-1])
-                    if i >= 1:
-                        new_name += f"-{i}"
-                    new_name += ".dds"
-                    new_path = os.path.join(temp_dir, new_name)
-                    new_dds.save(new_path)
+                with DDS.load(temp, mmap_mode=True) as dds:
+                    dds_list = dds.get_disassembled_dds_list()
+                    base_name = os.path.basename(temp)
+                    new_path_list = []
+                    for new_dds, i in zip(dds_list, range(len(dds_list))):
+                        new_name = ".".join(base_name.split(".")[:-1])
+                        if i >= 1:
+                            new_name += f"-{i}"
+                        new_name += ".dds"
+                        new_path = os.path.join(temp_dir, new_name)
+                        new_dds.save(new_path)
+                        new_path_list.append(new_path)
+
+                for new_path in new_path_list:
                     tga = texconv.convert_to_tga(new_path, out=temp_dir, cubemap_layout=cubemap_layout,
                                                  invert_normals=invert_normals)
                     tga_list.append(tga)
@@ -76,27 +87,88 @@ def load_dds(file, invert_normals=False, cubemap_layout='h-cross', texconv=None)
             if cubemap_layout.endswith("-fnz"):
                 # Flip -z face for cubemaps
                 w, h = tex.size
-                pix = np.array(tex.pixels).reshape((h, w, -1))
+                pix = get_image_pixels(tex)
                 if cubemap_layout[0] == "v":
-                    pix[h//4 * 0: h//4 * 1, w//3 * 1: w//3 * 2] = \
-                        (pix[h//4 * 0: h//4 * 1, w//3 * 1: w//3 * 2])[::-1, ::-1]
+                    flip_region(pix, w//3 * 1, h//4 * 0, w//3, h//4)
                 else:
-                    pix[h//3 * 1: h//3 * 2, w//4 * 3: w//4 * 4] = \
-                        (pix[h//3 * 1: h//3 * 2, w//4 * 3: w//4 * 4])[::-1, ::-1]
-                pix = pix.flatten()
-                tex.pixels = list(pix)
+                    flip_region(pix, w//4 * 3, h//3 * 1, w//4, h//3)
+                set_image_pixels(tex, pix)
 
             tex.update()
 
-    except Exception as e:
+    except Exception:
         for tex in tex_list:
             if tex is not None:
                 bpy.data.images.remove(tex)
-        raise e
+        raise
+
+    return tex_list[0]
+
+
+def decode_dds(file, invert_normals=False):
+    """Import a texture from a .dds file with the built-in decoder. The pixels are assigned directly, without
+    temporary files or texconv. Array and volume textures are imported as one texture per slice.
+
+    Args:
+        file (string): file path to .dds file
+        invert_normals (bool): Flip y axis if the texture is normal map.
+
+    Returns:
+        tex (bpy.types.Image): loaded texture (the first slice)
+    """
+    base_name = ".".join(os.path.basename(file).split(".")[:-1])
+    tex_list = []
+    try:
+        # the slices are decoded one after another straight from the mapped file
+        with DDS.load(file, mmap_mode=True) as dds:
+            dds_header = dds.header
+
+            if dds_header.is_srgb():
+                color_space = 'sRGB'
+            else:
+                color_space = 'Non-Color'
+
+            for i in range(len(dds.slice_bin_list)):
+                # release the view right away, so the mapped file can be closed
+                with dds.get_mip(i) as mip:
+                    pixels = bc_decoder.decode(
+                        mip, dds_header.dxgi_format, dds_header.width, dds_header.height,
+                        invert_normals=invert_normals
+                    )
+                name = base_name if i == 0 else f"{base_name}-{i}"
+                tex_list.append(new_texture(pixels, name, color_space=color_space))
+
+    except Exception:
+        for tex in tex_list:
+            bpy.data.images.remove(tex)
+        raise
 
     return tex_list[0]
 
 
+def new_texture(pixels, name, color_space='Non-Color'):
+    """Create a texture from decoded pixels. It is packed as PNG.
+
+    Args:
+        pixels (numpy.ndarray): float32 array of shape (height, width, 4), rows from top to bottom
+        name (string): object name for the texture
+        color_space (string): color space
+
+    Returns:
+        tex (bpy.types.Image): new texture
+    """
+    height, width = pixels.shape[:2]
+    tex = bpy.data.images.new(name, width, height, alpha=True)
+    tex.colorspace_settings.name = color_space
+    # Blender stores the rows from bottom to top
+    set_image_pixels(tex, pixels[::-1])
+    tex.pack()
+    tex.filepath = os.path.join('//textures', tex.name + '.png')
+    tex.filepath_raw = tex.filepath
+    tex.update()
+    return tex
+
+
 def load_texture(file, name, color_space='Non-Color'):
     """Load a texture file.
 
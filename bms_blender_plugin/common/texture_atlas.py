@@ -0,0 +1,165 @@
+import numpy as np
+
+from bms_blender_plugin.common.bml_material import Slot
+
+# padded tiles start and end at the 4x4 blocks of the compressed textures, so no block mixes two tiles
+ATLAS_BLOCK_SIZE = 4
+
+# UVs which are this far outside of 0..1 repeat the texture and can not be moved into an atlas
+ATLAS_UV_TOLERANCE = 0.001
+
+# the color of a texture slot which a material of the atlas does not have
+ATLAS_DEFAULT_COLORS = {
+    Slot.ALBEDO: (1, 1, 1, 1),
+    # no occlusion, fully rough, not metallic, dry
+    Slot.ARMW: (1, 1, 0, 0),
+    # flat tangent space normal
+    Slot.NORMAL_MAP: (0.5, 0.5, 1, 1),
+    Slot.EMISSIVE: (0, 0, 0, 1),
+}
+
+
+class AtlasTile:
+    """Place of the textures of a single material in an atlas, in pixels from the bottom left corner (as Blender
+    stores its images). The padding around the tile is not part of its size."""
+    name: str
+    width: int
+    height: int
+    x: int
+    y: int
+
+    def __init__(self, name, width, height):
+        self.name = name
+        self.width = width
+        self.height = height
+        self.x = None
+        self.y = None
+
+    def __repr__(self):
+        return f"{self.name}: {self.width}x{self.height} at {self.x}, {self.y}"
+
+    def remap_uvs(self, uvs, atlas_width, atlas_height):
+        """Moves UVs from 0..1 of the original texture into the tile. Returns a new float32 array of shape (n, 2)."""
+        scale = np.array([self.width / atlas_width, self.height / atlas_height], dtype=np.float32)
+        offset = np.array([self.x / atlas_width, self.y / atlas_height], dtype=np.float32)
+        return uvs * scale + offset
+
+
+def _align(value):
+    return (value + ATLAS_BLOCK_SIZE - 1) // ATLAS_BLOCK_SIZE * ATLAS_BLOCK_SIZE
+
+
+def is_uv_range_atlas_compatible(uvs):
+    """Returns whether all UVs are within 0..1 - textures which are repeated can not be moved into an atlas"""
+    return len(uvs) == 0 or (
+        uvs.min() >= -ATLAS_UV_TOLERANCE and uvs.max() <= 1 + ATLAS_UV_TOLERANCE
+    )
+
+
+def _get_padded_size(size, padding):
+    return _align(size + 2 * padding)
+
+
+def _pack_shelves(tiles, padding, atlas_width, atlas_height):
+    """Places the tiles in rows from the bottom to the top. Returns False if they do not fit."""
+    x = 0
+    shelf_y = 0
+    shelf_height = 0
+    for tile in tiles:
+        padded_width = _get_padded_size(tile.width, padding)
+        padded_height = _get_padded_size(tile.height, padding)
+        if padded_width > atlas_width:
+            return False
+
+        if x + padded_width > atlas_width:
+            x = 0
+            shelf_y += shelf_height
+            shelf_height = 0
+        if shelf_y + padded_height > atlas_height:
+            return False
+
+        tile.x = x + padding
+        tile.y = shelf_y + padding
+        x += padded_width
+        shelf_height = max(shelf_height, padded_height)
+    return True
+
+
+def pack_tiles(tiles, padding, max_size):
+    """Places all tiles in the smallest power of two atlas which they fit in (by shelf packing, highest tiles first).
+    Each tile is surrounded by its padding and starts at a 4x4 block.
+    Returns the width and height of the atlas or None if the tiles do not fit into max_size."""
+    sorted_tiles = sorted(tiles, key=lambda tile: (tile.height, tile.width), reverse=True)
+    area = sum(_get_padded_size(tile.width, padding) * _get_padded_size(tile.height, padding) for tile in tiles)
+
+    atlas_width = ATLAS_BLOCK_SIZE
+    atlas_height = ATLAS_BLOCK_SIZE
+    while atlas_width <= max_size and atlas_height <= max_size:
+        if atlas_width * atlas_height >= area and _pack_shelves(sorted_tiles, padding, atlas_width, atlas_height):
+            return atlas_width, atlas_height
+
+        # grow the atlas alternately in width and height, so it stays close to a square
+        if atlas_width <= atlas_height:
+            atlas_width *= 2
+        else:
+            atlas_height *= 2
+
+    return None
+
+
+def resize_pixels(pixels, width, height):
+    """Bilinear resize of a float32 array of shape (height, width, channels)"""
+    source_height, source_width = pixels.shape[:2]
+    if (source_width, source_height) == (width, height):
+        return pixels
+
+    def _get_samples(source_size, size):
+        # sample at the pixel centers
+        positions = np.clip((np.arange(size) + 0.5) * source_size / size - 0.5, 0, source_size - 1)
+        lower = np.floor(positions).astype(np.int64)
+        upper = np.minimum(lower + 1, source_size - 1)
+        return lower, upper, (positions - lower).astype(np.float32)
+
+    rows_lower, rows_upper, row_weights = _get_samples(source_height, height)
+    columns_lower, columns_upper, column_weights = _get_samples(source_width, width)
+
+    rows = (
+        pixels[rows_lower] * (1 - row_weights)[:, np.newaxis, np.newaxis]
+        + pixels[rows_upper] * row_weights[:, np.newaxis, np.newaxis]
+    )
+    return (
+        rows[:, columns_lower] * (1 - column_weights)[np.newaxis, :, np.newaxis]
+        + rows[:, columns_upper] * column_weights[np.newaxis, :, np.newaxis]
+    ).astype(np.float32)
+
+
+def build_atlas(tiles, tile_pixels, atlas_width, atlas_height, padding, default_color):
+    """Copies the textures of all tiles into an atlas.
+    The edge pixels of each texture are repeated into its padding (including the slack up to the next 4x4 block), so
+    neither the texture filtering nor the first mip levels blend a tile with its neighbours or the default color.
+
+    tile_pixels maps the name of each tile to a float32 array of shape (height, width, 4) (rows from bottom to top)
+    or None if the material has no texture in this slot - those tiles are filled with the default color.
+    Returns a float32 array of shape (atlas_height, atlas_width, 4)."""
+    atlas = np.empty((atlas_height, atlas_width, 4), dtype=np.float32)
+    atlas[:] = default_color
+
+    for tile in tiles:
+        pixels = tile_pixels.get(tile.name)
+        if pixels is None:
+            continue
+
+        if pixels.shape[2] < 4:
+            rgba_pixels = np.ones(pixels.shape[:2] + (4,), dtype=np.float32)
+            rgba_pixels[:, :, :pixels.shape[2]] = pixels
+            pixels = rgba_pixels
+
+        pixels = resize_pixels(pixels[:, :, :4], tile.width, tile.height)
+        padding_right = _get_padded_size(tile.width, padding) - tile.width - padding
+        padding_top = _get_padded_size(tile.height, padding) - tile.height - padding
+        atlas[
+            tile.y - padding: tile.y + tile.height + padding_top,
+            tile.x - padding: tile.x + tile.width + padding_right,
+        ] = np.pad(pixels, ((padding, padding_top), (padding, padding_right), (0, 0)), mode="edge")
+
+    return atlas
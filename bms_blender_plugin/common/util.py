@@ -8,7 +8,9 @@ import struct
 
 import lzma
 import math
-from mathutils import Vector
+
+import numpy as np
+from mathutils import Matrix, Vector
 
 from bms_blender_plugin.common.bml_structs import (
     Header,
@@ -24,9 +26,13 @@ from bms_blender_plugin.common.blender_types import (
 
 import xml.etree.ElementTree as ElementTree
 
+from bms_blender_plugin.common.bounding_volumes import get_minimal_bounding_sphere, get_world_vertices
 from bms_blender_plugin.common.hotspot import Callback
 from bms_blender_plugin.common.coordinates import to_bms_coords
 
+# custom property of export copies which share their mesh: the names of the modifiers which are applied later
+DEFERRED_MODIFIERS_PROPERTY = "bml_deferred_modifiers"
+
 
 def compress_lz_4(data):
     import lz4.frame
@@ -45,6 +51,78 @@ def compress_lzma(data):
     return output[:5] + output[13:]
 
 
+def compress_lzma_stream(input_file, output_file, chunk_size=1024 * 1024):
+    """Compresses a binary file object to BMS custom LZMA chunk by chunk.
+    Returns the amount of compressed bytes written."""
+    compressor = lzma.LZMACompressor(format=lzma.FORMAT_ALONE)
+    header = b""
+    written = 0
+
+    def _write(output):
+        nonlocal header, written
+        # strip the uncompressedSize from the LZMA header (see compress_lzma) before anything is written
+        if len(header) < 13:
+            header += output
+            if len(header) < 13:
+                return
+            output = header[:5] + header[13:]
+        output_file.write(output)
+        written += len(output)
+
+    while True:
+        chunk = input_file.read(chunk_size)
+        if not chunk:
+            break
+        _write(compressor.compress(chunk))
+    _write(compressor.flush())
+
+    return written
+
+
+def get_peak_memory_usage():
+    """Returns the peak memory usage (in bytes) of the Blender process since it was started or None if it can not be
+    determined"""
+    try:
+        if os.name == "nt":
+            import ctypes
+            from ctypes import wintypes
+
+            class ProcessMemoryCounters(ctypes.Structure):
+                _fields_ = [
+                    ("cb", wintypes.DWORD),
+                    ("PageFaultCount", wintypes.DWORD),
+                    ("PeakWorkingSetSize", ctypes.c_size_t),
+                    ("WorkingSetSize", ctypes.c_size_t),
+                    ("QuotaPeakPagedPoolUsage", ctypes.c_size_t),
+                    ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                    ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t),
+                    ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                    ("PagefileUsage", ctypes.c_size_t),
+                    ("PeakPagefileUsage", ctypes.c_size_t),
+                ]
+
+            counters = ProcessMemoryCounters()
+            counters.cb = ctypes.sizeof(counters)
+            get_process_memory_info = ctypes.windll.psapi.GetProcessMemoryInfo
+            get_process_memory_info.argtypes = [
+                wintypes.HANDLE, ctypes.POINTER(ProcessMemoryCounters), wintypes.DWORD
+            ]
+            if not get_process_memory_info(
+                ctypes.windll.kernel32.GetCurrentProcess(), ctypes.byref(counters), counters.cb
+            ):
+                return None
+            return counters.PeakWorkingSetSize
+
+        import resource
+        import sys
+
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # macOS reports bytes, Linux kilobytes
+        return peak if sys.platform == "darwin" else peak * 1024
+    except (ImportError, OSError, AttributeError):
+        return None
+
+
 def get_objcenter(obj, convert_to_bms_coords=True):
     """Returns the center of an object based on its vertices"""
     # https://blender.stackexchange.com/questions/62040/get-center-of-geometry-of-an-object
@@ -249,10 +327,10 @@ def get_non_translate_dof_parent(obj):
 
 
 def copy_collection_flat(
-    from_collection, to_collection, excluded_collections, scale_factor
+    from_collection, to_collection, excluded_collections, scale_factor, share_meshes=False
 ):
     """Copies a collection and all of its objects but not its child-collections.
-    Also applies a scale factor to its objects"""
+    Also applies a scale factor to its objects. See copy_object for shared meshes."""
     copied_object = None
 
     if from_collection not in excluded_collections:
@@ -260,12 +338,12 @@ def copy_collection_flat(
             if collection_object.parent is None:
                 # root object - copy that
                 copied_object = copy_object(
-                    collection_object, None, to_collection, scale_factor
+                    collection_object, None, to_collection, scale_factor, share_meshes
                 )
 
         for collection_child in from_collection.children:
             copy_collection_flat(
-                collection_child, to_collection, excluded_collections, scale_factor
+                collection_child, to_collection, excluded_collections, scale_factor, share_meshes
             )
 
         # toggle object mode to make sure that the scaling has been applied (Blender quirk)
@@ -292,15 +370,27 @@ def reset_dof(obj):
         obj.delta_scale.z = 1
 
 
-def copy_object(obj, parent, collection, scale_factor=1):
+def copy_object(obj, parent, collection, scale_factor=1, share_meshes=False):
     """Recursively copies an object and all of its children and moves their copies to a given collection.
-    Also applies a scale factor"""
+    Also applies a scale factor.
+    With shared meshes, no mesh is copied: the copies use the meshes of the originals and their modifiers are
+    disabled until apply_deferred_modifiers() applies them right before the object is extracted."""
     if not obj.hide_render and len(obj.users_collection) != 0:
         copied_object = obj.copy()
         copied_object.parent = parent
         copied_object.matrix_parent_inverse = obj.matrix_parent_inverse.copy()
 
-        if obj.data:
+        # linked duplicates without modifiers keep sharing their mesh: it is extracted once per datablock and never
+        # modified by the export
+        if share_meshes:
+            deferred_modifiers = []
+            for copied_modifier in copied_object.modifiers:
+                if copied_modifier.show_viewport:
+                    copied_modifier.show_viewport = False
+                    deferred_modifiers.append(copied_modifier.name)
+            if deferred_modifiers:
+                copied_object[DEFERRED_MODIFIERS_PROPERTY] = deferred_modifiers
+        elif obj.data and not is_instanced_mesh(obj):
             copied_object.data = copied_object.data.copy()
         for k, e in obj.items():
             copied_object[k] = e
@@ -341,46 +431,160 @@ def copy_object(obj, parent, collection, scale_factor=1):
         copied_object.hide_set(False)
 
         for obj_child in obj.children:
-            copy_object(obj_child, copied_object, collection, scale_factor)
+            copy_object(obj_child, copied_object, collection, scale_factor, share_meshes)
         return copied_object
 
 
-def apply_all_modifiers(collection):
-    """Applies all modifiers to objects which are rooted in the given collection"""
+def is_instanced_mesh(obj):
+    """Returns if an object is a plain mesh which can share its mesh datablock with other objects during the export"""
+    return (
+        obj.type == "MESH"
+        and obj.data is not None
+        and get_bml_type(obj, False) is None
+        and len(obj.modifiers) == 0
+        and not obj.data.shape_keys
+    )
+
+
+def make_mesh_single_user(obj):
+    """Gives an object its own copy of its mesh if the mesh is shared with other objects"""
+    if obj.type == "MESH" and obj.data and obj.data.users > 1:
+        obj.data = obj.data.copy()
+
+
+def apply_all_modifiers(collection, defer_meshes=False):
+    """Applies all modifiers and bakes the transforms of all objects which are rooted in the given collection.
+    The world matrices of the whole hierarchy are computed in one pass and baked straight into the mesh arrays, so no
+    operator (and no depsgraph update) is run per object.
+    Empties (DOFs, Slots and Hotspots) only get their scale applied, since baking their location or rotation would
+    reset their positions.
+    With deferred meshes (copies which share the meshes of the originals), no mesh is modified: meshes keep their
+    transform and their modifiers are applied later by apply_deferred_modifiers().
+    """
+    objects = []
+
+    def _collect_hierarchy(obj):
+        # parents are always collected before their children
+        objects.append(obj)
+        for child in obj.children:
+            _collect_hierarchy(child)
+
     for obj in collection.objects:
         if obj.parent is None:
-            apply_all_modifiers_on_obj(obj)
+            _collect_hierarchy(obj)
 
+    if len(objects) == 0:
+        return
 
-def apply_all_modifiers_on_obj(obj):
-    """Applies all modifiers to a single object.
-    Empties (DOFs, Slots and Switches) are excepted, since applying their modifiers would reset their positions.
-    """
-    if obj:
-        bpy.ops.object.select_all(action="DESELECT")
-        # apply the modifiers
-        obj.select_set(True)
-        bpy.context.view_layer.objects.active = obj
+    # a single depsgraph evaluation for the whole hierarchy
+    bpy.context.view_layer.update()
+    world_matrices = {obj: obj.matrix_world.copy() for obj in objects}
 
-        if obj.type == "MESH":
-            bpy.ops.object.mode_set(mode="OBJECT")
-            bpy.ops.object.convert(target="MESH", keep_original=False)
+    if not defer_meshes:
+        depsgraph = bpy.context.evaluated_depsgraph_get()
+        for obj in objects:
+            apply_modifiers_on_obj(obj, depsgraph)
+
+    baked_world_matrices = {}
+    for obj in objects:
+        world_matrix = world_matrices[obj]
 
-        if get_bml_type(obj) not in [
+        if get_bml_type(obj) in [
             BlenderNodeType.DOF,
             BlenderNodeType.SLOT,
             BlenderNodeType.HOTSPOT,
         ]:
-            bpy.ops.object.transform_apply()
+            # only apply the scale to those objects, keep their location and rotation
+            location, rotation, _ = world_matrix.decompose()
+            baked_world_matrix = Matrix.LocRotScale(location, rotation, None)
+        elif obj.type == "MESH" and obj.data and (defer_meshes or obj.data.users > 1):
+            # linked duplicates keep their transform, their shared mesh is transformed during the extraction
+            baked_world_matrix = world_matrix
         else:
-            # only apply scaling operations to those objects
-            # all other operations would reset them since they are empties
-            bpy.ops.object.transform_apply(
-                location=False, rotation=False, scale=True, properties=False
-            )
+            baked_world_matrix = Matrix.Identity(4)
 
-        for child in obj.children:
-            apply_all_modifiers_on_obj(child)
+        if baked_world_matrix is not world_matrix:
+            bake_transform(obj, baked_world_matrix.inverted_safe() @ world_matrix)
+
+        # the same state as bpy.ops.object.transform_apply() leaves the object and its children in
+        if obj.parent in baked_world_matrices:
+            obj.matrix_parent_inverse = baked_world_matrices[obj.parent].inverted_safe()
+        obj.matrix_basis = baked_world_matrix
+        baked_world_matrices[obj] = baked_world_matrix
+
+
+def apply_modifiers_on_obj(obj, depsgraph):
+    """Replaces the mesh of an object with its evaluated version (with all modifiers and shape keys applied)"""
+    if obj.type != "MESH" or not obj.data:
+        return
+
+    if len(obj.modifiers) == 0 and not obj.data.shape_keys:
+        return
+
+    original_mesh = obj.data
+    evaluated_mesh = bpy.data.meshes.new_from_object(
+        obj.evaluated_get(depsgraph), preserve_all_data_layers=True, depsgraph=depsgraph
+    )
+    # the original mesh may be shared with other objects - the shape keys are only cleared on the evaluated mesh
+    obj.data = evaluated_mesh
+    obj.modifiers.clear()
+    obj.shape_key_clear()
+
+    if original_mesh.users == 0:
+        bpy.data.meshes.remove(original_mesh)
+
+
+def apply_deferred_modifiers(objects):
+    """Applies the modifiers (and shape keys) of export copies which share the meshes of the originals, see
+    copy_object(). Only the given objects are evaluated, so the evaluated meshes of the whole export never exist at
+    once."""
+    mesh_objects = [
+        obj for obj in objects
+        if obj.type == "MESH" and obj.data and (len(obj.modifiers) > 0 or obj.data.shape_keys)
+    ]
+    if not mesh_objects:
+        return
+
+    for obj in mesh_objects:
+        for modifier_name in obj.get(DEFERRED_MODIFIERS_PROPERTY, []):
+            obj.modifiers[modifier_name].show_viewport = True
+        if DEFERRED_MODIFIERS_PROPERTY in obj:
+            del obj[DEFERRED_MODIFIERS_PROPERTY]
+
+    bpy.context.view_layer.update()
+    depsgraph = bpy.context.evaluated_depsgraph_get()
+    for obj in mesh_objects:
+        apply_modifiers_on_obj(obj, depsgraph)
+
+
+def bake_transform(obj, matrix):
+    """Transforms the vertex and custom normal arrays of a mesh object by a matrix"""
+    if obj.type != "MESH" or not obj.data or matrix == Matrix.Identity(4):
+        return
+
+    mesh = obj.data
+    transform = np.array(matrix, dtype=np.float32)
+
+    # custom normals have to be read before the vertices are moved
+    custom_normals = None
+    if mesh.has_custom_normals:
+        mesh.calc_normals_split()
+        custom_normals = np.empty(len(mesh.loops) * 3, dtype=np.float32)
+        mesh.loops.foreach_get("normal", custom_normals)
+
+    vertices = np.empty(len(mesh.vertices) * 3, dtype=np.float32)
+    mesh.vertices.foreach_get("co", vertices)
+    vertices = vertices.reshape(-1, 3) @ transform[:3, :3].T + transform[:3, 3]
+    mesh.vertices.foreach_set("co", vertices.astype(np.float32).ravel())
+
+    if custom_normals is not None:
+        normal_matrix = np.array(matrix.to_3x3().inverted_safe().transposed(), dtype=np.float32)
+        custom_normals = custom_normals.reshape(-1, 3) @ normal_matrix.T
+        lengths = np.linalg.norm(custom_normals, axis=1, keepdims=True)
+        custom_normals /= np.where(lengths > 0, lengths, 1)
+        mesh.normals_split_custom_set(custom_normals)
+
+    mesh.update()
 
 
 def uncompress_file(src, dest):
@@ -420,33 +624,11 @@ def force_auto_smoothing_on_object(obj, auto_smooth_angle_deg):
 
 
 def get_bounding_sphere(objects):
-    """Returns a bounding sphere as a tuple (center, radius) of a list of objects"""
-    """adapted from https://b3d.interplanety.org/en/how-to-calculate-the-bounding-sphere-for-selected-objects/"""
-    points_co_global = []
-
-    for obj in objects:
-        if obj.data and obj.type == "MESH":
-            points_co_global.extend(
-                [obj.matrix_world @ vertex.co for vertex in obj.data.vertices]
-            )
-
-    def get_center(axis):
-        return (max(axis) + min(axis)) / 2 if axis else 0.0
-
-    x, y, z = [[point_co[i] for point_co in points_co_global] for i in range(3)]
-    b_sphere_center = (
-        Vector([get_center(axis) for axis in [x, y, z]]) if (x and y and z) else None
-    )
-    b_sphere_radius = (
-        max(((point - b_sphere_center) for point in points_co_global))
-        if b_sphere_center
-        else None
-    )
-
-    if b_sphere_center and b_sphere_radius:
-        return b_sphere_center, b_sphere_radius.length
-    else:
+    """Returns the minimal bounding sphere of the vertices of a list of objects as a tuple (center, radius)"""
+    center, radius = get_minimal_bounding_sphere(get_world_vertices(objects))
+    if center is None:
         return 0, 0
+    return Vector(center), radius
 
 
 class Icons:
@@ -0,0 +1,153 @@
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import traceback
+
+import bpy
+
+from bms_blender_plugin.common.blender_types import LodItem
+from bms_blender_plugin.common.export_settings import ExportSettings
+from bms_blender_plugin.exporter import bml_output
+from bms_blender_plugin.exporter.lod_workers import enable_plugin, get_worker_command, save_snapshot
+
+BACKGROUND_EXPORT_EXPRESSION = (
+    "from bms_blender_plugin.exporter.background_export import run_background_export; run_background_export()"
+)
+
+
+def write_json_file(file_path, data):
+    """Writes a JSON file atomically, so it is never read half-written by the other process"""
+    temp_file_path = file_path + ".tmp"
+    with open(temp_file_path, "w") as json_file:
+        json.dump(data, json_file)
+    os.replace(temp_file_path, file_path)
+
+
+class BackgroundExport:
+    """A complete BML export which runs in a background Blender on a snapshot of the current file, so the user can
+    keep working and the undo history of the session is not touched"""
+
+    def __init__(self, lods, file_directory, file_prefix, export_settings: ExportSettings):
+        self.temp_directory = tempfile.mkdtemp(prefix="bml_background_export_")
+        self.job_path = os.path.join(self.temp_directory, "job.json")
+        self.progress_path = os.path.join(self.temp_directory, "progress.json")
+        self.result_path = os.path.join(self.temp_directory, "result.json")
+        self.log_path = os.path.join(self.temp_directory, "export.log")
+        self.process = None
+
+        try:
+            snapshot_path = save_snapshot(self.temp_directory)
+            write_json_file(
+                self.job_path,
+                {
+                    "lods": [
+                        {
+                            "collection": lod.collection.name,
+                            "file_suffix": lod.file_suffix,
+                            "viewing_distance": lod.viewing_distance,
+                            "cluster_max_triangles": lod.cluster_max_triangles,
+                            "cluster_max_size": lod.cluster_max_size,
+                        }
+                        for lod in lods
+                    ],
+                    "file_directory": file_directory,
+                    "file_prefix": file_prefix,
+                    "export_settings": export_settings.to_dict(),
+                    "progress_path": self.progress_path,
+                    "result_path": self.result_path,
+                },
+            )
+
+            with open(self.log_path, "w") as log_file:
+                self.process = subprocess.Popen(
+                    get_worker_command(snapshot_path, self.job_path, BACKGROUND_EXPORT_EXPRESSION),
+                    stdout=log_file,
+                    stderr=subprocess.STDOUT,
+                )
+        except Exception:
+            self.cleanup()
+            raise
+
+    def is_running(self):
+        return self.process is not None and self.process.poll() is None
+
+    def get_progress(self):
+        """Returns a tuple of the current progress message and the progress (0 to 1)"""
+        try:
+            with open(self.progress_path, "r") as progress_file:
+                progress = json.load(progress_file)
+            return progress["message"], progress["progress"]
+        except (OSError, ValueError, KeyError):
+            return "Starting export", 0
+
+    def get_result(self):
+        """Returns the result dict of the finished export: either the success message and the exported BMLs or an
+        error"""
+        if os.path.exists(self.result_path):
+            with open(self.result_path, "r") as result_file:
+                return json.load(result_file)
+
+        log_tail = ""
+        if os.path.exists(self.log_path):
+            with open(self.log_path, "r", errors="replace") as log_file:
+                log_tail = "".join(log_file.readlines()[-20:])
+        print(log_tail)
+
+        return {"error": f"Background export exited with code {self.process.returncode} without a result"}
+
+    def cancel(self):
+        if self.is_running():
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+                self.process.wait()
+
+    def cleanup(self):
+        shutil.rmtree(self.temp_directory, ignore_errors=True)
+
+
+def run_background_export():
+    """Entry point of the background Blender: runs bml_output.export_bml for the job file which is passed after '--'
+    on the command line and writes its progress and result next to it"""
+    job_path = sys.argv[sys.argv.index("--") + 1]
+    with open(job_path, "r") as job_file:
+        job = json.load(job_file)
+
+    def _write_progress(message, progress):
+        print(f"{message} ({round(progress * 100)}%)")
+        write_json_file(job["progress_path"], {"message": message, "progress": progress})
+
+    try:
+        enable_plugin()
+
+        # the scene collection is not part of bpy.data.collections
+        lods = [
+            LodItem(
+                lod["file_suffix"],
+                lod["viewing_distance"],
+                bpy.data.collections.get(lod["collection"], bpy.context.scene.collection),
+                lod["cluster_max_triangles"],
+                lod["cluster_max_size"],
+            )
+            for lod in job["lods"]
+        ]
+        success_message, bml_file_list = bml_output.export_bml(
+            bpy.context,
+            lods,
+            job["file_directory"],
+            job["file_prefix"],
+            ExportSettings.from_dict(job["export_settings"]),
+            _write_progress,
+        )
+        result = {"success_message": success_message, "bml_file_list": bml_file_list}
+
+    except Exception as e:
+        traceback.print_exc()
+        result = {"error": str(e)}
+
+    write_json_file(job["result_path"], result)
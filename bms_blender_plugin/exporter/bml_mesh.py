@@ -1,116 +1,240 @@
 import bpy
 import bmesh
 import math
+
+import numpy as np
 from mathutils import Vector
 
 from bms_blender_plugin.common.bml_structs import (
     DofType,
-    VertexPBR,
     Vector3,
     Vector2,
     VSInputLight,
 )
-from bms_blender_plugin.common.blender_types import BlenderNodeType
-from bms_blender_plugin.common.util import (
-    get_bml_type,
-    get_non_translate_dof_parent,
-)
 from bms_blender_plugin.common.coordinates import to_bms_coords
+from bms_blender_plugin.exporter.export_metadata import ExportMetadata
+
+
+class MeshArrays:
+    """Triangulated vertex data of a single mesh datablock in its local space, one row per output vertex.
+    The sum and amount of the mesh vertices (not the output vertices) give the center of merged meshes."""
+    positions: np.ndarray
+    normals: np.ndarray
+    tangents: np.ndarray
+    uvs: np.ndarray
+    handedness: np.ndarray
+    has_uvs: bool
+    vertex_sum: np.ndarray
+    mesh_vertex_count: int
+
+    def __init__(self, positions, normals, tangents, uvs, handedness, has_uvs, vertex_sum, mesh_vertex_count):
+        self.positions = positions
+        self.normals = normals
+        self.tangents = tangents
+        self.uvs = uvs
+        self.handedness = handedness
+        self.has_uvs = has_uvs
+        self.vertex_sum = vertex_sum
+        self.mesh_vertex_count = mesh_vertex_count
+
+    def __len__(self):
+        return len(self.positions)
+
+
+def get_mesh_arrays(mesh, auto_smooth_angle=None):
+    """Triangulates a mesh and extracts its local-space vertex data as arrays.
+    Meshes which are shared with other objects (linked duplicates) are not modified - a temporary copy is
+    triangulated instead. With an auto smooth angle (in degrees), auto smoothing is forced on the mesh."""
+    is_shared_mesh = mesh.users > 1
+    if is_shared_mesh:
+        mesh = mesh.copy()
+
+    try:
+        if auto_smooth_angle is not None:
+            mesh.use_auto_smooth = True
+            mesh.auto_smooth_angle = math.radians(auto_smooth_angle)
+
+        bm = bmesh.new()
+        bm.from_mesh(mesh)
+
+        bmesh.ops.triangulate(bm, faces=bm.faces[:])
+        bm.to_mesh(mesh)
+        bm.free()
+
+        uv_names = [uvlayer.name for uvlayer in mesh.uv_layers]
+        if len(mesh.loops) > 0:
+            if len(uv_names) > 0:
+                # the tangents of the last UV map are kept
+                mesh.calc_tangents(uvmap=uv_names[-1])
+            else:
+                mesh.calc_normals_split()
+
+        loop_count = len(mesh.loops)
+        vertex_count = len(mesh.vertices)
+
+        # all faces are triangles now - switch the handedness by swapping the 2nd and 3rd vertex of each face
+        loop_starts = np.empty(len(mesh.polygons), dtype=np.int32)
+        mesh.polygons.foreach_get("loop_start", loop_starts)
+        loop_order = (loop_starts[:, np.newaxis] + np.array([0, 2, 1], dtype=np.int32)).ravel()
+
+        vertex_indices = np.empty(loop_count, dtype=np.int32)
+        mesh.loops.foreach_get("vertex_index", vertex_indices)
+        vertex_positions = np.empty(vertex_count * 3, dtype=np.float32)
+        mesh.vertices.foreach_get("co", vertex_positions)
+        vertex_positions = vertex_positions.reshape(-1, 3)
+        positions = vertex_positions[vertex_indices[loop_order]]
+
+        normals = np.empty(loop_count * 3, dtype=np.float32)
+        mesh.loops.foreach_get("normal", normals)
+        normals = normals.reshape(-1, 3)[loop_order]
+
+        has_uvs = mesh.uv_layers.active is not None
+        if has_uvs:
+            tangents = np.empty(loop_count * 3, dtype=np.float32)
+            mesh.loops.foreach_get("tangent", tangents)
+            tangents = tangents.reshape(-1, 3)[loop_order]
+
+            handedness = np.empty(loop_count, dtype=np.float32)
+            mesh.loops.foreach_get("bitangent_sign", handedness)
+            handedness = handedness[loop_order]
+
+            uvs = np.empty(loop_count * 2, dtype=np.float32)
+            mesh.uv_layers.active.data.foreach_get("uv", uvs)
+            uvs = uvs.reshape(-1, 2)[loop_order]
+        else:
+            tangents = np.zeros((len(loop_order), 3), dtype=np.float32)
+            handedness = np.zeros(len(loop_order), dtype=np.float32)
+            uvs = np.zeros((len(loop_order), 2), dtype=np.float32)
 
+        return MeshArrays(
+            positions, normals, tangents, uvs, handedness, has_uvs,
+            vertex_positions.sum(axis=0, dtype=np.float64), vertex_count,
+        )
 
-def get_bml_mesh_data(obj, max_vertex_index):
-    """Returns the raw mesh data in the BML format as a tuple of vertices and vertex indices"""
-    mesh = obj.data
-    bm = bmesh.new()
-    bm.from_mesh(mesh)
+    finally:
+        if is_shared_mesh:
+            bpy.data.meshes.remove(mesh)
 
-    bmesh.ops.triangulate(bm, faces=bm.faces[:])
-    bm.to_mesh(mesh)
-    bm.free()
 
-    uv_names = [uvlayer.name for uvlayer in mesh.uv_layers]
-    if len(mesh.loops) > 0:
-        mesh.calc_normals()
-        for name in uv_names:
-            mesh.calc_tangents(uvmap=name)
-
-    pb_vertices = []
-    pb_vertices_per_face = []
-    vertex_indices = []
+def get_mesh_world_coord(obj, metadata: ExportMetadata = None):
+    """Returns the matrix which transforms the mesh of an object into the coordinate system of its BML node"""
+    if metadata is None:
+        metadata = ExportMetadata()
 
     # All DOF children inherit their position relative to their parents DOF.
-    if get_bml_type(obj.parent) == BlenderNodeType.DOF and (
-        obj.parent.dof_type == DofType.ROTATE.name
-        or obj.parent.dof_type == DofType.SCALE.name
-    ):
-        world_coord = obj.parent.matrix_world.inverted()
+    if metadata.is_dof_of_type(obj.parent, DofType.ROTATE) or metadata.is_dof_of_type(obj.parent, DofType.SCALE):
+        return obj.parent.matrix_world.inverted() @ obj.matrix_world
 
-    elif get_bml_type(obj.parent) == BlenderNodeType.DOF and obj.parent.dof_type == DofType.TRANSLATE.name:
+    elif metadata.is_dof_of_type(obj.parent, DofType.TRANSLATE):
         # The only exception is the TRANSLATE DOF which will always reside at (0,0,0) - therefore we have
         # to use its world position
 
         # are we the grandchild of another object? Then we have to use those relative coords
-        non_translate_dof_parent = get_non_translate_dof_parent(obj.parent)
+        non_translate_dof_parent = metadata.get_non_translate_dof_parent(obj.parent)
         if non_translate_dof_parent:
-            world_coord = non_translate_dof_parent.matrix_world.inverted()
-
+            return non_translate_dof_parent.matrix_world.inverted() @ obj.matrix_world
+
+    # Not child of a DOF, just use our world coords
+    return obj.matrix_world
+
+
+def get_cached_mesh_arrays(mesh, mesh_cache=None, auto_smooth_angle=None):
+    """Returns the MeshArrays of a mesh datablock. If a cache dict is given, each mesh which is shared by several
+    objects (linked duplicates) is only triangulated and extracted once per auto smooth angle."""
+    if mesh_cache is None or mesh.users <= 1:
+        return get_mesh_arrays(mesh, auto_smooth_angle)
+
+    mesh_arrays_by_angle = mesh_cache.setdefault(mesh, {})
+    mesh_arrays = mesh_arrays_by_angle.get(auto_smooth_angle)
+    if mesh_arrays is None:
+        mesh_arrays = get_mesh_arrays(mesh, auto_smooth_angle)
+        mesh_arrays_by_angle[auto_smooth_angle] = mesh_arrays
+    return mesh_arrays
+
+
+def get_bml_mesh_data(
+    obj,
+    max_vertex_index,
+    mesh_cache=None,
+    metadata: ExportMetadata = None,
+    merged_objects=None,
+    auto_smooth_value=None,
+):
+    """Returns the raw mesh data in the BML format as a dict of packed vertices, vertex indices and the world space
+    center of the mesh vertices.
+    Merged objects (including obj itself, which is the target of the merge) are concatenated into a single vertex
+    list in the space of obj, the same result as joining them into obj. Their meshes are never copied or joined, so
+    linked duplicates are only extracted once (see get_cached_mesh_arrays) and each instance only applies its own
+    matrix."""
+    if not merged_objects:
+        merged_objects = [obj]
+
+    # joining forces auto smoothing on all objects if any of them uses it
+    auto_smooth_angle = None
+    if auto_smooth_value is not None and len(merged_objects) > 1 and any(merged_object.data.use_auto_smooth for merged_object in merged_objects):
+        auto_smooth_angle = auto_smooth_value
+
+    world_coord_matrix = get_mesh_world_coord(obj, metadata)
+    target_world_inverted = obj.matrix_world.inverted_safe()
+
+    vertex_data_list = []
+    vertex_sum = Vector((0, 0, 0))
+    mesh_vertex_count = 0
+    for merged_object in merged_objects:
+        mesh_arrays = get_cached_mesh_arrays(merged_object.data, mesh_cache, auto_smooth_angle)
+
+        if merged_object is obj:
+            object_matrix = world_coord_matrix
         else:
-            # no grandchild, we will use our world coords
-            world_coord = obj.matrix_world
+            # the mesh of the merged object in the local space of the target, then in the space of its BML node
+            object_matrix = world_coord_matrix @ target_world_inverted @ merged_object.matrix_world
+        vertex_data_list.append(get_vertex_data(mesh_arrays, object_matrix))
 
-    else:
-        # Not child of a DOF, just use our world coords
-        world_coord = obj.matrix_world
+        # the center of all vertices, as get_objcenter() returns it for a joined object
+        if mesh_arrays.mesh_vertex_count > 0:
+            local_center = Vector(mesh_arrays.vertex_sum.tolist()) / mesh_arrays.mesh_vertex_count
+            vertex_sum += (merged_object.matrix_world @ local_center) * mesh_arrays.mesh_vertex_count
+            mesh_vertex_count += mesh_arrays.mesh_vertex_count
 
-    world_normal = world_coord.inverted_safe().transposed().to_3x3()
+    vertex_data = vertex_data_list[0] if len(vertex_data_list) == 1 else np.concatenate(vertex_data_list)
 
-    for face in mesh.polygons:
-        # loop over face loop
-        for vert in [mesh.loops[i] for i in face.loop_indices]:
-            vertex_pbr = VertexPBR()
-            vertex_index = vert.vertex_index
-            vertex_indices.append(vert.index + max_vertex_index)
-
-            # position
-            object_global_coord = to_bms_coords(
-                world_coord @ mesh.vertices[vertex_index].co
-            )
-            vertex_pbr.position = Vector3(
-                object_global_coord.x, object_global_coord.y, object_global_coord.z
-            )
+    return {
+        "vertex_data": vertex_data.tobytes(),
+        "vertex_count": len(vertex_data),
+        "vertex_indices": range(max_vertex_index, max_vertex_index + len(vertex_data)),
+        "center": vertex_sum / mesh_vertex_count if mesh_vertex_count > 0 else Vector((0, 0, 0)),
+    }
 
-            # normal
-            object_global_normal = to_bms_coords(world_normal @ vert.normal)
-            # normalize the vector to remove any rounding errors
-            object_global_normal = object_global_normal.normalized()
-            vertex_pbr.normal = Vector3(
-                object_global_normal.x, object_global_normal.y, object_global_normal.z
-            )
 
-            # tangent & uv
-            if mesh.uv_layers.active:
-                object_global_tangent = to_bms_coords(vert.tangent)
-                vertex_pbr.tangent = Vector3(
-                    object_global_tangent.x,
-                    object_global_tangent.y,
-                    object_global_tangent.z,
-                )
-                vertex_pbr.handedness = vert.bitangent_sign
-
-                uv = tuple(
-                    to_bms_coords(tuple(mesh.uv_layers.active.data[vert.index].uv))
-                )
-                vertex_pbr.uv = Vector2(uv[0], uv[1])
-
-            pb_vertices_per_face.append(vertex_pbr)
-
-        # switch the handedness by swapping the vertices
-        pb_vertices.append(pb_vertices_per_face[0])
-        pb_vertices.append(pb_vertices_per_face[2])
-        pb_vertices.append(pb_vertices_per_face[1])
-        pb_vertices_per_face = []
-
-    return {"vertices": pb_vertices, "vertex_indices": vertex_indices}
+def get_vertex_data(mesh_arrays: MeshArrays, matrix):
+    """Transforms the MeshArrays of a mesh into the BML vertex format, one row of 12 floats per vertex"""
+    world_coord = np.array(matrix, dtype=np.float32)
+    world_normal = np.array(matrix.inverted_safe().transposed().to_3x3(), dtype=np.float32)
+
+    vertex_data = np.zeros((len(mesh_arrays), 12), dtype="<f4")
+
+    # BMS space: swap the Y and Z axis
+    positions = mesh_arrays.positions @ world_coord[:3, :3].T + world_coord[:3, 3]
+    vertex_data[:, 0:3] = positions[:, [0, 2, 1]]
+
+    # normalize the vectors to remove any rounding errors
+    normals = mesh_arrays.normals @ world_normal.T
+    vertex_data[:, 3:6] = _normalized(normals)[:, [0, 2, 1]]
+
+    if mesh_arrays.has_uvs:
+        # tangents lie in the surface, so they are transformed like positions (the normals use the inverse transpose)
+        tangents = mesh_arrays.tangents @ world_coord[:3, :3].T
+        vertex_data[:, 6:9] = _normalized(tangents)[:, [0, 2, 1]]
+        vertex_data[:, 9] = mesh_arrays.uvs[:, 0]
+        vertex_data[:, 10] = 1 - mesh_arrays.uvs[:, 1]
+        vertex_data[:, 11] = mesh_arrays.handedness
+
+    return vertex_data
+
+
+def _normalized(vectors):
+    lengths = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(lengths > 0, lengths, 1)
 
 
 def get_pbr_light_data(obj, max_vertex_index):
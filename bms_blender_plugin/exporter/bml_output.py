@@ -1,13 +1,12 @@
 import datetime
 import math
+import os
 
 import bpy
 
 from bms_blender_plugin.common.blender_types import BlenderNodeType, LodItem
 from bms_blender_plugin.common.export_settings import ExportSettings
-from bms_blender_plugin.common.util import (
-    get_bml_type,
-)
+from bms_blender_plugin.common.util import get_peak_memory_usage
 from bms_blender_plugin.exporter.export_hotspots import export_hotspots
 from bms_blender_plugin.common.bounding_box import BoundingBox
 from bms_blender_plugin.exporter.export_lods import (
@@ -15,12 +14,15 @@ from bms_blender_plugin.exporter.export_lods import (
 from bms_blender_plugin.exporter.export_materials import (
     export_materials,
 )
+from bms_blender_plugin.exporter.export_manifest import MANIFEST_FILE_NAME, ExportManifest
+from bms_blender_plugin.exporter.export_metadata import ExportMetadata
+from bms_blender_plugin.exporter.export_render_controls import get_serialized_render_controls
 from bms_blender_plugin.exporter.export_parent_dat import get_slots, export_parent_dat
 from bms_blender_plugin.exporter.export_bounding_boxes import export_bounding_boxes
 from mathutils import Vector
 
 
-def export_bml(context, lods, file_directory, file_prefix, export_settings: ExportSettings):
+def export_bml(context, lods, file_directory, file_prefix, export_settings: ExportSettings, progress_callback=None):
     """Exports the current scene to the BML v2 files:
     * For each LOD a BML
     * A single Materials.mtl file
@@ -28,11 +30,19 @@ def export_bml(context, lods, file_directory, file_prefix, export_settings: Expo
     * For each Material file multiple DDS textures
     * A single Parent.dat
     * A single 3dButtons.dat
+    The optional progress callback is called with a message and the overall progress (0 to 1).
     """
 
+    def _report_progress(message, progress):
+        if progress_callback:
+            progress_callback(message, progress)
+
     start_time = datetime.datetime.now()
     print(f"Starting BML export at {start_time}\n")
 
+    # the peak is kept for the whole lifetime of the process, so the export is measured by how much it raised it
+    start_peak_memory = get_peak_memory_usage()
+
     # blender uses meters as base unit, BMS works in feet
     # note that unit system does not scale the model, it just changes the dimension units
     scale_factor = 3.28084
@@ -44,6 +54,9 @@ def export_bml(context, lods, file_directory, file_prefix, export_settings: Expo
 
     print(f"unit scaling factor: {scale_factor}")
 
+    # snapshot the BML properties of all scene objects for the scene wide outputs (Parent.dat, bounding boxes)
+    metadata = ExportMetadata(context.scene.objects)
+
     """
     Bounding Box handling.
     A complex model can have more than one bounding box, for example an Aircraft Model usually has fuselage, 
@@ -56,7 +69,7 @@ def export_bml(context, lods, file_directory, file_prefix, export_settings: Expo
     """
 
     # Gather all bounding boxes into an array of bounding_box objects.
-    BBox_Array = [BoundingBox(obj) for obj in context.scene.objects if get_bml_type(obj) == BlenderNodeType.BBOX]
+    BBox_Array = [BoundingBox(obj) for obj in context.scene.objects if metadata.get_bml_type(obj) == BlenderNodeType.BBOX]
     """
     Get the first bounding box min and max coordinates. A bit arbitrary at this point, 
     but in instances of a single bbox, no harm and I suspect that these will be in named order. 
@@ -81,15 +94,42 @@ def export_bml(context, lods, file_directory, file_prefix, export_settings: Expo
     elif len(lods) == 0:
         raise Exception("No active collection and no LODs - can not export")
 
+    # with an incremental export, unchanged files are skipped
+    manifest = ExportManifest(file_directory) if export_settings.incremental else None
+
+    # the textures always use a manifest with the draft quality (so unchanged textures are skipped), or if a previous
+    # export left one behind (so it never lists draft textures which have been replaced)
+    texture_manifest = manifest
+    if texture_manifest is None and (
+        export_settings.texture_quality == "DRAFT" or os.path.exists(os.path.join(file_directory, MANIFEST_FILE_NAME))
+    ):
+        texture_manifest = ExportManifest(file_directory)
+
+    # the DOF node tree is analysed once for all LODs
+    render_controls = get_serialized_render_controls()
+
+    # LODs take the largest part of the export
     all_exported_bmls, all_material_names, all_hotspots = export_lods(
-        context, file_directory, file_prefix, lods, scale_factor, export_settings
+        context,
+        file_directory,
+        file_prefix,
+        lods,
+        scale_factor,
+        export_settings,
+        lambda message, lod_progress: _report_progress(message, 0.7 * lod_progress),
+        manifest,
+        render_controls,
     )
 
+    texture_report = None
     if export_settings.export_materials_file or export_settings.export_textures:
-        export_materials(
+        _report_progress("Exporting materials and textures", 0.7)
+        texture_report = export_materials(
             all_material_names,
             file_directory,
             export_settings,
+            manifest,
+            texture_manifest,
         )
 
     if export_settings.export_materials_sets and len(context.scene.bml_material_sets) > 1:
@@ -98,6 +138,7 @@ def export_bml(context, lods, file_directory, file_prefix, export_settings: Expo
         number_of_texture_sets = 1
 
     if export_settings.export_parent_dat:
+        _report_progress("Exporting Parent.dat", 0.9)
         export_parent_dat(
             context,
             file_directory,
@@ -106,12 +147,16 @@ def export_bml(context, lods, file_directory, file_prefix, export_settings: Expo
             bounding_box_1_max_coords,
             scale_factor,
             number_of_texture_sets,
-            get_slots(context.scene),
-            lods
+            get_slots(context.scene, metadata),
+            lods,
+            metadata,
+            manifest,
+            export_settings.bounding_sphere_lod_only,
         )
 
     if export_settings.export_hotspots:
-        export_hotspots(all_hotspots, file_directory)
+        _report_progress("Exporting hotspots", 0.95)
+        export_hotspots(all_hotspots, file_directory, manifest)
 
     # If there is more than one bounding box defined, output all to a file.
     if len(BBox_Array) > 1:
@@ -126,6 +171,29 @@ def export_bml(context, lods, file_directory, file_prefix, export_settings: Expo
         f"{math.trunc(elapsed_minutes[0])}m {round(elapsed_minutes[1],2)}s"
     )
 
+    if manifest:
+        manifest.save()
+        success_message += f", {manifest.get_report()}"
+    elif texture_manifest:
+        texture_manifest.save()
+
+    if texture_manifest:
+        draft_files = texture_manifest.get_draft_files()
+        if draft_files:
+            print(f"Draft textures: {', '.join(draft_files)}")
+            success_message += f", {len(draft_files)} DRAFT textures (not for release)"
+
+    if texture_report:
+        success_message += f", {texture_report}"
+
+    if export_settings.bounded_memory:
+        peak_memory = get_peak_memory_usage()
+        if peak_memory is not None and start_peak_memory is not None:
+            success_message += (
+                f", process peak memory {round(peak_memory / (1024 * 1024))} MB "
+                f"(+{round((peak_memory - start_peak_memory) / (1024 * 1024))} MB during the export)"
+            )
+
 
     print(success_message)
     return success_message, all_exported_bmls
@@ -1,8 +1,10 @@
 import fileinput
 import os
 
+from bms_blender_plugin.exporter.export_manifest import ExportManifest, get_hash
 
-def export_hotspots(hotspots: dict, file_directory):
+
+def export_hotspots(hotspots: dict, file_directory, manifest: ExportManifest = None):
     """Exports a list of hotspots to the 3dButtons.dat"""
     """Will replace the lines of an existing 3dButtons.dat with new data"""
 
@@ -11,6 +13,12 @@ def export_hotspots(hotspots: dict, file_directory):
     
     hotspots_filepath = os.path.join(file_directory, "3dButtons.dat")
 
+    if manifest:
+        fingerprint = {"hotspots": get_hash(sorted(str(hotspot) for hotspot in hotspots.values()))}
+        if manifest.get_rebuild_reason("3dButtons.dat", fingerprint) is None:
+            return
+        manifest.record("3dButtons.dat", fingerprint)
+
     # 3dButtons.dat already exists
     if os.path.exists(hotspots_filepath):
         # first: check existing callbacks in the file and update them
@@ -1,5 +1,8 @@
+import io
 import os
+import shutil
 import struct
+from collections import Counter
 
 import bpy
 
@@ -10,19 +13,29 @@ from bms_blender_plugin.common.bml_structs import (
     SwitchEnd,
     DofEnd,
     SlotEnd,
-    IndexBufferFormat,
 )
 from bms_blender_plugin.common.export_settings import ExportSettings
+from bms_blender_plugin.common.hotspot import Hotspot
 from bms_blender_plugin.common.util import (
     copy_collection_flat,
     apply_all_modifiers,
+    apply_deferred_modifiers,
     compress_lz_4,
     compress_lzma,
-    get_bml_type,
+    compress_lzma_stream,
     force_auto_smoothing_on_object,
+    make_mesh_single_user,
 )
-from bms_blender_plugin.exporter.export_materials import export_material_sets
-from bms_blender_plugin.exporter.export_render_controls import get_render_control_nodes
+from bms_blender_plugin.exporter.export_materials import export_material_sets, get_material_remap
+from bms_blender_plugin.exporter.export_manifest import ExportManifest, get_lod_fingerprint
+from bms_blender_plugin.exporter.export_metadata import ExportMetadata
+from bms_blender_plugin.exporter.export_render_controls import (
+    SerializedRenderControls,
+    get_serialized_render_controls,
+)
+from bms_blender_plugin.exporter.geometry_buffers import GeometryBuffers, open_buffer_file
+from bms_blender_plugin.exporter.lod_workers import export_lods_in_workers
+from bms_blender_plugin.exporter.merge_plan import MergePlan, get_merge_plan, is_joining_materials
 from bms_blender_plugin.exporter.parser import (
     parse_mesh,
     parse_bbl_light,
@@ -35,28 +48,102 @@ from bms_blender_plugin.ui_tools.panels.material_sets_panel import revert_to_bas
 
 
 def export_lods(
-    context, file_directory, file_prefix, lod_list, scale_factor, export_settings: ExportSettings
+    context,
+    file_directory,
+    file_prefix,
+    lod_list,
+    scale_factor,
+    export_settings: ExportSettings,
+    progress_callback=None,
+    manifest: ExportManifest = None,
+    render_controls: SerializedRenderControls = None,
 ):
     """Exports multiple LODs to single *.bml files and their material sets to *.mti files.
     Returns a list of exported files, a list of all material names and
-    a list of all hotspots."""
-    all_exported_bmls = []
-    all_material_names = set()
-    all_hotspots = dict()
+    a list of all hotspots.
+    The optional progress callback is called with a message and the fraction of exported LODs.
+    With a manifest, LODs whose inputs did not change since the last export are skipped."""
     for lod in lod_list:
-        print(f"Exporting LOD {lod.collection.name}...\n")
         lod.file_suffix = lod.file_suffix.replace(" ", "_")
-        bml_file_path = os.path.join(file_directory, file_prefix + lod.file_suffix + ".bml")
 
-        material_names, hotspots = export_single_collection(
-            context, lod.collection, scale_factor, export_settings, bml_file_path
-        )
+    # the DOF node tree is the same for all LODs
+    if render_controls is None:
+        render_controls = get_serialized_render_controls()
+
+    # equivalent materials are merged into one
+    material_remap = get_material_remap(context)
+    for material_name, kept_material_name in material_remap.items():
+        print(f"Merging material {material_name} into equivalent material {kept_material_name}")
+
+    lod_results = [None] * len(lod_list)
+    lod_fingerprints = {}
+    lods_to_export = []
+    for index, lod in enumerate(lod_list):
+        # without models, the LODs are still parsed for their materials and hotspots
+        if manifest and export_settings.export_models:
+            file_name = file_prefix + lod.file_suffix + ".bml"
+            output_files = [file_name]
+            # see export_material_sets
+            if export_settings.export_materials_sets and len(context.scene.bml_material_sets) > 1:
+                output_files.append(file_name.replace(".bml", ".mti"))
+            fingerprint = get_lod_fingerprint(
+                context, lod, scale_factor, export_settings, render_controls, material_remap
+            )
+            if manifest.get_rebuild_reason(file_name, fingerprint, output_files) is None:
+                print(f"Skipping unchanged LOD {lod.collection.name}\n")
+                lod_data = manifest.get_data(file_name)
+                lod_results[index] = (
+                    os.path.join(file_directory, file_name),
+                    lod_data["material_names"],
+                    {
+                        callback_id: Hotspot.from_dict(hotspot)
+                        for callback_id, hotspot in lod_data["hotspots"].items()
+                    },
+                )
+                continue
+            lod_fingerprints[index] = fingerprint
+        lods_to_export.append(index)
 
-        material_set_filepath = bml_file_path.replace(".bml", ".mti")
+    if (
+        export_settings.parallel_lods
+        and export_settings.export_models
+        and len(lods_to_export) > 1
+    ):
+        if progress_callback:
+            progress_callback(f"Exporting {len(lods_to_export)} LODs in parallel", 0)
+        worker_results = export_lods_in_workers(
+            file_directory,
+            file_prefix,
+            [lod_list[index] for index in lods_to_export],
+            scale_factor,
+            export_settings,
+        )
+        for index, lod_result in zip(lods_to_export, worker_results):
+            lod_results[index] = lod_result
+    else:
+        for progress_index, index in enumerate(lods_to_export):
+            lod = lod_list[index]
+            if progress_callback:
+                progress_callback(f"Exporting LOD {lod.collection.name}", progress_index / len(lods_to_export))
+            lod_results[index] = export_lod(
+                context, lod, file_directory, file_prefix, scale_factor, export_settings, render_controls
+            )
 
-        if export_settings.export_materials_sets:
-            export_material_sets(context, material_set_filepath, material_names)
+    for index, fingerprint in lod_fingerprints.items():
+        bml_file_path, material_names, hotspots = lod_results[index]
+        manifest.record(
+            os.path.basename(bml_file_path),
+            fingerprint,
+            {
+                "material_names": material_names,
+                "hotspots": {callback_id: hotspot.to_dict() for callback_id, hotspot in hotspots.items()},
+            },
+        )
 
+    all_exported_bmls = []
+    all_material_names = set()
+    all_hotspots = dict()
+    for bml_file_path, material_names, hotspots in lod_results:
         all_exported_bmls.append(bml_file_path)
 
         for material_name in material_names:
@@ -71,11 +158,53 @@ def export_lods(
     return all_exported_bmls, all_material_names, all_hotspots
 
 
+def export_lod(
+    context,
+    lod,
+    file_directory,
+    file_prefix,
+    scale_factor,
+    export_settings: ExportSettings,
+    render_controls: SerializedRenderControls = None,
+):
+    """Exports a single LOD to a *.bml file and its material sets to a *.mti file.
+    Returns a triple of the exported file, the material names and the hotspots of the LOD."""
+    print(f"Exporting LOD {lod.collection.name}...\n")
+    bml_file_path = os.path.join(file_directory, file_prefix + lod.file_suffix + ".bml")
+
+    material_names, hotspots = export_single_collection(
+        context,
+        lod.collection,
+        scale_factor,
+        export_settings,
+        bml_file_path,
+        render_controls,
+        lod.cluster_max_triangles,
+        lod.cluster_max_size,
+    )
+
+    material_set_filepath = bml_file_path.replace(".bml", ".mti")
+
+    if export_settings.export_materials_sets:
+        export_material_sets(context, material_set_filepath, material_names)
+
+    return bml_file_path, material_names, hotspots
+
+
 def export_single_collection(
-    context, collection, scale_factor, export_settings: ExportSettings, file_path
+    context,
+    collection,
+    scale_factor,
+    export_settings: ExportSettings,
+    file_path,
+    render_controls: SerializedRenderControls = None,
+    cluster_max_triangles=0,
+    cluster_max_size=0.0,
 ):
     """Exports a single Blender collection to a BML file."""
     # create a temporary collection and copy the current collection's visible objects into it
+    # with bounded memory, the copies share the meshes of the originals - each node level is copied and its
+    # modifiers are applied right before it is extracted (see get_nodes)
     collection_copy_root = bpy.data.collections.new(collection.name + "_export")
     bpy.context.scene.collection.children.link(collection_copy_root)
     copy_collection_flat(
@@ -83,45 +212,33 @@ def export_single_collection(
         collection_copy_root,
         [collection_copy_root],
         scale_factor,
+        share_meshes=export_settings.bounded_memory,
     )
 
-    apply_all_modifiers(collection_copy_root)
+    apply_all_modifiers(collection_copy_root, defer_meshes=export_settings.bounded_memory)
 
     # make sure we are on the base texture set
     revert_to_base_material_set(context, collection_copy_root)
 
     # get the data of the root collection
-    nodes_output = get_nodes(
-        context,
-        collection_copy_root,
-        export_settings.script,
-        export_settings.auto_smooth_value,
-    )
-    payload = nodes_output["data"]
-    material_names = nodes_output["material_names"]
-    hotspots = nodes_output["hotspots"]
-
-    payload_size = len(payload)
-
-    if export_settings.compression == Compression.NONE:
-        payload_compressed_size = payload_size
-    elif export_settings.compression == Compression.LZ_4:
-        payload = compress_lz_4(payload)
-        payload_compressed_size = len(payload)
-    elif export_settings.compression == Compression.LZMA:
-        payload = compress_lzma(payload)
-        payload_compressed_size = len(payload)
-    else:
-        raise Exception("Unknown compression exception")
-
-    header = Header(
-        2, payload_size, payload_compressed_size, export_settings.compression
-    )
-    data = header.to_data() + payload
+    # with bounded memory, the payload is assembled on disk and compressed as a stream
+    with open_buffer_file(export_settings.bounded_memory, "bml_payload_") as payload_file:
+        nodes_output = get_nodes(
+            context,
+            collection_copy_root,
+            export_settings.script,
+            export_settings.auto_smooth_value,
+            payload_file,
+            export_settings.bounded_memory,
+            render_controls,
+            cluster_max_triangles,
+            cluster_max_size,
+        )
+        material_names = nodes_output["material_names"]
+        hotspots = nodes_output["hotspots"]
 
-    if export_settings.export_models:
-        with open(file_path, "wb") as bml_file:
-            bml_file.write(data)
+        if export_settings.export_models:
+            write_bml_file(file_path, payload_file, export_settings)
             print(
                 f"Finished exporting LOD with {nodes_output['nodes_amount']} nodes to {file_path}...\n"
             )
@@ -140,44 +257,149 @@ def export_single_collection(
     return material_names, hotspots
 
 
-def get_nodes(context, root_collection, script, auto_smooth_value):
+def write_bml_file(file_path, payload_file, export_settings: ExportSettings):
+    """Compresses a payload and writes it together with its header to a BML file"""
+    payload_size = payload_file.seek(0, io.SEEK_END)
+    payload_file.seek(0)
+
+    if export_settings.bounded_memory and export_settings.compression == Compression.LZMA:
+        with open(file_path, "wb") as bml_file:
+            # the compressed size is only known afterwards - reserve the space of the header
+            header_size = len(Header(2, 0, 0, export_settings.compression).to_data())
+            bml_file.write(bytes(header_size))
+            payload_compressed_size = compress_lzma_stream(payload_file, bml_file)
+            bml_file.seek(0)
+            bml_file.write(
+                Header(
+                    2, payload_size, payload_compressed_size, export_settings.compression
+                ).to_data()
+            )
+        return
+
+    if export_settings.bounded_memory and export_settings.compression == Compression.NONE:
+        with open(file_path, "wb") as bml_file:
+            bml_file.write(
+                Header(2, payload_size, payload_size, export_settings.compression).to_data()
+            )
+            shutil.copyfileobj(payload_file, bml_file)
+        return
+
+    payload = payload_file.read()
+
+    if export_settings.compression == Compression.NONE:
+        payload_compressed_size = payload_size
+    elif export_settings.compression == Compression.LZ_4:
+        payload = compress_lz_4(payload)
+        payload_compressed_size = len(payload)
+    elif export_settings.compression == Compression.LZMA:
+        payload = compress_lzma(payload)
+        payload_compressed_size = len(payload)
+    else:
+        raise Exception("Unknown compression exception")
+
+    header = Header(
+        2, payload_size, payload_compressed_size, export_settings.compression
+    )
+
+    with open(file_path, "wb") as bml_file:
+        bml_file.write(header.to_data() + payload)
+
+
+def get_nodes(
+    context,
+    root_collection,
+    script,
+    auto_smooth_value,
+    payload_file,
+    bounded_memory=False,
+    render_controls: SerializedRenderControls = None,
+    cluster_max_triangles=0,
+    cluster_max_size=0.0,
+):
     """Recursively builds the BML node list for a given collection with all of its elements
-    (refer to the BMLv2 format definition).
-    Returns a triple of the nodes in binary format, the material list and the amount of nodes
+    (refer to the BMLv2 format definition) and writes the uncompressed payload to a binary file object.
+    With bounded memory, the objects share the meshes of the originals: the modifiers of each node level are applied
+    and its BBL lights are joined right before it is parsed, meshes are freed as soon as they have been extracted and
+    the vertex and index data is spilled to temporary files.
+    With a cluster limit, meshes are split into several spatially compact primitives.
+    Returns a dict of the material list, the amount of nodes and the hotspots
     """
     material_names = []
     nodes = []
     current_vertices_index = 0
     current_vertices_size = 0
-    vertices_data = []  # raw byte data
-    vertex_indices = []
+    geometry_buffers = GeometryBuffers(spill_to_disk=bounded_memory)
     hotspots = dict()
 
+    # linked duplicates share their mesh datablock - it is only extracted once per LOD
+    mesh_cache = {}
+
+    # extracted meshes are swapped for this empty mesh so their memory can be freed
+    placeholder_mesh = bpy.data.meshes.new("bml_export_placeholder") if bounded_memory else None
+
+    # the amount of objects which still have to be parsed of each mesh - its cached arrays are kept until then
+    mesh_users = Counter(
+        obj.data.name for obj in root_collection.all_objects if obj.type == "MESH" and obj.data
+    ) if bounded_memory else None
+
     # puts all render control nodes before any of the DOFs or primitives - this simplifies things a lot.
     # we only need to make sure that the nodes are in order
-    nodes = get_render_control_nodes()
+    if render_controls is None:
+        render_controls = get_serialized_render_controls()
+    nodes = list(render_controls.nodes)
+
+    # decide which objects are merged into a single primitive
+    root_objects = []
+    for collection_object in root_collection.objects:
+        if collection_object.parent is None:
+            root_objects.append(collection_object)
 
-    def _recursively_parse_nodes(objects):
+    # snapshot all BML properties once - the original objects are neither joined nor parsed directly
+    # equivalent materials are exported as a single material
+    metadata = ExportMetadata(root_collection.all_objects, get_material_remap(context))
+
+    merge_plan = get_merge_plan(root_objects, is_joining_materials(context), metadata)
+    if not bounded_memory:
+        # merge everything in bulk
+        execute_merge_plan(merge_plan, auto_smooth_value)
+
+    def _recursively_parse_nodes(merge_groups):
         nonlocal current_vertices_index
         nonlocal current_vertices_size
 
-        # merge all objects with the same material in the current collection
-        if (
-            "bms_blender_plugin" in context.preferences.addons.keys()
-            and context.preferences.addons[
-                "bms_blender_plugin"
-            ].preferences.do_not_join_materials
-        ):
-            prepared_objects = objects
-        else:
-            prepared_objects = join_objects_with_same_materials(
-                objects, dict(), auto_smooth_value
-            )
-
-        # parse all objects of the current collection
-        for obj in prepared_objects:
+        if bounded_memory:
+            # copies of the meshes (evaluated modifiers, BBL lights which are joined) only exist for this level
+            level_object_names = [
+                object_name for merge_group in merge_groups for object_name in merge_group.object_names
+            ]
+            original_meshes = {
+                object_name: bpy.data.objects[object_name].data
+                for object_name in level_object_names
+                if bpy.data.objects[object_name].type == "MESH"
+            }
+
+            apply_deferred_modifiers([bpy.data.objects[object_name] for object_name in level_object_names])
+            execute_merge_groups(merge_groups, auto_smooth_value)
+
+            for object_name, original_mesh in original_meshes.items():
+                level_object = bpy.data.objects.get(object_name)
+                if level_object is None or level_object.data != original_mesh:
+                    release_mesh(original_mesh, mesh_cache, mesh_users)
+
+        # parse all objects of the current node level
+        for merge_group in merge_groups:
+            obj = bpy.data.objects[merge_group.object_names[0]]
+            # BBL lights have already been joined into the first object, the meshes of a group are merged on parsing
+            if merge_group.is_bbl_light:
+                group_objects = [obj]
+            else:
+                group_objects = [bpy.data.objects[object_name] for object_name in merge_group.object_names]
+            object_metadata = metadata.get(obj)
+            bml_type = object_metadata.bml_type
+            has_children = len(object_metadata.children_names) > 0
             parsed_nodes = None
-            if obj.type == "MESH" and get_bml_type(obj) is None:
+            vertex_indices = []
+            if obj.type == "MESH" and bml_type is None:
                 parsed_nodes = parse_mesh(
                     obj,
                     nodes,
@@ -185,9 +407,15 @@ def get_nodes(context, root_collection, script, auto_smooth_value):
                     material_names,
                     current_vertices_index,
                     current_vertices_size,
+                    mesh_cache,
+                    metadata,
+                    cluster_max_triangles,
+                    cluster_max_size,
+                    group_objects,
+                    auto_smooth_value,
                 )
 
-            elif get_bml_type(obj) == BlenderNodeType.PBR_LIGHT:
+            elif bml_type == BlenderNodeType.PBR_LIGHT:
                 parsed_nodes = parse_bbl_light(
                     obj,
                     nodes,
@@ -195,26 +423,32 @@ def get_nodes(context, root_collection, script, auto_smooth_value):
                     material_names,
                     current_vertices_index,
                     current_vertices_size,
+                    metadata,
                 )
 
-            elif get_bml_type(obj) == BlenderNodeType.SLOT:  # Slots can be empty
-                parsed_nodes = parse_slot(obj, nodes)
+            elif bml_type == BlenderNodeType.SLOT:  # Slots can be empty
+                parsed_nodes = parse_slot(obj, nodes, metadata)
 
-            elif get_bml_type(obj) == BlenderNodeType.SWITCH:
-                if len(obj.children) > 0:  # ignore empty Switches
-                    parse_switch(obj, nodes)
-            elif get_bml_type(obj) == BlenderNodeType.DOF:
-                if len(obj.children) > 0:  # ignore empty DOFs
-                    parse_dof(obj, nodes)
-            elif get_bml_type(obj) == BlenderNodeType.HOTSPOT:
+            elif bml_type == BlenderNodeType.SWITCH:
+                if has_children:  # ignore empty Switches
+                    parse_switch(obj, nodes, metadata)
+            elif bml_type == BlenderNodeType.DOF:
+                if has_children:  # ignore empty DOFs
+                    parse_dof(obj, nodes, metadata)
+            elif bml_type == BlenderNodeType.HOTSPOT:
                 parse_hotspot(obj, hotspots)
 
-            # end of parsing, append parsed data to the nodes list
+            # end of parsing, append parsed data to the buffers
             if parsed_nodes:
-                vertices_data.extend(parsed_nodes.vertex_data)
+                geometry_buffers.append(vertex_indices, parsed_nodes.vertex_data)
                 current_vertices_index += parsed_nodes.vertices_length
                 current_vertices_size += parsed_nodes.vertices_size
 
+                if bounded_memory and obj.type == "MESH":
+                    # the meshes of merged objects are extracted together with the first object of their group
+                    for group_object in group_objects:
+                        free_mesh_data(group_object, placeholder_mesh, mesh_cache, mesh_users)
+
             """
             Certain nodes (dofs, switches) require an _END node which requires the same node index as the "START" node
             The above steps have added +1 to the index count, and so we take the len(nodes) -1 to obtain the parent index
@@ -224,194 +458,179 @@ def get_nodes(context, root_collection, script, auto_smooth_value):
             parent_node_index = len(nodes) -1
 
             # recursively iterate over all children
-            if obj.children:
-                _recursively_parse_nodes(obj.children)
+            if merge_group.children:
+                _recursively_parse_nodes(merge_group.children)
 
             # append the end nodes for Switches, DOFs and Slots
-            if get_bml_type(obj) == BlenderNodeType.SWITCH and len(obj.children) > 0:
+            if bml_type == BlenderNodeType.SWITCH and has_children:
                 nodes.append(SwitchEnd(parent_node_index))
-            elif get_bml_type(obj) == BlenderNodeType.DOF and len(obj.children) > 0:
+            elif bml_type == BlenderNodeType.DOF and has_children:
                 nodes.append(DofEnd(parent_node_index))
-            elif get_bml_type(obj) == BlenderNodeType.SLOT:
+            elif bml_type == BlenderNodeType.SLOT:
                 nodes.append(SlotEnd(parent_node_index))
 
-    # parse all nodes of the root collection
-    root_objects = []
-    for collection_object in root_collection.objects:
-        if collection_object.parent is None:
-            root_objects.append(collection_object)
+    try:
+        # parse all nodes of the root collection
+        _recursively_parse_nodes(merge_plan.root_groups)
 
-    _recursively_parse_nodes(root_objects)
+        if int(script) == -1:
+            # TODO - seems fishy
+            script_no = 0
+        else:
+            script_no = int(script)
 
-    if int(script) == -1:
-        # TODO - seems fishy
-        script_no = 0
-    else:
-        script_no = int(script)
-
-    material_count = len(material_names)
-    data = struct.pack("<II", script_no, material_count)
-    for material_name in material_names:
-        data += struct.pack("<i", len(material_name))
-        data += bytes(material_name, "ascii")
-
-    if len(vertex_indices) < 256:
-        index_buffer_format = IndexBufferFormat.FORMAT_16
-        vertex_indices_data = struct.pack("%sH" % len(vertex_indices), *vertex_indices)
-        vertex_indices_data_size = 2 * len(vertex_indices)
-    else:
-        index_buffer_format = IndexBufferFormat.FORMAT_32
-        vertex_indices_data = struct.pack("%sI" % len(vertex_indices), *vertex_indices)
-        vertex_indices_data_size = 4 * len(vertex_indices)
-
-    # ibFormat, TotalIndices, TotalVertices, NodeCount
-    data += struct.pack(
-        "<IIII",
-        index_buffer_format.value,
-        len(vertex_indices),
-        current_vertices_index,
-        len(nodes),
-    )
+        material_count = len(material_names)
+        payload_file.write(struct.pack("<II", script_no, material_count))
+        for material_name in material_names:
+            payload_file.write(struct.pack("<i", len(material_name)))
+            payload_file.write(bytes(material_name, "ascii"))
+
+        # ibFormat, TotalIndices, TotalVertices, NodeCount
+        payload_file.write(
+            struct.pack(
+                "<IIII",
+                geometry_buffers.index_buffer_format.value,
+                geometry_buffers.index_count,
+                current_vertices_index,
+                len(nodes),
+            )
+        )
 
-    # nodes
-    for node in nodes:
-        data += node.to_data()
+        # nodes - the render controls are already serialized
+        payload_file.write(render_controls.get_data(0))
+        payload_file.write(b"".join(node.to_data() for node in nodes[len(render_controls):]))
 
-    # ibNextIndex
-    data += struct.pack("<I", vertex_indices_data_size)
+        # ibNextIndex
+        payload_file.write(struct.pack("<I", geometry_buffers.index_data_size))
 
-    # ib
-    data += vertex_indices_data
+        # ib
+        geometry_buffers.write_index_buffer(payload_file)
 
-    # vbNextIndex
-    data += struct.pack("<I", current_vertices_size)
+        # vbNextIndex
+        payload_file.write(struct.pack("<I", current_vertices_size))
 
-    # vb
-    data += b"".join(vertices_data)
+        # vb
+        geometry_buffers.write_vertex_buffer(payload_file)
+
+    finally:
+        geometry_buffers.close()
+        if placeholder_mesh:
+            bpy.data.meshes.remove(placeholder_mesh)
 
     return {
-        "data": data,
         "material_names": material_names,
         "nodes_amount": len(nodes),
         "hotspots": hotspots,
     }
 
 
-def join_objects_with_same_materials(objects, materials_objects, auto_smooth_value):
-    """Joins objects of the same BML node level (i.e. not separated by DOFs, Switches or Slots)
-    to a single Blender object. This is critical to reduce draw calls"""
-    object_names = []
-    for obj in objects:
-        if obj:
-            object_names.append(obj.name)
+def free_mesh_data(obj, placeholder_mesh, mesh_cache, mesh_users):
+    """Frees the mesh of an object which has already been extracted. The object itself is kept, since its children
+    still have to be parsed. Meshes which are still used (e.g. by linked duplicates) are kept."""
+    mesh = obj.data
+    obj.data = placeholder_mesh
+    release_mesh(mesh, mesh_cache, mesh_users)
+
+
+def release_mesh(mesh, mesh_cache, mesh_users):
+    """Releases the mesh of an export copy. Once no other copy which still has to be parsed uses it, its cached arrays
+    are dropped and the mesh is removed - unless it is used outside of the export (the mesh of an original)."""
+    mesh_users[mesh.name] -= 1
+    if mesh_users[mesh.name] > 0:
+        return
+
+    mesh_cache.pop(mesh, None)
+    if mesh.users == 0:
+        bpy.data.meshes.remove(mesh)
+
+
+def execute_merge_plan(merge_plan: MergePlan, auto_smooth_value):
+    """Joins the BBL lights of each group of a MergePlan to a single Blender object (the first object of the group).
+    This is critical to reduce draw calls. The meshes of a group are not joined: their extracted arrays are
+    concatenated by parse_mesh(), so linked duplicates are neither copied nor extracted once per object."""
+    execute_merge_groups(merge_plan.get_groups(), auto_smooth_value)
+
+
+def execute_merge_groups(merge_groups, auto_smooth_value):
+    """Joins the BBL lights of each of the given MergeGroups (without their children)"""
+    for merge_group in merge_groups:
+        if not merge_group.is_bbl_light:
+            continue
+
+        objects = [bpy.data.objects[object_name] for object_name in merge_group.object_names]
+        for obj in objects:
+            # the values are stored in the mesh - never touch the mesh of an original or a linked duplicate
+            make_mesh_single_user(obj)
+            store_bbl_light_values(obj)
+
+        if len(objects) > 1:
+            join_objects(objects, auto_smooth_value)
+
+
+def store_bbl_light_values(obj):
+    """Before lights are joined into a common object, their individual object values are stored in
+    separate face variables, so their vertices can be created later.
+    The keys of all stored values is their face index"""
+    # create the data layers - these will be kept in the merged object
+    layer_normal_x = obj.data.polygon_layers_float.new(name="bml_normal_x")
+    layer_normal_y = obj.data.polygon_layers_float.new(name="bml_normal_y")
+    layer_normal_z = obj.data.polygon_layers_float.new(name="bml_normal_z")
+
+    layer_color_r = obj.data.polygon_layers_float.new(name="bml_color_r")
+    layer_color_g = obj.data.polygon_layers_float.new(name="bml_color_g")
+    layer_color_b = obj.data.polygon_layers_float.new(name="bml_color_b")
+    layer_color_a = obj.data.polygon_layers_float.new(name="bml_color_a")
+
+    for face in obj.data.polygons:
+        # assert that each light has only one face and 4 verts
+        if len(face.vertices) != 4:
+            raise Exception(
+                f"Object '{obj.name}' is a malformed light (needs exactly 4 vertices per face)"
+            )
+        # normal
+        if obj.bml_light_directional:
+            # directional light
+            layer_normal_x.data[face.index].value = face.normal.x
+            layer_normal_y.data[face.index].value = face.normal.y
+            layer_normal_z.data[face.index].value = face.normal.z
 
-    for obj_name in object_names:
-        obj = bpy.data.objects[obj_name]
+        else:
+            # omnidirectional
+            layer_normal_x.data[face.index].value = 0
+            layer_normal_y.data[face.index].value = 0
+            layer_normal_z.data[face.index].value = 0
 
+        # color
+        layer_color_r.data[face.index].value = obj.color[0]
+        layer_color_g.data[face.index].value = obj.color[1]
+        layer_color_b.data[face.index].value = obj.color[2]
+        layer_color_a.data[face.index].value = obj.color[3]
 
-        if obj.type == "MESH":
-            # regular meshes
-            # "do not merge" flag - just use a custom material name which will never be looked up
-            # enhance this by including BBOXs in the do not merge category - Otherwise joined objects will not render
-            if obj.bml_do_not_merge or get_bml_type(obj) == BlenderNodeType.BBOX:
-                materials_objects[obj.name] = [obj]
-                continue
 
-            if len(obj.material_slots) > 0:
-                material_name = obj.material_slots[0].name
-            else:
-                material_name = "BML-Default"
-
-            # if the object is a child of a switch, prepend the switch name, so they are only merged with materials
-            # within their switch level
-            if get_bml_type(obj.parent) is BlenderNodeType.SWITCH:
-                material_name += obj.parent.name + "_" + material_name
-
-            # before we join the lights into a common object, we need to store their individual object values in
-            # separate face variables, so we can create their vertices later
-            # the keys of all stored values is their face index
-
-            if get_bml_type(obj) == BlenderNodeType.PBR_LIGHT:
-                # make sure we only join lights with other lights - simply change the key
-                material_name = "BML_BBL_" + material_name
-
-                # create the data layers - these will be kept in the merged object
-                layer_normal_x = obj.data.polygon_layers_float.new(name="bml_normal_x")
-                layer_normal_y = obj.data.polygon_layers_float.new(name="bml_normal_y")
-                layer_normal_z = obj.data.polygon_layers_float.new(name="bml_normal_z")
-
-                layer_color_r = obj.data.polygon_layers_float.new(name="bml_color_r")
-                layer_color_g = obj.data.polygon_layers_float.new(name="bml_color_g")
-                layer_color_b = obj.data.polygon_layers_float.new(name="bml_color_b")
-                layer_color_a = obj.data.polygon_layers_float.new(name="bml_color_a")
-
-                for face in obj.data.polygons:
-                    # assert that each light has only one face and 4 verts
-                    if len(face.vertices) != 4:
-                        raise Exception(
-                            f"Object '{obj.name}' is a malformed light (needs exactly 4 vertices per face)"
-                        )
-                    # normal
-                    if obj.bml_light_directional:
-                        # directional light
-                        layer_normal_x.data[face.index].value = face.normal.x
-                        layer_normal_y.data[face.index].value = face.normal.y
-                        layer_normal_z.data[face.index].value = face.normal.z
-
-                    else:
-                        # omnidirectional
-                        layer_normal_x.data[face.index].value = 0
-                        layer_normal_y.data[face.index].value = 0
-                        layer_normal_z.data[face.index].value = 0
-
-                    # color
-                    layer_color_r.data[face.index].value = obj.color[0]
-                    layer_color_g.data[face.index].value = obj.color[1]
-                    layer_color_b.data[face.index].value = obj.color[2]
-                    layer_color_a.data[face.index].value = obj.color[3]
-
-            object_with_same_material_list = materials_objects.get(material_name)
-
-            # join objects with the same material name
-            if object_with_same_material_list is not None:
-                if len(object_with_same_material_list) != 1:
-                    raise Exception("Invalid length of material list objects")
-
-                object_with_same_material = object_with_same_material_list[0]
-
-                # force autosmooth on the objects to be merged (reason: when joining, Blender will override the
-                # smoothing options to the last object selected)
-                if (
-                    object_with_same_material.data.use_auto_smooth
-                    or obj.data.use_auto_smooth
-                ):
-                    force_auto_smoothing_on_object(
-                        object_with_same_material, auto_smooth_value
-                    )
-                    force_auto_smoothing_on_object(obj, auto_smooth_value)
-
-                bpy.ops.object.select_all(action="DESELECT")
-                obj.select_set(True)
-                object_with_same_material.select_set(True)
-                bpy.context.view_layer.objects.active = object_with_same_material
-                bpy.ops.object.join()
+def join_objects(objects, auto_smooth_value):
+    """Joins a list of objects into the first one with a single join operation"""
+    target_object = objects[0]
 
-            else:
-                # no entries found, add material and obj as new entries
-                materials_objects[material_name] = [obj]
-
-        # make sure that DOFs, Switches and Slots are never joined
-        elif obj.type == "EMPTY" and (
-            get_bml_type(obj) == BlenderNodeType.DOF
-            or get_bml_type(obj) == BlenderNodeType.SWITCH
-            or get_bml_type(obj) == BlenderNodeType.SLOT
-            # we can also add hotspots here so their children will be parsed as well
-            or get_bml_type(obj) == BlenderNodeType.HOTSPOT
-        ):
-            materials_objects["_DOF_OR_SWITCH_OR_SLOT_OR_HOTSPOT_" + obj.name] = [obj]
-
-        elif obj.type == "EMPTY":
-            # add default empties as well so their children can be parsed
-            materials_objects["_EMPTY_" + obj.name] = [obj]
-    
-    return [item for sublist in materials_objects.values() for item in sublist]
+    # joining modifies the meshes - never touch the data of linked duplicates
+    for obj in objects:
+        make_mesh_single_user(obj)
+
+    # force autosmooth on the objects to be merged (reason: when joining, Blender will override the
+    # smoothing options to the last object selected)
+    if any(obj.data.use_auto_smooth for obj in objects):
+        for obj in objects:
+            force_auto_smoothing_on_object(obj, auto_smooth_value)
+
+    # keep the children of the joined objects - they are moved to the target without changing their position
+    target_world_inverted = target_object.matrix_world.inverted_safe()
+    for obj in objects[1:]:
+        for child in obj.children:
+            child_parent_inverse = target_world_inverted @ obj.matrix_world @ child.matrix_parent_inverse
+            child.parent = target_object
+            child.matrix_parent_inverse = child_parent_inverse
+
+    bpy.ops.object.select_all(action="DESELECT")
+    for obj in objects:
+        obj.select_set(True)
+    bpy.context.view_layer.objects.active = target_object
+    bpy.ops.object.join()
@@ -0,0 +1,325 @@
+import hashlib
+import json
+import os
+
+import bpy
+import numpy as np
+
+from bms_blender_plugin.common.export_settings import ExportSettings
+from bms_blender_plugin.common.image_pixels import get_image_pixels
+from bms_blender_plugin.common.util import get_dofs, get_switches
+from bms_blender_plugin.exporter.export_render_controls import SerializedRenderControls
+from bms_blender_plugin.exporter.merge_plan import get_root_objects, is_joining_materials
+
+MANIFEST_FILE_NAME = "BmlExport.manifest.json"
+MANIFEST_VERSION = 1
+
+# settings which only change how the export runs, not its output
+RUNTIME_EXPORT_SETTINGS = [
+    "bounded_memory",
+    "parallel_lods",
+    "lod_workers",
+    "incremental",
+    "texture_workers",
+    "texture_cache_directory",
+    "texture_cache_size",
+]
+
+# custom object properties of the plugin
+BML_PROPERTY_PREFIXES = ("bml_", "dof_", "switch_")
+
+
+class ExportManifest:
+    """Records a fingerprint of the inputs of each exported file in a manifest next to the exported files. Files whose
+    fingerprint did not change since the last export (and which still exist) are skipped.
+    A fingerprint is a dict of named components (e.g. "meshes", "settings"), so the reason for a rebuild can be
+    reported."""
+
+    def __init__(self, file_directory):
+        self.file_directory = file_directory
+        self.manifest_path = os.path.join(file_directory, MANIFEST_FILE_NAME)
+        self.previous_artifacts = {}
+        self.artifacts = {}
+        self.rebuilt = []
+        self.skipped = []
+
+        if os.path.exists(self.manifest_path):
+            try:
+                with open(self.manifest_path, "r") as manifest_file:
+                    manifest = json.load(manifest_file)
+                if manifest.get("version") == MANIFEST_VERSION:
+                    self.previous_artifacts = manifest["artifacts"]
+            except (OSError, ValueError, KeyError):
+                print(f"Could not read {self.manifest_path}, exporting all files")
+
+    def get_rebuild_reason(self, file_name, fingerprint, output_files=None):
+        """Returns why a file has to be exported or None if it is up to date. Up to date files are reported as
+        skipped and kept in the manifest.
+        output_files are the names of all files which are written together with the file (e.g. the .bml and .mti of a
+        LOD), it is up to date only if all of them still exist. Defaults to the file itself."""
+        if output_files is None:
+            output_files = [file_name]
+
+        previous_artifact = self.previous_artifacts.get(file_name)
+        missing_files = [
+            output_file
+            for output_file in output_files
+            if not os.path.exists(os.path.join(self.file_directory, output_file))
+        ]
+        if previous_artifact is None:
+            reason = "not exported before"
+        elif missing_files:
+            reason = "missing " + ", ".join(missing_files)
+        else:
+            changed_components = [
+                component
+                for component in sorted(set(fingerprint) | set(previous_artifact["fingerprint"]))
+                if fingerprint.get(component) != previous_artifact["fingerprint"].get(component)
+            ]
+            if not changed_components:
+                self.skipped.append(file_name)
+                self.artifacts[file_name] = previous_artifact
+                return None
+            reason = "changed " + ", ".join(changed_components)
+
+        self.rebuilt.append((file_name, reason))
+        return reason
+
+    def get_data(self, file_name):
+        """Returns the data which was stored together with a file (e.g. the material names of a LOD)"""
+        return self.previous_artifacts[file_name].get("data")
+
+    def record(self, file_name, fingerprint, data=None):
+        """Stores the fingerprint of a file which has just been exported"""
+        self.artifacts[file_name] = {"fingerprint": fingerprint, "data": data}
+
+    def get_draft_files(self):
+        """Returns the files of the manifest which were exported with the draft texture quality"""
+        return sorted(
+            file_name
+            for file_name, artifact in self.artifacts.items()
+            if artifact["fingerprint"].get("quality", "").startswith("DRAFT")
+        )
+
+    def save(self):
+        with open(self.manifest_path, "w") as manifest_file:
+            json.dump({"version": MANIFEST_VERSION, "artifacts": self.artifacts}, manifest_file, indent=2)
+
+    def get_report(self):
+        for file_name, reason in self.rebuilt:
+            print(f"Rebuilt {file_name}: {reason}")
+        for file_name in self.skipped:
+            print(f"Skipped {file_name}: unchanged")
+
+        return f"{len(self.rebuilt)} files rebuilt, {len(self.skipped)} unchanged"
+
+
+def get_hash(data):
+    return hashlib.sha1(data if isinstance(data, bytes) else str(data).encode("utf-8")).hexdigest()
+
+
+def hash_rna_properties(hasher, struct, identifiers=None, depth=0):
+    """Hashes the values of all (or the given) RNA properties of a Blender struct. IDs are hashed by name, nested
+    structs and collections up to two levels deep."""
+    for rna_property in struct.bl_rna.properties:
+        identifier = rna_property.identifier
+        if identifier == "rna_type" or (identifiers is not None and not identifiers(identifier)):
+            continue
+
+        value = getattr(struct, identifier, None)
+        hasher.update(identifier.encode("utf-8"))
+
+        if rna_property.type == "POINTER":
+            if value is None:
+                hasher.update(b"None")
+            elif isinstance(value, bpy.types.ID):
+                hasher.update(value.name.encode("utf-8"))
+            elif depth < 2:
+                hash_rna_properties(hasher, value, None, depth + 1)
+
+        elif rna_property.type == "COLLECTION":
+            if depth < 2:
+                for item in value:
+                    hash_rna_properties(hasher, item, None, depth + 1)
+
+        elif getattr(rna_property, "is_array", False):
+            hasher.update(repr([tuple(row) if hasattr(row, "__len__") else row for row in value]).encode("utf-8"))
+
+        else:
+            if isinstance(value, set):
+                # enum flags
+                value = sorted(value)
+            hasher.update(repr(value).encode("utf-8"))
+
+
+def hash_foreach(hasher, collection, attribute, dtype, width=1):
+    array = np.empty(len(collection) * width, dtype=dtype)
+    collection.foreach_get(attribute, array)
+    hasher.update(array.tobytes())
+
+
+def hash_vertex_weights(hasher, mesh):
+    """Hashes the vertex group weights of a mesh (e.g. for Armature modifiers or shape keys)"""
+    for vertex in mesh.vertices:
+        hasher.update(repr([(group.group, group.weight) for group in vertex.groups]).encode("utf-8"))
+
+
+def hash_mesh(hasher, mesh, has_vertex_groups=False):
+    """Hashes all mesh data which ends up in the BML. The vertex group weights are only hashed if the object has
+    vertex groups, as they have to be read vertex by vertex."""
+    hash_foreach(hasher, mesh.vertices, "co", np.float32, 3)
+    hash_foreach(hasher, mesh.edges, "use_edge_sharp", bool)
+    hash_foreach(hasher, mesh.loops, "vertex_index", np.int32)
+    hash_foreach(hasher, mesh.polygons, "loop_total", np.int32)
+    hash_foreach(hasher, mesh.polygons, "material_index", np.int32)
+    hash_foreach(hasher, mesh.polygons, "use_smooth", bool)
+
+    for uv_layer in mesh.uv_layers:
+        hasher.update(uv_layer.name.encode("utf-8"))
+        hash_foreach(hasher, uv_layer.data, "uv", np.float32, 2)
+
+    if mesh.has_custom_normals:
+        mesh.calc_normals_split()
+        hash_foreach(hasher, mesh.loops, "normal", np.float32, 3)
+
+    if mesh.shape_keys:
+        hasher.update(repr((mesh.shape_keys.use_relative, mesh.shape_keys.eval_time)).encode("utf-8"))
+        for key_block in mesh.shape_keys.key_blocks:
+            # the evaluated mesh is exported, so the value, mute, range and vertex group of each key matter as well
+            hash_rna_properties(
+                hasher, key_block, lambda identifier: identifier not in ["data", "points", "relative_key"]
+            )
+            hasher.update(key_block.relative_key.name.encode("utf-8"))
+            hash_foreach(hasher, key_block.data, "co", np.float32, 3)
+
+    if has_vertex_groups:
+        hash_vertex_weights(hasher, mesh)
+
+    hasher.update(repr((mesh.use_auto_smooth, mesh.auto_smooth_angle)).encode("utf-8"))
+    hasher.update(repr([material.name if material else None for material in mesh.materials]).encode("utf-8"))
+
+
+def get_referenced_objects(modifier):
+    """Returns the objects a modifier reads (e.g. the armature, a boolean operand or a mirror object)"""
+    return [
+        getattr(modifier, rna_property.identifier)
+        for rna_property in modifier.bl_rna.properties
+        if rna_property.type == "POINTER" and isinstance(getattr(modifier, rna_property.identifier), bpy.types.Object)
+    ]
+
+
+def hash_referenced_object(hasher, obj, hashed_meshes):
+    """Hashes the state of an object which a modifier reads: its transform, the pose of an armature and its data"""
+    hasher.update(obj.name.encode("utf-8"))
+    hasher.update(repr([tuple(row) for row in obj.matrix_world]).encode("utf-8"))
+
+    if obj.type == "ARMATURE" and obj.pose:
+        for pose_bone in obj.pose.bones:
+            hasher.update(repr((pose_bone.name, [tuple(row) for row in pose_bone.matrix])).encode("utf-8"))
+    elif obj.type == "MESH" and obj.data:
+        if obj.data.name not in hashed_meshes:
+            hashed_meshes.add(obj.data.name)
+            hash_mesh(hasher, obj.data, len(obj.vertex_groups) > 0)
+    elif obj.data:
+        hash_rna_properties(hasher, obj.data)
+
+
+def get_export_settings_fingerprint(export_settings: ExportSettings, *additional_values):
+    settings = export_settings.to_dict()
+    for runtime_setting in RUNTIME_EXPORT_SETTINGS:
+        settings.pop(runtime_setting, None)
+    return get_hash(repr((sorted(settings.items()), additional_values)))
+
+
+def get_lod_fingerprint(
+    context,
+    lod,
+    scale_factor,
+    export_settings: ExportSettings,
+    render_controls: SerializedRenderControls,
+    material_remap=None,
+):
+    """Returns the fingerprint of all inputs of the BML and MTI file of a LOD: its objects, their meshes, the
+    material sets, the DOF node tree and the export settings (including the settings of the LOD itself and the
+    merged equivalent materials)"""
+    objects_hasher = hashlib.sha1()
+    meshes_hasher = hashlib.sha1()
+    hashed_meshes = set()
+    hashed_referenced_meshes = set()
+
+    def _hash_object(obj):
+        hash_rna_properties(
+            objects_hasher,
+            obj,
+            lambda identifier: identifier in [
+                "name", "type", "parent", "matrix_world", "hide_render", "color", "data", "rotation_mode",
+                "rotation_quaternion", "location", "matrix_parent_inverse"
+            ] or identifier.startswith(BML_PROPERTY_PREFIXES),
+        )
+        for material_slot in obj.material_slots:
+            objects_hasher.update(
+                repr((material_slot.link, material_slot.material.name if material_slot.material else None))
+                .encode("utf-8")
+            )
+        for modifier in obj.modifiers:
+            hash_rna_properties(objects_hasher, modifier)
+            # objects are only hashed by name, but moving or posing them changes the evaluated mesh as well
+            for referenced_object in get_referenced_objects(modifier):
+                hash_referenced_object(objects_hasher, referenced_object, hashed_referenced_meshes)
+
+        # the weights are stored in the mesh, the names of the groups in the object
+        objects_hasher.update(repr([vertex_group.name for vertex_group in obj.vertex_groups]).encode("utf-8"))
+
+        if obj.type == "MESH" and obj.data and obj.data.name not in hashed_meshes:
+            hashed_meshes.add(obj.data.name)
+            meshes_hasher.update(obj.data.name.encode("utf-8"))
+            hash_mesh(meshes_hasher, obj.data, len(obj.vertex_groups) > 0)
+
+        # the children are exported even if they are not part of the collection
+        for child in sorted(obj.children, key=lambda child_object: child_object.name):
+            _hash_object(child)
+
+    for root_object in sorted(get_root_objects(lod.collection), key=lambda obj: obj.name):
+        _hash_object(root_object)
+
+    material_sets_hasher = hashlib.sha1()
+    for material_set in context.scene.bml_material_sets:
+        hash_rna_properties(material_sets_hasher, material_set)
+
+    # the DOF node tree is fingerprinted by its exported nodes
+    dof_tree = get_hash(render_controls.data)
+    dof_tree = get_hash(repr((dof_tree, [(dof.dof_number, dof.name) for dof in get_dofs()],
+                              [(switch.switch_number, switch.branch) for switch in get_switches()])))
+
+    return {
+        "objects": objects_hasher.hexdigest(),
+        "meshes": meshes_hasher.hexdigest(),
+        "material_sets": material_sets_hasher.hexdigest(),
+        "dof_tree": dof_tree,
+        "settings": get_export_settings_fingerprint(
+            export_settings,
+            scale_factor,
+            is_joining_materials(context),
+            lod.cluster_max_triangles,
+            lod.cluster_max_size,
+            sorted((material_remap or {}).items()),
+        ),
+    }
+
+
+def get_image_fingerprint(image):
+    """Returns the fingerprint of a Blender image: its source file or packed data, the pixels are only read if the
+    image has unsaved changes or no file at all"""
+    hasher = hashlib.sha1()
+    hasher.update(repr([image.name, image.filepath, tuple(image.size), image.colorspace_settings.name]).encode("utf-8"))
+
+    file_path = bpy.path.abspath(image.filepath)
+    if image.is_dirty or (not image.packed_file and not os.path.exists(file_path)):
+        hasher.update(get_image_pixels(image).tobytes())
+    elif image.packed_file:
+        hasher.update(image.packed_file.data)
+    else:
+        file_stat = os.stat(file_path)
+        hasher.update(repr((file_stat.st_size, file_stat.st_mtime_ns)).encode("utf-8"))
+
+    return hasher.hexdigest()
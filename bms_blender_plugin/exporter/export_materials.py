@@ -24,9 +24,10 @@ from bms_blender_plugin.common.blender_types import (
     BlenderEditorNodeType,
     BlenderNodeTreeType,
 )
-from bms_blender_plugin.common.export_dds import save_dds
 from bms_blender_plugin.common.export_settings import ExportSettings
-from bms_blender_plugin.ext.blender_dds_addon.directx.texconv import unload_texconv
+from bms_blender_plugin.exporter.export_manifest import ExportManifest, get_hash
+from bms_blender_plugin.exporter.export_textures import export_textures, get_texture_jobs
+from bms_blender_plugin.exporter.merge_plan import is_merging_equivalent_materials
 from bms_blender_plugin.nodes_editor.material_editor import MaterialNodeTree
 from bms_blender_plugin.nodes_editor.material_nodes.material_util import (
     get_albedo_texture,
@@ -209,11 +210,68 @@ def get_materials(material_node_tree: MaterialNodeTree):
     return materials
 
 
+def get_material_content_key(material: Material, include_textures=True):
+    """Returns the serialized content of a material without its name - materials with the same key render the same.
+    Without the textures, materials with the same key only differ by their textures."""
+    excluded_keys = ["Name"] if include_textures else ["Name", "Textures"]
+    content = {key: value for key, value in material.__dict__.items() if key not in excluded_keys}
+    return json.dumps(content, sort_keys=True, default=lambda o: o.__dict__)
+
+
+def get_material_remap(context):
+    """Returns a dict which maps materials of the custom BML material tree to an equivalent material, so both can be
+    merged into the same primitive. Materials are equivalent if their textures, flags, shader parameters, template,
+    samplers and blend are equal - and so are their alternatives in each material set. Of each group of equivalent
+    materials, the first one by name is kept (and not part of the dict)."""
+    if not is_merging_equivalent_materials(context):
+        return {}
+
+    materials_in_file_map = {material.Name: material for material in get_all_materials()}
+
+    def _get_content_key(material_name):
+        material = materials_in_file_map.get(material_name)
+        if not material:
+            material = Material.get_default(material_name)
+        return get_material_content_key(material)
+
+    # material sets are only exported if there is more than the base set
+    material_sets = []
+    if len(context.scene.bml_material_sets) > 1:
+        for material_set in context.scene.bml_material_sets:
+            material_sets.append({
+                m.base_material.name: m.alternative_material.name
+                for m in material_set.material_alternatives
+                if m.base_material and m.alternative_material
+            })
+
+    kept_material_names = {}
+    material_remap = {}
+    for material_name in sorted(materials_in_file_map.keys()):
+        signature = (
+            _get_content_key(material_name),
+            tuple(
+                _get_content_key(material_names_dict[material_name]) if material_name in material_names_dict else None
+                for material_names_dict in material_sets
+            ),
+        )
+        kept_material_name = kept_material_names.setdefault(signature, material_name)
+        if kept_material_name != material_name:
+            material_remap[material_name] = kept_material_name
+
+    return material_remap
+
+
 def export_materials(
-    material_names_in_model, file_directory, export_settings: ExportSettings
+    material_names_in_model,
+    file_directory,
+    export_settings: ExportSettings,
+    manifest: ExportManifest = None,
+    texture_manifest: ExportManifest = None,
 ):
     """Exports all materials which are both defined in the model and the custom BML material tree as Material.mtl.
-    Also exports all textures of those materials as DDS."""
+    Also exports all textures of those materials as DDS. With a manifest, unchanged files are skipped. The textures
+    use texture_manifest if it is given (e.g. draft exports always skip unchanged textures).
+    Returns the report of the texture export or None."""
     materials_to_export = MaterialRootObject(list())
 
     # represents all materials which are in the MaterialNodeTree
@@ -235,48 +293,37 @@ def export_materials(
 
     if export_settings.export_materials_file:
         material_filepath = os.path.join(file_directory, "Materials.mtl")
-        with open(material_filepath, "w") as material_file:
-            material_file.write(
-                json.dumps(
-                    materials_to_export,
-                    indent=2,
-                    default=lambda o: dict(
-                        (key, value)
-                        for key, value in o.__dict__.items()
-                        if value or value == 0
-                    ),
-                )
-            )
-        print(f"Exported materials file: {material_filepath}")
+        materials_json = json.dumps(
+            materials_to_export,
+            indent=2,
+            default=lambda o: dict(
+                (key, value)
+                for key, value in o.__dict__.items()
+                if value or value == 0
+            ),
+        )
+
+        # the material node tree is completely serialized in the file
+        fingerprint = {"content": get_hash(materials_json)}
+        if not manifest or manifest.get_rebuild_reason("Materials.mtl", fingerprint) is not None:
+            with open(material_filepath, "w") as material_file:
+                material_file.write(materials_json)
+            print(f"Exported materials file: {material_filepath}")
+
+            if manifest:
+                manifest.record("Materials.mtl", fingerprint)
 
     # DDS texture export
     if export_settings.export_textures:
-        for material_obj in materials_to_export.Materials:
-            if material_obj.Name in bpy.data.materials.keys():
-                blender_material = bpy.data.materials[material_obj.Name]
-
-                textures_to_be_exported = [
-                    (get_albedo_texture(blender_material), "BC7_UNORM_SRGB"),
-                    (get_armw_texture(blender_material), "BC7_UNORM"),
-                    (get_normal_texture(blender_material), "BC5_UNORM"),
-                    (get_emissive_texture(blender_material), "BC7_UNORM"),
-                ]
-
-                for texture, texture_format in textures_to_be_exported:
-                    if texture:
-                        texture_filepath = os.path.join(
-                            file_directory, get_dds_texture_export_file_name(texture)
-                        )
-                        print(f"Exporting DDS file: {texture_filepath} ...")
-
-                        save_dds(
-                            tex=texture,
-                            file=texture_filepath,
-                            dds_fmt=texture_format,
-                            allow_slow_codec=export_settings.allow_slow_texture_codecs,
-                        )
+        texture_jobs = get_texture_jobs(
+            [material.Name for material in materials_to_export.Materials],
+            file_directory,
+            export_settings,
+            texture_manifest or manifest,
+        )
+        return export_textures(texture_jobs, export_settings)
 
-                    unload_texconv()
+    return None
 
 
 def export_material_sets(context, material_set_filepath, material_names_in_model):
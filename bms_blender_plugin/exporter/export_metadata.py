@@ -0,0 +1,163 @@
+from bms_blender_plugin.common.blender_types import BlenderNodeType
+from bms_blender_plugin.common.bml_structs import DofType
+from bms_blender_plugin.common.util import get_bml_type, get_dofs, get_switches
+
+
+class ObjectMetadata:
+    """Snapshot of all BML relevant properties of a single Blender object. Values which do not apply to the type of
+    the object are None."""
+    name: str
+    bml_type: BlenderNodeType
+    children_names: list[str]
+    is_exported: bool
+    do_not_merge: bool
+
+    dof_list_index: int
+    dof_number: int
+    dof_type: DofType
+    dof_min: float
+    dof_max: float
+    dof_min_input: float
+    dof_max_input: float
+    dof_multiplier: float
+    dof_multiply_min_max: bool
+    dof_flags: int
+
+    switch_list_index: int
+    switch_number: int
+    switch_branch: int
+    switch_default_on: bool
+
+    slot_number: int
+
+    def __init__(self, obj):
+        self.name = obj.name
+        self.bml_type = get_bml_type(obj)
+        # note that joining objects moves their children - this is the state before any objects are joined
+        self.children_names = [child.name for child in obj.children]
+        # the same objects which are skipped when copying the model for the export
+        self.is_exported = not obj.hide_render and len(obj.users_collection) > 0
+        self.do_not_merge = obj.bml_do_not_merge
+
+        self.dof_list_index = None
+        self.dof_number = None
+        self.dof_type = None
+        self.dof_min = None
+        self.dof_max = None
+        self.dof_min_input = None
+        self.dof_max_input = None
+        self.dof_multiplier = None
+        self.dof_multiply_min_max = None
+        self.dof_flags = None
+
+        self.switch_list_index = None
+        self.switch_number = None
+        self.switch_branch = None
+        self.switch_default_on = None
+
+        self.slot_number = None
+
+        if self.bml_type == BlenderNodeType.DOF:
+            self.dof_list_index = obj.dof_list_index
+            try:
+                self.dof_number = get_dofs()[obj.dof_list_index].dof_number
+            except IndexError:
+                # only raised when the number is actually needed
+                pass
+            self.dof_type = DofType[obj.dof_type]
+            self.dof_min = obj.dof_min
+            self.dof_max = obj.dof_max
+            self.dof_min_input = obj.dof_min_input
+            self.dof_max_input = obj.dof_max_input
+            self.dof_multiplier = obj.dof_multiplier
+            self.dof_multiply_min_max = obj.dof_multiply_min_max
+
+            self.dof_flags = 0
+            if obj.dof_check_limits:
+                self.dof_flags |= 0x00000001
+            if obj.dof_reverse:
+                self.dof_flags |= 0x00000002
+            if obj.dof_normalise:
+                self.dof_flags |= 0x00000004
+
+        elif self.bml_type == BlenderNodeType.SWITCH:
+            self.switch_list_index = obj.switch_list_index
+            try:
+                switch = get_switches()[obj.switch_list_index]
+                self.switch_number = switch.switch_number
+                self.switch_branch = switch.branch
+            except IndexError:
+                pass
+            self.switch_default_on = obj.switch_default_on
+
+        elif self.bml_type == BlenderNodeType.SLOT:
+            self.slot_number = obj.bml_slot_number
+
+    def __repr__(self):
+        return f"{self.name}: {self.bml_type}"
+
+    def get_dof_number(self):
+        if self.dof_number is None:
+            raise IndexError(
+                f"DOF index {self.dof_list_index} not found in dof.xml. Object: {self.name}. "
+                f"Please update XML files and reload DOF list."
+            )
+        return self.dof_number
+
+    def get_switch_number_and_branch(self):
+        if self.switch_number is None:
+            raise IndexError(
+                f"Switch index {self.switch_list_index} not found in switch.xml. Object: {self.name}. "
+                f"Please update XML files and reload switch list."
+            )
+        return self.switch_number, self.switch_branch
+
+
+class ExportMetadata:
+    """Table of ObjectMetadata by object name which is created once per export, so the exporter stages do not have to
+    look up the custom properties of each object again and again.
+    Objects which were not part of the snapshot are added when they are first requested.
+    The material remap maps materials to an equivalent material which is exported in their place."""
+    objects: dict[str, ObjectMetadata]
+    material_remap: dict[str, str]
+
+    def __init__(self, objects=(), material_remap=None):
+        self.objects = {}
+        for obj in objects:
+            self.objects[obj.name] = ObjectMetadata(obj)
+        self.material_remap = material_remap or {}
+
+    def get(self, obj):
+        """Returns the ObjectMetadata of an object or None if the object is None"""
+        if obj is None:
+            return None
+
+        object_metadata = self.objects.get(obj.name)
+        if object_metadata is None:
+            object_metadata = ObjectMetadata(obj)
+            self.objects[obj.name] = object_metadata
+        return object_metadata
+
+    def get_material_name(self, material_name):
+        """Returns the name of the material which is exported in place of a material"""
+        return self.material_remap.get(material_name, material_name)
+
+    def get_bml_type(self, obj):
+        """Returns the custom type of an object, same as util.get_bml_type"""
+        if obj is None:
+            return None
+        return self.get(obj).bml_type
+
+    def is_dof_of_type(self, obj, dof_type: DofType):
+        object_metadata = self.get(obj)
+        return (
+            object_metadata is not None
+            and object_metadata.bml_type == BlenderNodeType.DOF
+            and object_metadata.dof_type == dof_type
+        )
+
+    def get_non_translate_dof_parent(self, obj):
+        """Returns the first object in the parent chain (including the object itself) which is not a TRANSLATE DOF"""
+        while obj is not None and self.is_dof_of_type(obj, DofType.TRANSLATE):
+            obj = obj.parent
+        return obj
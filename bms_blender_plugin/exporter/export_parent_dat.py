@@ -2,44 +2,38 @@ import operator
 import os
 
 from bms_blender_plugin.common.blender_types import BlenderNodeType
-from bms_blender_plugin.common.util import (
-    get_bml_type,
-    get_switches,
-    get_dofs,
-    get_bounding_sphere,
-)
+from bms_blender_plugin.common.util import get_bounding_sphere
 from bms_blender_plugin.common.coordinates import to_bms_coords
+from bms_blender_plugin.exporter.export_manifest import ExportManifest, get_hash
+from bms_blender_plugin.exporter.export_metadata import ExportMetadata
 
 
-def get_highest_switch_and_dof_number(objs):
+def get_highest_switch_and_dof_number(objs, metadata: ExportMetadata = None):
     """Returns the highest values of dofs and switches. Required for the Parent.dat"""
+    if metadata is None:
+        metadata = ExportMetadata()
+
     # default value 0 to prevent editor crashing
     highest_switch_number = 0
     highest_dof_number = 0
     BMS_MAX_VALUE = 2048
 
     for obj in objs:
-        if len(obj.children) > 0:
-            if get_bml_type(obj) == BlenderNodeType.SWITCH:
-                try:
-                    switch = get_switches()[obj.switch_list_index]
-                    """parent.dat requires max(switch)+1 to function correctly due to a = vs <= issue in the BMS code. 
-                    This Should be resolved for 4.38."""
-                    required_switch_index = switch.switch_number+1
-                    if required_switch_index > highest_switch_number:
-                        highest_switch_number = required_switch_index
-                except IndexError:
-                    raise IndexError(f"Switch index {obj.switch_list_index} not found in switch.xml. Object: {obj.name}. Please update XML files and reload switch list.")
-            elif get_bml_type(obj) == BlenderNodeType.DOF:
-                try:
-                    dof = get_dofs()[obj.dof_list_index]
-                    """parent.dat requires max(dof)+1 to function correctly due to a = vs <= issue in the BMS code. 
-                    This Should be resolved for 4.38."""
-                    required_dof_index = dof.dof_number+1
-                    if required_dof_index > highest_dof_number:
-                        highest_dof_number = required_dof_index
-                except IndexError:
-                    raise IndexError(f"DOF index {obj.dof_list_index} not found in dof.xml. Object: {obj.name}. Please update XML files and reload DOF list.")
+        object_metadata = metadata.get(obj)
+        if len(object_metadata.children_names) > 0:
+            if object_metadata.bml_type == BlenderNodeType.SWITCH:
+                switch_number, _ = object_metadata.get_switch_number_and_branch()
+                """parent.dat requires max(switch)+1 to function correctly due to a = vs <= issue in the BMS code. 
+                This Should be resolved for 4.38."""
+                required_switch_index = switch_number+1
+                if required_switch_index > highest_switch_number:
+                    highest_switch_number = required_switch_index
+            elif object_metadata.bml_type == BlenderNodeType.DOF:
+                """parent.dat requires max(dof)+1 to function correctly due to a = vs <= issue in the BMS code. 
+                This Should be resolved for 4.38."""
+                required_dof_index = object_metadata.get_dof_number()+1
+                if required_dof_index > highest_dof_number:
+                    highest_dof_number = required_dof_index
 
     # Cap values at BMS maximum
     highest_switch_number = min(highest_switch_number, BMS_MAX_VALUE)
@@ -48,11 +42,14 @@ def get_highest_switch_and_dof_number(objs):
     return highest_switch_number, highest_dof_number
 
 
-def get_slots(scene):
+def get_slots(scene, metadata: ExportMetadata = None):
     """Returns the amount of Slots in a scene. Required for the Parent.dat"""
+    if metadata is None:
+        metadata = ExportMetadata()
+
     if scene:
         return [
-            obj for obj in scene.objects if get_bml_type(obj) == BlenderNodeType.SLOT
+            obj for obj in scene.objects if metadata.get_bml_type(obj) == BlenderNodeType.SLOT
         ]
     else:
         return []
@@ -68,58 +65,72 @@ def export_parent_dat(
     number_of_texture_sets,
     slot_list,
     lod_list,
+    metadata: ExportMetadata = None,
+    manifest: ExportManifest = None,
+    bounding_sphere_lod_only=False,
 ):
-    """Exports the Parent.dat as a file"""
+    """Exports the Parent.dat as a file. The bounding sphere encloses all objects of the scene or only the visible
+    objects of the nearest LOD."""
     parent_dat_filepath = os.path.join(file_directory, "Parent.dat")
 
     # note: the "Switches" and "Dofs" config in the Parent.dat don't actually amount to the number of DOFs/switches but
     # to the highest dof_number in the model
     highest_switch_number, highest_dof_number = get_highest_switch_and_dof_number(
-        context.scene.objects
+        context.scene.objects, metadata
     )
 
-    bounding_sphere_center, bounding_sphere_radius = get_bounding_sphere(
-        context.scene.objects
-    )
-    
+    bounding_sphere_objects = context.scene.objects
+    if bounding_sphere_lod_only and lod_list:
+        nearest_lod = min(lod_list, key=lambda lod: lod.viewing_distance)
+        bounding_sphere_objects = [obj for obj in nearest_lod.collection.all_objects if not obj.hide_render]
+
+    bounding_sphere_center, bounding_sphere_radius = get_bounding_sphere(bounding_sphere_objects)
+
     bounding_sphere_radius *= scale_factor
 
-    with open(parent_dat_filepath, "w") as parent_dat_file:
-        str_output = (
-            f"// Dimensions = bounding_sphere_radius bbox_min_x bbox_max_x bbox_min_y bbox_max_y bbox_min_z bbox_max_z\n"
-            f"Dimensions = {round(bounding_sphere_radius, 6)} "
-            f"{round(bounding_box_1_min_coords.x, 6):.6f} {round(bounding_box_1_max_coords.x, 6):.6f} "
-            f"{round(bounding_box_1_min_coords.y, 6):.6f} {round(bounding_box_1_max_coords.y, 6):.6f} "
-            f"{round(bounding_box_1_min_coords.z, 6):.6f} {round(bounding_box_1_max_coords.z, 6):.6f}\n"
-            f"TextureSets = {number_of_texture_sets}\n"
-            f"Switches = {highest_switch_number}\n"
-            f"Dofs = {highest_dof_number}\n"
+    str_output = (
+        f"// Dimensions = bounding_sphere_radius bbox_min_x bbox_max_x bbox_min_y bbox_max_y bbox_min_z bbox_max_z\n"
+        f"Dimensions = {round(bounding_sphere_radius, 6)} "
+        f"{round(bounding_box_1_min_coords.x, 6):.6f} {round(bounding_box_1_max_coords.x, 6):.6f} "
+        f"{round(bounding_box_1_min_coords.y, 6):.6f} {round(bounding_box_1_max_coords.y, 6):.6f} "
+        f"{round(bounding_box_1_min_coords.z, 6):.6f} {round(bounding_box_1_max_coords.z, 6):.6f}\n"
+        f"TextureSets = {number_of_texture_sets}\n"
+        f"Switches = {highest_switch_number}\n"
+        f"Dofs = {highest_dof_number}\n"
+    )
+
+    # convert the slots to BML, sort them by Y coord and add them
+    slot_bml_coords = [
+        to_bms_coords(slot.matrix_world.translation) for slot in slot_list
+    ]
+    slot_bml_coords.sort(key=operator.attrgetter("y"))
+
+    for slot_coord in slot_bml_coords:
+        str_output += (
+            f"AddSlot = {round(slot_coord.x, 6):.6f} "
+            f"{round(slot_coord.y, 6):.6f} "
+            f"{round(slot_coord.z, 6):.6f}\n"
         )
 
-        # convert the slots to BML, sort them by Y coord and add them
-        slot_bml_coords = [
-            to_bms_coords(slot.matrix_world.translation) for slot in slot_list
-        ]
-        slot_bml_coords.sort(key=operator.attrgetter("y"))
-
-        for slot_coord in slot_bml_coords:
-            str_output += (
-                f"AddSlot = {round(slot_coord.x, 6):.6f} "
-                f"{round(slot_coord.y, 6):.6f} "
-                f"{round(slot_coord.z, 6):.6f}\n"
-            )
-
-        # get the lod list from the scene and sort it by viewing distance
-        lod_filenames_distances = []
-        for lod in lod_list:
-            lod_filenames_distances.append(
-                (file_prefix + lod.file_suffix + ".bml", lod.viewing_distance)
-            )
-        lod_filenames_distances.sort(key=lambda a: a[1])
-
-        for lod in lod_filenames_distances:
-            str_output += f"AddLOD = {lod[0]} {lod[1]}\n"
+    # get the lod list from the scene and sort it by viewing distance
+    lod_filenames_distances = []
+    for lod in lod_list:
+        lod_filenames_distances.append(
+            (file_prefix + lod.file_suffix + ".bml", lod.viewing_distance)
+        )
+    lod_filenames_distances.sort(key=lambda a: a[1])
 
+    for lod in lod_filenames_distances:
+        str_output += f"AddLOD = {lod[0]} {lod[1]}\n"
+
+    # all inputs of the Parent.dat end up in its content
+    if manifest:
+        fingerprint = {"content": get_hash(str_output)}
+        if manifest.get_rebuild_reason("Parent.dat", fingerprint) is None:
+            return
+        manifest.record("Parent.dat", fingerprint)
+
+    with open(parent_dat_filepath, "w") as parent_dat_file:
         parent_dat_file.write(str_output)
 
     print(f"Exported Parent.dat file: {parent_dat_filepath}")
@@ -1,3 +1,4 @@
+import struct
 from collections import OrderedDict
 from itertools import chain
 
@@ -125,3 +126,40 @@ def get_render_control_nodes(node_start_index=0):
         bml_nodes.append(rc)
 
     return bml_nodes
+
+
+class SerializedRenderControls:
+    """The Render Control nodes of the DOF node tree, analysed and serialized once per export and shared by all LODs.
+    The nodes keep their node indices, get_data() rebases them if they are placed somewhere else in the node list."""
+    nodes: list[RenderControlNode]
+    data: bytes
+
+    def __init__(self, nodes):
+        self.nodes = nodes
+        self.node_start_index = nodes[0].node_index if nodes else 0
+
+        node_data = [node.to_data() for node in nodes]
+        self.data = b"".join(node_data)
+
+        # each node starts with its type and index, remember where the indices are
+        self.node_index_offsets = []
+        offset = 0
+        for data in node_data:
+            self.node_index_offsets.append(offset + 4)
+            offset += len(data)
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def get_data(self, node_start_index=0):
+        if node_start_index == self.node_start_index:
+            return self.data
+
+        data = bytearray(self.data)
+        for index, node_index_offset in enumerate(self.node_index_offsets):
+            struct.pack_into("<I", data, node_index_offset, node_start_index + index)
+        return bytes(data)
+
+
+def get_serialized_render_controls():
+    return SerializedRenderControls(get_render_control_nodes())
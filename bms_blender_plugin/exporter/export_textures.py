@@ -0,0 +1,368 @@
+import hashlib
+import os
+import tempfile
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import bpy
+import numpy as np
+
+from bms_blender_plugin.common.export_dds import check_color_space, save_texture
+from bms_blender_plugin.common.export_settings import ExportSettings
+from bms_blender_plugin.common.image_pixels import get_image_pixels
+from bms_blender_plugin.exporter.export_manifest import ExportManifest, get_hash, get_image_fingerprint
+from bms_blender_plugin.exporter.lod_workers import get_worker_count
+from bms_blender_plugin.exporter.texture_cache import TextureCache, link_file
+from bms_blender_plugin.ext.blender_dds_addon.directx import bc_encoder, mipmaps
+from bms_blender_plugin.ext.blender_dds_addon.directx.dds import DDSHeader, is_hdr
+from bms_blender_plugin.ext.blender_dds_addon.directx.dxgi_format import DXGI_FORMAT
+from bms_blender_plugin.ext.blender_dds_addon.directx.texconv import Texconv, unload_texconv
+from bms_blender_plugin.nodes_editor.material_nodes.material_util import (
+    get_albedo_texture,
+    get_armw_texture,
+    get_dds_texture_export_file_name,
+    get_emissive_texture,
+    get_normal_texture,
+)
+
+
+class TextureJob:
+    """A single Blender image which is exported as a DDS file"""
+    image: bpy.types.Image
+    file_path: str
+    dds_format: str
+
+    def __init__(self, image, file_path, dds_format):
+        self.image = image
+        self.file_path = file_path
+        self.dds_format = dds_format
+
+    def __repr__(self):
+        return f"{self.image.name} -> {self.file_path} ({self.dds_format})"
+
+
+def get_texture_quality(export_settings: ExportSettings):
+    """Returns the quality tier which is recorded in the manifest, draft textures include their size limit"""
+    if export_settings.texture_quality == "DRAFT":
+        return f"DRAFT {export_settings.draft_texture_size}"
+    return export_settings.texture_quality
+
+
+def get_texture_jobs(material_names, file_directory, export_settings: ExportSettings, manifest: ExportManifest = None):
+    """Returns the texture jobs of all textures of the given materials. Textures which are shared by several materials
+    are only exported once. With a manifest, unchanged textures are skipped."""
+    texture_jobs = []
+    texture_file_names = set()
+
+    for material_name in material_names:
+        if material_name not in bpy.data.materials:
+            continue
+        blender_material = bpy.data.materials[material_name]
+
+        textures_to_be_exported = [
+            (get_albedo_texture(blender_material), "BC7_UNORM_SRGB"),
+            (get_armw_texture(blender_material), "BC7_UNORM"),
+            (get_normal_texture(blender_material), "BC5_UNORM"),
+            (get_emissive_texture(blender_material), "BC7_UNORM"),
+        ]
+
+        for texture, texture_format in textures_to_be_exported:
+            if not texture:
+                continue
+
+            texture_file_name = get_dds_texture_export_file_name(texture)
+            if texture_file_name in texture_file_names:
+                continue
+            texture_file_names.add(texture_file_name)
+
+            if manifest:
+                fingerprint = {
+                    "image": get_image_fingerprint(texture),
+                    "settings": get_hash(
+                        (texture_format, export_settings.allow_slow_texture_codecs, export_settings.texture_mip_filter)
+                    ),
+                    "quality": get_texture_quality(export_settings),
+                }
+                if manifest.get_rebuild_reason(texture_file_name, fingerprint) is None:
+                    continue
+                manifest.record(texture_file_name, fingerprint)
+
+            texture_jobs.append(TextureJob(texture, os.path.join(file_directory, texture_file_name), texture_format))
+
+    return texture_jobs
+
+
+def can_save_texture_pixels(image, dds_format):
+    """Byte images are written from their pixels, float images are converted by Blender as before"""
+    return not is_hdr(dds_format) and not image.is_float and image.channels == 4 and image.size[0] > 0
+
+
+def get_texture_pixels(image, dds_format):
+    """Returns the pixels of an image as an uint8 array of shape (height, width, 4) with the rows from top to
+    bottom. Float images are converted from linear to sRGB for sRGB formats."""
+    width, height = image.size
+    pixels = get_image_pixels(image)
+
+    if image.channels < 4:
+        # grayscale or RGB
+        rgba = np.ones((height, width, 4), dtype=np.float32)
+        rgba[:, :, :3] = pixels[:, :, :3] if image.channels == 3 else pixels[:, :, :1]
+        pixels = rgba
+
+    if image.is_float and "SRGB" in dds_format:
+        pixels[:, :, :3] = mipmaps.linear_to_srgb(pixels[:, :, :3])
+
+    # quantized in place, the only copy is the conversion to uint8
+    np.clip(pixels, 0, 1, out=pixels)
+    pixels *= 255
+    np.rint(pixels, out=pixels)
+    # Blender stores the rows bottom to top
+    return pixels[::-1].astype(np.uint8)
+
+
+def get_texture_mip_chain(pixels, dds_format, mip_filter):
+    """Returns the full mip chain of the pixels of a texture. Colors of sRGB formats are filtered in linear space,
+    BC5 normal maps are renormalized on each level."""
+    return mipmaps.get_mip_chain(
+        pixels, mip_filter, is_srgb="SRGB" in dds_format, is_normal_map=dds_format.startswith("BC5")
+    )
+
+
+def get_draft_texture_format(dds_format, has_alpha):
+    """Draft textures use the fast BC1/BC3 codecs instead of BC7, other formats are kept"""
+    if dds_format.startswith("BC7"):
+        return bc_encoder.get_fallback_format(dds_format, has_alpha)
+    return dds_format
+
+
+def get_draft_mip_chain(levels, max_size):
+    """Drops the top levels of a mip chain until the texture fits into max_size (0: keep all levels)"""
+    if max_size <= 0:
+        return levels
+    for index, level in enumerate(levels):
+        if max(level.shape[:2]) <= max_size:
+            return levels[index:]
+    return levels[-1:]
+
+
+def save_texture_pixels(levels, file_path):
+    """Writes the mip levels of a texture as an uncompressed R8G8B8A8 DDS which texconv reads directly. texconv keeps
+    the mip levels of its input and only compresses them. Unlike saving the image through Blender, this does not touch
+    the file settings of the image."""
+    height, width = levels[0].shape[:2]
+
+    header = DDSHeader()
+    header.width = width
+    header.height = height
+    header.mipmap_num = len(levels)
+    header.dxgi_format = DXGI_FORMAT.R8G8B8A8_UNORM
+    header.pitch_or_linear_size = width * 4
+    header.update(1, 1)
+
+    with open(file_path, "wb") as dds_file:
+        header.write(dds_file)
+        dds_file.writelines(level.tobytes() for level in levels)
+
+
+def get_pixel_hash(pixels, dds_format):
+    """Returns a hash of the pixels and the DDS format of a texture. Textures with the same hash encode to the same
+    DDS file."""
+    hasher = hashlib.sha1(np.ascontiguousarray(pixels).data)
+    hasher.update(repr((pixels.shape, pixels.dtype.str, dds_format)).encode("utf-8"))
+    return hasher.hexdigest()
+
+
+def load_texconv():
+    """Returns the texconv DLL or None if it is not available on this platform"""
+    try:
+        return Texconv()
+    except (RuntimeError, OSError) as e:
+        print(f"{e}\nUsing the built-in encoder for BC1, BC3, BC4 and BC5 instead")
+        return None
+
+
+def export_textures(texture_jobs, export_settings: ExportSettings):
+    """Exports all texture jobs as DDS files. The pixels are read one after another (Blender can only be accessed
+    from the main thread), while a pool of threads encodes them in parallel - the texconv calls release the GIL.
+    texconv is loaded once and shared by all workers and writes each DDS file directly to its final location.
+    The mip chains of byte images are generated by the NumPy mip generator, so texconv and the built-in encoder only
+    compress the precomputed levels.
+    Without texconv (e.g. on Linux), the textures are encoded by the built-in NumPy encoder, formats which it does not
+    support are replaced by the closest supported format.
+    At most one texture per worker is queued, so the pixels of all textures are never in memory at once. The mip
+    chains which were kept for identical textures are released when all textures are exported.
+    Textures which have been encoded before are taken from the texture cache. Images with identical pixels (e.g. a
+    shared decal sheet which was imported twice) are only encoded once and linked to the file of each duplicate.
+    With the draft quality, BC7 textures are encoded as BC1/BC3 and downscaled to the draft texture size.
+    Returns the report of the texture cache and the duplicates or None if there is nothing to report."""
+    if not texture_jobs:
+        return None
+
+    texture_cache = None
+    if export_settings.texture_cache_size > 0:
+        texture_cache = TextureCache(export_settings.texture_cache_directory, export_settings.texture_cache_size)
+
+    worker_count = get_worker_count(export_settings.texture_workers, len(texture_jobs))
+    print(f"Exporting {len(texture_jobs)} DDS files with {worker_count} workers...")
+
+    mip_filter = export_settings.texture_mip_filter
+    is_draft = export_settings.texture_quality == "DRAFT"
+    # final textures keep the cache keys of earlier exports
+    draft_cache_options = (get_texture_quality(export_settings),) if is_draft else ()
+
+    def _get_levels(pixels, dds_format):
+        levels = get_texture_mip_chain(pixels, dds_format, mip_filter)
+        if is_draft:
+            levels = get_draft_mip_chain(levels, export_settings.draft_texture_size)
+        return levels
+
+    def _encode(texconv, temp_file_path, texture_job: TextureJob, dds_format, pixels=None):
+        start_time = time.perf_counter()
+        if pixels is not None:
+            save_texture_pixels(_get_levels(pixels, dds_format), temp_file_path)
+
+        # the temporary file has the same name as the DDS file, so texconv writes it to the right file
+        texconv.convert_to_dds(
+            temp_file_path,
+            dds_format,
+            out=os.path.dirname(texture_job.file_path),
+            image_filter=mip_filter,
+            allow_slow_codec=export_settings.allow_slow_texture_codecs,
+            verbose=False,
+        )
+        os.remove(temp_file_path)
+        print(f"Exported DDS file: {texture_job.file_path} ({dds_format})")
+        return time.perf_counter() - start_time
+
+    def _encode_builtin(pixels, dds_format, texture_job: TextureJob):
+        start_time = time.perf_counter()
+        bc_encoder.encode_dds(_get_levels(pixels, dds_format), dds_format).save(texture_job.file_path)
+        print(f"Exported DDS file: {texture_job.file_path} ({dds_format})")
+        return time.perf_counter() - start_time
+
+    # pixel hash -> the texture job which encodes these pixels
+    encoded_textures = {}
+    # (duplicate texture job, texture job which encodes its pixels, cache key of the duplicate)
+    duplicates = []
+    encode_times = {}
+
+    try:
+        texconv = load_texconv()
+        encoder_name = "texconv" if texconv else "builtin"
+
+        with tempfile.TemporaryDirectory(prefix="bml_textures_") as temp_dir:
+            with ThreadPoolExecutor(max_workers=worker_count) as executor:
+                futures = []
+                for index, texture_job in enumerate(texture_jobs):
+                    check_color_space(texture_job.image, texture_job.dds_format)
+
+                    if texture_cache:
+                        cache_key = texture_cache.get_key(
+                            texture_job.image, texture_job.dds_format, mip_filter, encoder_name, *draft_cache_options
+                        )
+                        if texture_cache.fetch(cache_key, texture_job.file_path):
+                            print(f"Exported DDS file from cache: {texture_job.file_path}")
+                            continue
+                    else:
+                        cache_key = None
+
+                    # wait for a free worker before the next pixels are read
+                    pending_futures = [future for _, _, future in futures if not future.done()]
+                    if len(pending_futures) >= worker_count:
+                        wait(pending_futures, return_when=FIRST_COMPLETED)
+
+                    dds_format = texture_job.dds_format
+                    pixels = None
+                    if (
+                        not texconv
+                        or can_save_texture_pixels(texture_job.image, dds_format)
+                        or (is_draft and not is_hdr(dds_format))
+                    ):
+                        # the mip chain is generated by the worker
+                        pixels = get_texture_pixels(texture_job.image, dds_format)
+                        has_alpha = bool(np.any(pixels[:, :, 3] < 255))
+                        if is_draft:
+                            dds_format = get_draft_texture_format(dds_format, has_alpha)
+
+                    if not texconv:
+                        dds_format = bc_encoder.get_fallback_format(dds_format, has_alpha)
+                        if dds_format is None:
+                            raise Exception(
+                                f"Can not export {texture_job.image.name} as {texture_job.dds_format} without texconv"
+                            )
+
+                    pixel_hash = get_pixel_hash(
+                        pixels if pixels is not None else get_image_pixels(texture_job.image), dds_format
+                    )
+                    if pixel_hash in encoded_textures:
+                        duplicates.append((texture_job, encoded_textures[pixel_hash], cache_key))
+                        continue
+                    encoded_textures[pixel_hash] = texture_job
+
+                    # the old file might be a hard link to the texture cache or another texture, so it is removed
+                    # instead of being overwritten
+                    if os.path.exists(texture_job.file_path):
+                        os.remove(texture_job.file_path)
+
+                    if not texconv:
+                        future = executor.submit(_encode_builtin, pixels, dds_format, texture_job)
+                        futures.append((texture_job, cache_key, future))
+                        continue
+
+                    # each job gets its own directory, as the temporary files are named like their DDS files
+                    job_dir = os.path.join(temp_dir, str(index))
+                    os.mkdir(job_dir)
+                    file_name = os.path.splitext(os.path.basename(texture_job.file_path))[0]
+                    if pixels is not None:
+                        temp_file_path = os.path.join(job_dir, file_name + ".dds")
+                    elif is_hdr(texture_job.dds_format):
+                        temp_file_path = os.path.join(job_dir, file_name + ".hdr")
+                        save_texture(texture_job.image, temp_file_path, "HDR")
+                    else:
+                        temp_file_path = os.path.join(job_dir, file_name + ".tga")
+                        save_texture(texture_job.image, temp_file_path, "TARGA_RAW")
+
+                    future = executor.submit(_encode, texconv, temp_file_path, texture_job, dds_format, pixels)
+                    futures.append((texture_job, cache_key, future))
+
+                errors = []
+                for texture_job, cache_key, future in futures:
+                    try:
+                        encode_times[texture_job] = future.result()
+                    except RuntimeError as e:
+                        errors.append(f"{texture_job.image.name}: {e}")
+                        continue
+
+                    if texture_cache:
+                        texture_cache.store(cache_key, texture_job.file_path)
+
+                saved_time = 0
+                for texture_job, encoded_texture_job, cache_key in duplicates:
+                    if encoded_texture_job not in encode_times:
+                        errors.append(f"{texture_job.image.name}: duplicate of {encoded_texture_job.image.name}")
+                        continue
+
+                    link_file(encoded_texture_job.file_path, texture_job.file_path)
+                    saved_time += encode_times[encoded_texture_job]
+                    print(
+                        f"Exported DDS file: {texture_job.file_path} "
+                        f"(same pixels as {encoded_texture_job.image.name}, encoded once)"
+                    )
+                    if texture_cache:
+                        texture_cache.store(cache_key, texture_job.file_path)
+
+            if errors:
+                raise Exception(f"Failed to export {len(errors)} DDS files: " + "; ".join(errors))
+
+    finally:
+        unload_texconv()
+        mipmaps.clear_mip_cache()
+        if texture_cache:
+            texture_cache.save()
+
+    reports = []
+    if texture_cache:
+        reports.append(texture_cache.get_report())
+    if duplicates:
+        reports.append(f"{len(duplicates)} duplicate textures encoded once (saved {round(saved_time, 1)}s)")
+    return ", ".join(reports) or None
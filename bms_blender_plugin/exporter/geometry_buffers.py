@@ -0,0 +1,70 @@
+import io
+import shutil
+import tempfile
+
+import numpy as np
+
+from bms_blender_plugin.common.bml_structs import IndexBufferFormat
+
+
+def open_buffer_file(spill_to_disk, prefix):
+    """Returns a binary file object which is either a temporary file or kept in memory"""
+    if spill_to_disk:
+        return tempfile.TemporaryFile(prefix=prefix)
+    return io.BytesIO()
+
+
+class GeometryBuffers:
+    """The index and vertex buffer of a single LOD. Each primitive is appended as soon as it has been extracted.
+    The buffers are either kept in memory or spilled to temporary files (bounded memory export), in which case only the
+    data of the current primitive is held in memory."""
+    index_count: int
+    vertex_data_size: int
+
+    def __init__(self, spill_to_disk=False):
+        self.spill_to_disk = spill_to_disk
+        self.index_file = open_buffer_file(spill_to_disk, "bml_indices_")
+        self.vertex_file = open_buffer_file(spill_to_disk, "bml_vertices_")
+
+        self.index_count = 0
+        self.vertex_data_size = 0
+
+    def append(self, vertex_indices, vertex_data):
+        """Appends the indices and the raw vertex data (list of bytes) of a primitive"""
+        if len(vertex_indices) > 0:
+            # indices are always stored as 32 bit - the format is only decided when the buffer is written
+            self.index_file.write(np.asarray(vertex_indices, dtype="<u4").tobytes())
+            self.index_count += len(vertex_indices)
+
+        for data in vertex_data:
+            self.vertex_file.write(data)
+            self.vertex_data_size += len(data)
+
+    @property
+    def index_buffer_format(self):
+        if self.index_count < 256:
+            return IndexBufferFormat.FORMAT_16
+        return IndexBufferFormat.FORMAT_32
+
+    @property
+    def index_data_size(self):
+        if self.index_buffer_format == IndexBufferFormat.FORMAT_16:
+            return 2 * self.index_count
+        return 4 * self.index_count
+
+    def write_index_buffer(self, output):
+        self.index_file.seek(0)
+        if self.index_buffer_format == IndexBufferFormat.FORMAT_16:
+            # less than 256 indices - small enough to convert in memory
+            indices = np.frombuffer(self.index_file.read(), dtype="<u4")
+            output.write(indices.astype("<u2").tobytes())
+        else:
+            shutil.copyfileobj(self.index_file, output)
+
+    def write_vertex_buffer(self, output):
+        self.vertex_file.seek(0)
+        shutil.copyfileobj(self.vertex_file, output)
+
+    def close(self):
+        self.index_file.close()
+        self.vertex_file.close()
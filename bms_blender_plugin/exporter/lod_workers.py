@@ -0,0 +1,196 @@
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+import bpy
+
+from bms_blender_plugin.common.blender_types import LodItem
+from bms_blender_plugin.common.export_settings import ExportSettings
+from bms_blender_plugin.common.hotspot import Hotspot
+
+WORKER_EXPRESSION = "from bms_blender_plugin.exporter.lod_workers import run_worker; run_worker()"
+
+
+def get_worker_count(requested_workers, job_count):
+    """Returns the size of the worker pool: the requested amount or one worker per CPU, but never more than jobs"""
+    if requested_workers > 0:
+        return max(1, min(requested_workers, job_count))
+    return max(1, min(os.cpu_count() or 1, job_count))
+
+
+def save_snapshot(directory):
+    """Saves a copy of the current state of the .blend file (including unsaved changes) for the workers"""
+    snapshot_path = os.path.join(directory, "bml_export_snapshot.blend")
+    bpy.ops.wm.save_as_mainfile(filepath=snapshot_path, copy=True, check_existing=False)
+    return snapshot_path
+
+
+def get_worker_command(snapshot_path, job_path, expression=WORKER_EXPRESSION):
+    """Returns the command line of a background Blender which opens the snapshot and runs the worker expression"""
+    return [
+        bpy.app.binary_path,
+        "--background",
+        snapshot_path,
+        "--python-exit-code",
+        "1",
+        "--python-expr",
+        expression,
+        "--",
+        job_path,
+    ]
+
+
+def enable_plugin():
+    """The plugin might not be enabled in the preferences of a background Blender"""
+    if "bms_blender_plugin" not in bpy.context.preferences.addons:
+        import addon_utils
+
+        addon_utils.enable("bms_blender_plugin", default_set=False)
+
+
+def run_worker_process(snapshot_path, job_path, log_path):
+    """Runs a single background Blender for a job and returns its exit code"""
+    with open(log_path, "w") as log_file:
+        return subprocess.run(
+            get_worker_command(snapshot_path, job_path),
+            stdout=log_file,
+            stderr=subprocess.STDOUT,
+            check=False,
+        ).returncode
+
+
+def read_worker_result(result_path, log_path, return_code):
+    """Returns the result dict of a worker. Failures which happened before the result was written are converted to
+    an error result with the end of the worker log."""
+    if os.path.exists(result_path):
+        with open(result_path, "r") as result_file:
+            return json.load(result_file)
+
+    log_tail = ""
+    if os.path.exists(log_path):
+        with open(log_path, "r", errors="replace") as log_file:
+            log_tail = "".join(log_file.readlines()[-20:])
+
+    return {"error": f"Worker exited with code {return_code} without a result:\n{log_tail}"}
+
+
+def export_lods_in_workers(file_directory, file_prefix, lod_list, scale_factor, export_settings: ExportSettings):
+    """Exports each LOD in its own background Blender process. The processes work on a snapshot of the current file
+    and run in a pool of workers.
+    Returns a list of triples (exported file, material names, hotspots) in the order of the LODs."""
+    worker_count = get_worker_count(export_settings.lod_workers, len(lod_list))
+    print(f"Exporting {len(lod_list)} LODs with {worker_count} background workers...\n")
+
+    worker_settings = ExportSettings.from_dict(export_settings.to_dict())
+    worker_settings.parallel_lods = False
+
+    temp_directory = tempfile.mkdtemp(prefix="bml_export_")
+    try:
+        snapshot_path = save_snapshot(temp_directory)
+
+        jobs = []
+        for index, lod in enumerate(lod_list):
+            job_path = os.path.join(temp_directory, f"lod_{index}_job.json")
+            result_path = os.path.join(temp_directory, f"lod_{index}_result.json")
+            log_path = os.path.join(temp_directory, f"lod_{index}.log")
+            with open(job_path, "w") as job_file:
+                json.dump(
+                    {
+                        "collection": lod.collection.name,
+                        "file_suffix": lod.file_suffix,
+                        "viewing_distance": lod.viewing_distance,
+                        "cluster_max_triangles": lod.cluster_max_triangles,
+                        "cluster_max_size": lod.cluster_max_size,
+                        "file_directory": file_directory,
+                        "file_prefix": file_prefix,
+                        "scale_factor": scale_factor,
+                        "export_settings": worker_settings.to_dict(),
+                        "result_path": result_path,
+                    },
+                    job_file,
+                )
+            jobs.append((lod, job_path, result_path, log_path))
+
+        with ThreadPoolExecutor(max_workers=worker_count) as executor:
+            return_codes = list(
+                executor.map(
+                    lambda job: run_worker_process(snapshot_path, job[1], job[3]),
+                    jobs,
+                )
+            )
+
+        lod_results = []
+        errors = []
+        for (lod, _, result_path, log_path), return_code in zip(jobs, return_codes):
+            result = read_worker_result(result_path, log_path, return_code)
+            if "error" in result:
+                errors.append(f"LOD {lod.collection.name}: {result['error']}")
+                continue
+
+            hotspots = {
+                callback_id: Hotspot.from_dict(hotspot)
+                for callback_id, hotspot in result["hotspots"].items()
+            }
+            lod_results.append((result["bml_file_path"], result["material_names"], hotspots))
+
+        if errors:
+            for error in errors:
+                print(error)
+            raise Exception(
+                f"{len(errors)} of {len(lod_list)} LOD exports failed: "
+                + "; ".join(error.splitlines()[0] for error in errors)
+            )
+
+        return lod_results
+
+    finally:
+        shutil.rmtree(temp_directory, ignore_errors=True)
+
+
+def run_worker():
+    """Entry point of a background worker: exports a single LOD of the opened snapshot as described by the job file
+    which is passed after '--' on the command line"""
+    job_path = sys.argv[sys.argv.index("--") + 1]
+    with open(job_path, "r") as job_file:
+        job = json.load(job_file)
+
+    try:
+        enable_plugin()
+
+        # imported here - export_lods imports this module
+        from bms_blender_plugin.exporter.export_lods import export_lod
+
+        lod = LodItem(
+            job["file_suffix"],
+            job["viewing_distance"],
+            bpy.data.collections[job["collection"]],
+            job["cluster_max_triangles"],
+            job["cluster_max_size"],
+        )
+        bml_file_path, material_names, hotspots = export_lod(
+            bpy.context,
+            lod,
+            job["file_directory"],
+            job["file_prefix"],
+            job["scale_factor"],
+            ExportSettings.from_dict(job["export_settings"]),
+        )
+        result = {
+            "bml_file_path": bml_file_path,
+            "material_names": material_names,
+            "hotspots": {
+                callback_id: hotspot.to_dict() for callback_id, hotspot in hotspots.items()
+            },
+        }
+
+    except Exception as e:
+        traceback.print_exc()
+        result = {"error": f"{e}\n{traceback.format_exc()}"}
+
+    with open(job["result_path"], "w") as result_file:
+        json.dump(result, result_file)
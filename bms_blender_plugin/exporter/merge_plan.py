@@ -0,0 +1,255 @@
+import bpy
+from bpy.app.handlers import persistent
+
+from bms_blender_plugin.common.blender_types import BlenderNodeType
+from bms_blender_plugin.exporter.export_metadata import ExportMetadata
+
+
+class MergeGroup:
+    """Pure-data description of all objects on a single BML node level which end up in the same node.
+    Mesh groups become a single Primitive (their objects are joined), all other groups hold exactly one
+    DOF, Switch, Slot, Hotspot or Empty."""
+    key: str
+    material_name: str
+    object_names: list[str]
+    triangle_count: int
+    is_bbl_light: bool
+    children: list["MergeGroup"]
+
+    def __init__(self, key, material_name, object_names, triangle_count, is_bbl_light):
+        self.key = key
+        self.material_name = material_name
+        self.object_names = object_names
+        self.triangle_count = triangle_count
+        self.is_bbl_light = is_bbl_light
+        self.children = []
+
+    def __repr__(self):
+        return f"{self.key}: {self.object_names} ({self.triangle_count} triangles)"
+
+    @property
+    def is_primitive(self):
+        return self.material_name is not None
+
+    @property
+    def vertex_count(self):
+        # BML primitives are plain triangle lists
+        return self.triangle_count * 3
+
+
+class MergePlan:
+    """The tree of MergeGroups of a model. Decides which objects are merged before anything is modified, so it can be
+    shown to the user, cached and executed in bulk."""
+    root_groups: list[MergeGroup]
+
+    def __init__(self, root_groups):
+        self.root_groups = root_groups
+
+    def get_groups(self):
+        """Returns all groups of the plan, parents before their children"""
+        groups = []
+
+        def _collect_groups(level):
+            for group in level:
+                groups.append(group)
+                _collect_groups(group.children)
+
+        _collect_groups(self.root_groups)
+        return groups
+
+    @property
+    def primitive_count(self):
+        return sum(1 for group in self.get_groups() if group.is_primitive)
+
+    @property
+    def triangle_count(self):
+        return sum(group.triangle_count for group in self.get_groups())
+
+    @property
+    def vertex_count(self):
+        return sum(group.vertex_count for group in self.get_groups())
+
+
+def get_merge_key(obj, join_materials=True, metadata: ExportMetadata = None):
+    """Returns a triple of the merge key, the target material name and whether the object is a BBL light.
+    Objects with the same key on the same node level are merged. Returns None as key for objects which are
+    not exported."""
+    if metadata is None:
+        metadata = ExportMetadata()
+    object_metadata = metadata.get(obj)
+    bml_type = object_metadata.bml_type
+
+    if obj.type == "MESH":
+        if bml_type == BlenderNodeType.PBR_LIGHT:
+            default_material_name = "BML-BillboardGlowLight"
+        else:
+            default_material_name = "BML-Default"
+
+        if len(obj.material_slots) > 0 and obj.material_slots[0].material:
+            material_name = metadata.get_material_name(obj.material_slots[0].material.name)
+        else:
+            material_name = default_material_name
+
+        # "do not merge" flag - just use a custom key which will never be looked up
+        # BBOXs are never merged as well - otherwise joined objects will not render
+        if not join_materials or object_metadata.do_not_merge or bml_type == BlenderNodeType.BBOX:
+            return "_OBJECT_" + obj.name, material_name, bml_type == BlenderNodeType.PBR_LIGHT
+
+        merge_key = material_name
+
+        # if the object is a child of a switch, prepend the switch name, so they are only merged with materials
+        # within their switch level
+        if metadata.get_bml_type(obj.parent) is BlenderNodeType.SWITCH:
+            merge_key = obj.parent.name + "_" + merge_key
+
+        # make sure we only join lights with other lights
+        if bml_type == BlenderNodeType.PBR_LIGHT:
+            return "BML_BBL_" + merge_key, material_name, True
+
+        return merge_key, material_name, False
+
+    # make sure that DOFs, Switches and Slots are never joined
+    # we can also add hotspots here so their children will be parsed as well
+    elif obj.type == "EMPTY" and bml_type in [
+        BlenderNodeType.DOF,
+        BlenderNodeType.SWITCH,
+        BlenderNodeType.SLOT,
+        BlenderNodeType.HOTSPOT,
+    ]:
+        return "_DOF_OR_SWITCH_OR_SLOT_OR_HOTSPOT_" + obj.name, None, False
+
+    # add default empties as well so their children can be parsed
+    elif obj.type == "EMPTY" or not join_materials:
+        return "_EMPTY_" + obj.name, None, False
+
+    return None, None, False
+
+
+def get_triangle_count(obj, bml_type):
+    """Returns the amount of triangles an object will have in the BML without triangulating it"""
+    if obj.type != "MESH" or not obj.data:
+        return 0
+
+    if bml_type == BlenderNodeType.PBR_LIGHT:
+        # each rectangle of a light becomes 2 triangles
+        return 2 * len(obj.data.polygons)
+
+    # a polygon with n corners becomes n-2 triangles
+    return len(obj.data.loops) - 2 * len(obj.data.polygons)
+
+
+def get_merge_plan(root_objects, join_materials=True, metadata: ExportMetadata = None):
+    """Builds the MergePlan for a list of root objects. Objects are merged by material on each node level (i.e. not
+    separated by DOFs, Switches or Slots), within their Switch and with BBL lights kept apart from meshes."""
+    if metadata is None:
+        metadata = ExportMetadata()
+
+    def _plan_level(objects):
+        groups = {}
+        group_objects = {}
+
+        for obj in objects:
+            object_metadata = metadata.get(obj)
+            if not object_metadata.is_exported:
+                continue
+
+            merge_key, material_name, is_bbl_light = get_merge_key(obj, join_materials, metadata)
+            if merge_key is None:
+                continue
+
+            triangle_count = get_triangle_count(obj, object_metadata.bml_type)
+
+            group = groups.get(merge_key)
+            if group is None:
+                groups[merge_key] = MergeGroup(
+                    merge_key, material_name, [obj.name], triangle_count, is_bbl_light
+                )
+                group_objects[merge_key] = [obj]
+            else:
+                group.object_names.append(obj.name)
+                group.triangle_count += triangle_count
+                group_objects[merge_key].append(obj)
+
+        # the children of all merged objects end up on the same node level
+        for merge_key, group in groups.items():
+            children = [child for obj in group_objects[merge_key] for child in obj.children]
+            group.children = _plan_level(sorted(children, key=lambda child: child.name))
+
+        return list(groups.values())
+
+    return MergePlan(_plan_level(root_objects))
+
+
+def get_root_objects(collection):
+    """Returns all objects without a parent of a collection and its child collections. Collections which are hidden
+    in renders are not exported and skipped."""
+    root_objects = []
+
+    def _collect_root_objects(coll):
+        if coll.hide_render:
+            return
+
+        for obj in coll.objects:
+            if obj.parent is None:
+                root_objects.append(obj)
+
+        for child in coll.children:
+            _collect_root_objects(child)
+
+    _collect_root_objects(collection)
+    return root_objects
+
+
+def is_joining_materials(context):
+    """Returns whether objects with the same material are joined (can be turned off in the plugin preferences)"""
+    return not (
+        "bms_blender_plugin" in context.preferences.addons
+        and context.preferences.addons["bms_blender_plugin"].preferences.do_not_join_materials
+    )
+
+
+def is_merging_equivalent_materials(context):
+    """Returns whether materials with the same content are merged into one (can be turned off in the plugin
+    preferences)"""
+    return not (
+        "bms_blender_plugin" in context.preferences.addons
+        and context.preferences.addons["bms_blender_plugin"].preferences.do_not_merge_equivalent_materials
+    )
+
+
+merge_plan_cache = {}
+
+
+def get_cached_merge_plan(context, collection):
+    """Returns the MergePlan of a collection. The plan is kept until anything in the scene changes."""
+    # export_materials depends on this module
+    from bms_blender_plugin.exporter.export_materials import get_material_remap
+
+    join_materials = is_joining_materials(context)
+    cache_key = (collection.name, join_materials, is_merging_equivalent_materials(context))
+
+    if cache_key not in merge_plan_cache:
+        merge_plan_cache[cache_key] = get_merge_plan(
+            get_root_objects(collection), join_materials, ExportMetadata(material_remap=get_material_remap(context))
+        )
+
+    return merge_plan_cache[cache_key]
+
+
+@persistent
+def clear_merge_plan_cache(scene, depsgraph=None):
+    merge_plan_cache.clear()
+
+
+def register():
+    if clear_merge_plan_cache not in bpy.app.handlers.depsgraph_update_post:
+        bpy.app.handlers.depsgraph_update_post.append(clear_merge_plan_cache)
+    if clear_merge_plan_cache not in bpy.app.handlers.load_post:
+        bpy.app.handlers.load_post.append(clear_merge_plan_cache)
+
+
+def unregister():
+    if clear_merge_plan_cache in bpy.app.handlers.depsgraph_update_post:
+        bpy.app.handlers.depsgraph_update_post.remove(clear_merge_plan_cache)
+    if clear_merge_plan_cache in bpy.app.handlers.load_post:
+        bpy.app.handlers.load_post.remove(clear_merge_plan_cache)
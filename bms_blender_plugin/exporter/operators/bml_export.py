@@ -17,9 +17,12 @@ from bms_blender_plugin.common.bml_structs import Compression
 from bms_blender_plugin.common.export_settings import ExportSettings
 from bms_blender_plugin.common.util import get_scripts
 from bms_blender_plugin.exporter import bml_output
+from bms_blender_plugin.exporter.background_export import BackgroundExport
+from bms_blender_plugin.exporter.export_manifest import MANIFEST_FILE_NAME
 from bms_blender_plugin.exporter.export_materials import (
     get_texture_files_to_be_exported,
 )
+from bms_blender_plugin.exporter.merge_plan import get_cached_merge_plan
 
 
 class BlenderExportSettings(PropertyGroup):
@@ -54,11 +57,54 @@ class BlenderExportSettings(PropertyGroup):
         default=False,
     )
 
+    texture_quality: EnumProperty(
+        name="Texture Quality",
+        description="Quality tier of the exported textures",
+        items=[
+            ("FINAL", "Final", "BC7 with full mip chains. Use this for release exports"),
+            ("DRAFT", "Draft", "Fast BC1/BC3 codecs, downscaled and unchanged textures are skipped. Not for release"),
+        ],
+        default="FINAL",
+    )
+
+    draft_texture_size: IntProperty(
+        name="Draft Max Size",
+        description="Draft textures are downscaled until they fit into this resolution (0: full resolution)",
+        min=0,
+        max=16384,
+        default=1024,
+    )
+
+    texture_mip_filter: EnumProperty(
+        name="Mip Filter",
+        description="Filter which downsamples the mip levels of the textures",
+        items=[
+            ("BOX", "Box", "Average of 2x2 pixels. Fastest, but blurs least and aliases most"),
+            ("LINEAR", "Linear", "Tent filter over 4x4 pixels"),
+            ("CUBIC", "Cubic", "Catmull-Rom filter over 8x8 pixels. Keeps the most detail"),
+        ],
+        default="LINEAR",
+    )
+
+    texture_workers: IntProperty(
+        name="Workers",
+        description="Maximum amount of textures which are encoded at the same time (0: one per CPU core)",
+        min=0,
+        max=64,
+        default=0,
+    )
+
     export_parent_dat: BoolProperty(
         name="Export Parent.dat",
         description="Exports the model data in the Parent.dat",
         default=True,
     )
+    bounding_sphere_lod_only: BoolProperty(
+        name="Bounding sphere of the nearest LOD",
+        description="The bounding sphere in the Parent.dat only encloses the visible objects of the nearest LOD "
+                    "instead of all objects of the scene",
+        default=False,
+    )
     export_hotspots: BoolProperty(
         name="Export hotspots (3dButtons.dat)",
         description="If your model contains hotspots, export them in the 3dButtons.dat",
@@ -118,6 +164,42 @@ class BlenderExportSettings(PropertyGroup):
         default="-1",
     )
 
+    bounded_memory: BoolProperty(
+        name="Bounded memory",
+        description="Reduces the memory usage for very large models: meshes are freed right after they have been "
+                    "extracted and the geometry is buffered in temporary files. The export is slightly slower",
+        default=False,
+    )
+
+    parallel_lods: BoolProperty(
+        name="Export LODs in parallel",
+        description="Exports each LOD in its own background Blender process. Every process loads a copy of the "
+                    "file, so this needs considerably more memory",
+        default=False,
+    )
+
+    lod_workers: IntProperty(
+        name="Workers",
+        description="Maximum amount of LODs which are exported at the same time (0: one per CPU core)",
+        min=0,
+        max=64,
+        default=0,
+    )
+
+    incremental: BoolProperty(
+        name="Incremental export",
+        description="Only exports files whose inputs changed since the last export into the same folder. "
+                    "The fingerprints of the exported files are stored in " + MANIFEST_FILE_NAME,
+        default=False,
+    )
+
+    background_export: BoolProperty(
+        name="Export in background",
+        description="Runs the export in a background Blender on a copy of the file, so you can keep working. "
+                    "Press ESC to cancel it",
+        default=False,
+    )
+
     open_editor: BoolProperty(
         name="Open in BMS Editor after export",
         description="When the export is complete, open the BML in the BMS Editor",
@@ -149,6 +231,7 @@ class ExportBML(Operator, ExportHelper):
         file_directory = os.path.dirname(self.filepath)
         file_prefix = (os.path.basename(self.filepath)).replace(" ", "_")
         blender_export_settings = context.scene.bml_export_settings
+        preferences = context.preferences.addons["bms_blender_plugin"].preferences
 
         try:
             export_settings = ExportSettings(
@@ -161,8 +244,19 @@ class ExportBML(Operator, ExportHelper):
                 export_unused_materials=blender_export_settings.export_unused_materials,
                 export_textures=blender_export_settings.export_textures,
                 allow_slow_texture_codecs=blender_export_settings.allow_slow_texture_codecs,
+                texture_mip_filter=blender_export_settings.texture_mip_filter,
+                texture_quality=blender_export_settings.texture_quality,
+                draft_texture_size=blender_export_settings.draft_texture_size,
                 export_parent_dat=blender_export_settings.export_parent_dat,
+                bounding_sphere_lod_only=blender_export_settings.bounding_sphere_lod_only,
                 export_hotspots=blender_export_settings.export_hotspots,
+                bounded_memory=blender_export_settings.bounded_memory,
+                parallel_lods=blender_export_settings.parallel_lods,
+                lod_workers=blender_export_settings.lod_workers,
+                incremental=blender_export_settings.incremental,
+                texture_workers=blender_export_settings.texture_workers,
+                texture_cache_directory=bpy.path.abspath(preferences.texture_cache_directory),
+                texture_cache_size=preferences.texture_cache_size,
             )
 
             lods = []
@@ -173,9 +267,22 @@ class ExportBML(Operator, ExportHelper):
                             lod_item.file_suffix,
                             lod_item.viewing_distance,
                             lod_item.collection,
+                            lod_item.cluster_max_triangles,
+                            lod_item.cluster_max_size,
                         )
                     )
 
+            if blender_export_settings.background_export and not bpy.app.background:
+                # the background Blender does not know the active collection
+                if len(lods) == 0 and context.collection:
+                    lods.append(LodItem("", 0, context.collection))
+
+                self.background_export = BackgroundExport(lods, file_directory, file_prefix, export_settings)
+                self.timer = context.window_manager.event_timer_add(0.5, window=context.window)
+                context.window_manager.modal_handler_add(self)
+                context.window_manager.progress_begin(0, 100)
+                return {"RUNNING_MODAL"}
+
             success_message, bml_file_list = bml_output.export_bml(
                 context, lods, file_directory, file_prefix, export_settings
             )
@@ -187,14 +294,56 @@ class ExportBML(Operator, ExportHelper):
             traceback.print_exc()
             return {"CANCELLED"}
 
+        self.open_editor(context, bml_file_list)
+
+        return {"FINISHED"}
+
+    background_export = None
+    timer = None
+
+    def modal(self, context, event):
+        if event.type == "ESC":
+            self.background_export.cancel()
+            self.finish_background_export(context)
+            self.report({"WARNING"}, "BML export cancelled")
+            return {"CANCELLED"}
+
+        if event.type != "TIMER" or event.timer != self.timer:
+            # keep the UI usable while the export is running
+            return {"PASS_THROUGH"}
+
+        if self.background_export.is_running():
+            message, progress = self.background_export.get_progress()
+            context.window_manager.progress_update(round(progress * 100))
+            context.workspace.status_text_set(
+                f"BML export: {message} ({round(progress * 100)}%) - press ESC to cancel"
+            )
+            return {"PASS_THROUGH"}
+
+        result = self.background_export.get_result()
+        self.finish_background_export(context)
+
+        if "error" in result:
+            self.report({"WARNING"}, f"An error occured during export: {result['error']}")
+            return {"CANCELLED"}
+
+        self.report({"INFO"}, result["success_message"])
+        self.open_editor(context, result["bml_file_list"])
+        return {"FINISHED"}
+
+    def finish_background_export(self, context):
+        context.window_manager.event_timer_remove(self.timer)
+        context.window_manager.progress_end()
+        context.workspace.status_text_set(None)
+        self.background_export.cleanup()
+
+    def open_editor(self, context, bml_file_list):
         editor_path = context.preferences.addons[
             "bms_blender_plugin"
         ].preferences.editor_path
-        if blender_export_settings.open_editor and editor_path and len(bml_file_list) > 0:
+        if context.scene.bml_export_settings.open_editor and editor_path and len(bml_file_list) > 0:
             subprocess.Popen([editor_path, bml_file_list[0]])
 
-        return {"FINISHED"}
-
     texture_export_file_list = []
 
     def invoke(self, context, event):
@@ -229,6 +378,15 @@ class ExportBML(Operator, ExportHelper):
             box.prop(export_settings, "output_compression")
             box.prop(export_settings, "auto_smooth_value")
             box.prop(export_settings, "script")
+            box.prop(export_settings, "bounded_memory")
+            box.prop(export_settings, "incremental")
+            box.prop(export_settings, "background_export")
+
+            if len(context.scene.lod_list) > 1:
+                row = box.row()
+                row.prop(export_settings, "parallel_lods")
+                if export_settings.parallel_lods:
+                    row.prop(export_settings, "lod_workers")
 
             row = box.row()
             row.prop(export_settings, "open_editor")
@@ -264,12 +422,19 @@ class ExportBML(Operator, ExportHelper):
             box.prop(export_settings, "allow_slow_texture_codecs")
             if export_settings.allow_slow_texture_codecs:
                 box.label(text="This might take very long!", icon="ERROR")
+            box.prop(export_settings, "texture_quality")
+            if export_settings.texture_quality == "DRAFT":
+                box.prop(export_settings, "draft_texture_size")
+                box.label(text="Draft textures are not for release!", icon="ERROR")
+            box.prop(export_settings, "texture_mip_filter")
+            box.prop(export_settings, "texture_workers")
 
             export_file_list.extend(self.texture_export_file_list)
 
         layout.separator()
         layout.prop(export_settings, "export_parent_dat")
         if export_settings.export_parent_dat:
+            layout.prop(export_settings, "bounding_sphere_lod_only")
             export_file_list.append("Parent.dat")
         layout.separator()
 
@@ -282,6 +447,7 @@ class ExportBML(Operator, ExportHelper):
             layout.row().label(text="Export Collection")
             box = layout.box()
             box.label(text=f"{context.collection.name}")
+            self.draw_merge_plan(context, box, context.collection)
             export_file_name = f"{file_prefix}"
             if not export_file_name.endswith(".bml"):
                 export_file_name += ".bml"
@@ -302,6 +468,7 @@ class ExportBML(Operator, ExportHelper):
                 )
                 lod_file_name = lod_file_name.replace(" ", "_")
                 box.label(text=f"{lod_item.collection.name}: {lod_file_name}")
+                self.draw_merge_plan(context, box, lod_item.collection)
                 export_file_list.append(lod_file_name)
 
                 if export_settings.export_materials_sets:
@@ -327,6 +494,15 @@ class ExportBML(Operator, ExportHelper):
         else:
             layout.row().label(text="No files will be exported", icon="ERROR")
 
+    # noinspection PyMethodMayBeStatic
+    def draw_merge_plan(self, context, layout, collection):
+        """Shows the user what the export of a collection will produce before it is started"""
+        merge_plan = get_cached_merge_plan(context, collection)
+        layout.label(
+            text=f"{merge_plan.primitive_count} primitives, {merge_plan.vertex_count} vertices",
+            icon="INFO",
+        )
+
 
 def menu_func_export(self, context):
     self.layout.operator(ExportBML.bl_idname, text="F4-BMS (.bml)")
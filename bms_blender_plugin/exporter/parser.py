@@ -1,14 +1,16 @@
 import math
 
+import numpy as np
 from mathutils import Matrix, Vector
 
 from bms_blender_plugin.common.blender_types import BlenderNodeType
 from bms_blender_plugin.common.bml_structs import Primitive, PrimitiveTopology, Vector3, Slot, D3DMatrix, Switch, \
     DofType, Dof
 from bms_blender_plugin.common.hotspot import Hotspot, MouseButton, ButtonType
-from bms_blender_plugin.common.util import get_bml_type, get_objcenter, get_switches, get_dofs, \
-    get_non_translate_dof_parent
+from bms_blender_plugin.common.util import get_objcenter
 from bms_blender_plugin.exporter.bml_mesh import get_bml_mesh_data, get_pbr_light_data
+from bms_blender_plugin.exporter.export_metadata import ExportMetadata
+from bms_blender_plugin.exporter.primitive_clusters import get_triangle_clusters, is_clustering
 from bms_blender_plugin.common.coordinates import to_bms_coords
 
 
@@ -26,19 +28,36 @@ class ParsedNodes:
 
 
 def parse_mesh(
-    obj, nodes, vertex_indices, material_names, vertex_index_offset, vertex_start_offset
+    obj,
+    nodes,
+    vertex_indices,
+    material_names,
+    vertex_index_offset,
+    vertex_start_offset,
+    mesh_cache=None,
+    metadata: ExportMetadata = None,
+    cluster_max_triangles=0,
+    cluster_max_size=0.0,
+    merged_objects=None,
+    auto_smooth_value=None,
 ):
-    """Adds a mesh to the BML node list"""
+    """Adds a mesh to the BML node list. The merged objects (with obj as the first one) are exported as a single
+    primitive. With a cluster limit, the mesh is split into several spatially compact primitives, each with its own
+    reference point."""
     print(f"parsing mesh {obj.name}")
 
+    if metadata is None:
+        metadata = ExportMetadata()
+
     # Prepare the mesh
-    obj_data = get_bml_mesh_data(obj, vertex_index_offset)
-    obj_vertices = obj_data["vertices"]
-    obj_indices = obj_data["vertex_indices"]
+    obj_data = get_bml_mesh_data(
+        obj, vertex_index_offset, mesh_cache, metadata, merged_objects, auto_smooth_value
+    )
+    obj_vertex_count = obj_data["vertex_count"]
 
-    # get the material
-    if obj.data.materials and obj.data.materials[0]:
-        material_name = obj.data.materials[0].name
+    # get the material - the slot of the object itself is used, linked duplicates may remap their material
+    if obj.material_slots and obj.material_slots[0].material:
+        material_name = metadata.get_material_name(obj.material_slots[0].material.name)
     else:
         material_name = "BML-Default"
 
@@ -50,41 +69,69 @@ def parse_mesh(
 
     vertex_size = 48  # since we only support v2 Primitives
 
-    obj_vertices_data = []
-    for obj_vertex in obj_vertices:
-        obj_vertices_data += obj_vertex.to_data()
-
     # DOF children use coordinates local to their DOF
-    if get_bml_type(obj.parent) == BlenderNodeType.DOF and obj.parent.dof_type != DofType.TRANSLATE.name:
+    is_dof_local = (
+        metadata.get_bml_type(obj.parent) == BlenderNodeType.DOF
+        and not metadata.is_dof_of_type(obj.parent, DofType.TRANSLATE)
+    )
+    if is_dof_local:
         reference_point = to_bms_coords((0, 0, 0))
     else:
-        reference_point = get_objcenter(obj)
+        reference_point = to_bms_coords(obj_data["center"])
 
-    node = Primitive(
-        index=len(nodes),
-        topology=PrimitiveTopology.TRIANGLE_LIST,
-        z_bias=0,
-        index_count=len(obj_indices),
-        start_index=0,
-        vertex_start_index=0,
-        vertex_start_offset=vertex_start_offset,
-        vertex_count=len(obj_vertices),
-        vertex_size=vertex_size,
-        reference_point=Vector3(
-            reference_point.x, reference_point.y, reference_point.z
-        ),
-        use_reference_point=1,
-        alpha_sort_triangles=0,
-        material_index=material_index,
-    )
+    # DOF children keep their reference point at the origin of the DOF, so they are never split
+    if is_dof_local or not is_clustering(cluster_max_triangles, cluster_max_size) or obj_vertex_count == 0:
+        chunks = [(obj_data["vertex_data"], obj_vertex_count, reference_point)]
+    else:
+        # the vertices are an unindexed triangle list in BMS space
+        vertex_array = np.frombuffer(obj_data["vertex_data"], dtype="<f4").reshape(-1, 12)
+        vertex_center = vertex_array[:, 0:3].mean(axis=0)
+        clusters = get_triangle_clusters(
+            vertex_array[:, 0:3].reshape(-1, 3, 3), cluster_max_triangles, cluster_max_size
+        )
+        if len(clusters) > 1:
+            print(f"split mesh {obj.name} into {len(clusters)} clusters")
+
+        chunks = []
+        for cluster in clusters:
+            chunk_array = vertex_array[(cluster[:, np.newaxis] * 3 + np.arange(3)).ravel()]
+            # each chunk is moved by the offset of its own center from the center of the whole mesh
+            chunk_offset = chunk_array[:, 0:3].mean(axis=0) - vertex_center
+            chunks.append(
+                (chunk_array.tobytes(), len(chunk_array), reference_point + Vector(chunk_offset.tolist()))
+            )
 
-    nodes.append(node)
-    vertex_indices += obj_indices
+    vertex_data = []
+    for chunk_data, chunk_vertex_count, chunk_reference_point in chunks:
+        node = Primitive(
+            index=len(nodes),
+            topology=PrimitiveTopology.TRIANGLE_LIST,
+            z_bias=0,
+            index_count=chunk_vertex_count,
+            start_index=0,
+            vertex_start_index=0,
+            vertex_start_offset=vertex_start_offset,
+            vertex_count=chunk_vertex_count,
+            vertex_size=vertex_size,
+            reference_point=Vector3(
+                chunk_reference_point.x, chunk_reference_point.y, chunk_reference_point.z
+            ),
+            use_reference_point=1,
+            alpha_sort_triangles=0,
+            material_index=material_index,
+        )
+
+        nodes.append(node)
+        vertex_data.append(chunk_data)
+        vertex_start_offset += chunk_vertex_count * vertex_size
+
+    # the chunks are stored one after another, so the indices of the unindexed triangle list stay the same
+    vertex_indices += obj_data["vertex_indices"]
 
     return ParsedNodes(
-        vertex_data=obj_vertices_data,
-        vertices_length=len(obj_vertices),
-        vertices_size=len(obj_vertices) * vertex_size,
+        vertex_data=vertex_data,
+        vertices_length=obj_vertex_count,
+        vertices_size=obj_vertex_count * vertex_size,
     )
 
 
@@ -95,18 +142,22 @@ def parse_bbl_light(
     material_names,
     vertex_index_offset,
     vertex_start_offset,
+    metadata: ExportMetadata = None,
 ):
     """Adds a PBR billboard light to the BML node list"""
     print(f"parsing PBR BB light {obj.name}")
 
+    if metadata is None:
+        metadata = ExportMetadata()
+
     # Prepare the mesh
     obj_data = get_pbr_light_data(obj, vertex_index_offset)
     obj_vertices = obj_data["vertices"]
     obj_indices = obj_data["vertex_indices"]
 
-    # get the material
-    if obj.data.materials and obj.data.materials[0]:
-        material_name = obj.data.materials[0].name
+    # get the material - equivalent materials are remapped like the materials of meshes
+    if obj.material_slots and obj.material_slots[0].material:
+        material_name = metadata.get_material_name(obj.material_slots[0].material.name)
     else:
         material_name = "BML-BillboardGlowLight"
 
@@ -151,7 +202,7 @@ def parse_bbl_light(
     )
 
 
-def parse_slot(obj, nodes):
+def parse_slot(obj, nodes, metadata: ExportMetadata):
     """Adds a BML Slot to the BML node list"""
     print(f"parsing Slot {obj.name}")
 
@@ -161,7 +212,7 @@ def parse_slot(obj, nodes):
     nodes.append(
         Slot(
             index=len(nodes),
-            slot_number=obj.bml_slot_number,
+            slot_number=metadata.get(obj).slot_number,
             rotation=D3DMatrix(rotation_matrix),
             origin=Vector3(location.x, location.y, location.z),
         )
@@ -170,22 +221,24 @@ def parse_slot(obj, nodes):
     return ParsedNodes(vertex_data=[], vertices_length=0, vertices_size=0)
 
 
-def parse_switch(obj, nodes):
+def parse_switch(obj, nodes, metadata: ExportMetadata):
     """Adds a BML Switch to the BML node list"""
     print(f"{obj.name} is a SWITCH")
-    switch = get_switches()[obj.switch_list_index]
+    object_metadata = metadata.get(obj)
+    switch_number, switch_branch = object_metadata.get_switch_number_and_branch()
     nodes.append(
-        Switch(len(nodes), switch.switch_number, switch.branch, obj.switch_default_on)
+        Switch(len(nodes), switch_number, switch_branch, object_metadata.switch_default_on)
     )
     return ParsedNodes(vertex_data=[], vertices_length=0, vertices_size=0)
 
 
-def parse_dof(obj, nodes):
+def parse_dof(obj, nodes, metadata: ExportMetadata):
     """Adds a BML DOF to the BML node list"""
     print(f"{obj.name} is a DOF")
     # add the DOF start node
 
-    dof = get_dofs()[obj.dof_list_index]
+    dof = metadata.get(obj)
+    dof_number = dof.get_dof_number()
 
     obj_orig_rotation_mode = obj.rotation_mode
     obj.rotation_mode = "QUATERNION"
@@ -194,26 +247,24 @@ def parse_dof(obj, nodes):
     scale = Vector3(0, 0, 0)
     rotation_matrix = Matrix()
     rotation_matrix = D3DMatrix(rotation_matrix.to_3x3())
-    dof_min = obj.dof_min_input
-    dof_max = obj.dof_max_input
+    dof_min = dof.dof_min_input
+    dof_max = dof.dof_max_input
 
     # Set the translation
     # For TDOFs, this is not the actual position of the DOF in 3d but the matrix coordinates which are
     # entered by the user. The TDOF always resides at (0,0,0)
-    if obj.dof_type == DofType.TRANSLATE.name:
+    if dof.dof_type == DofType.TRANSLATE:
         translation = Vector((obj.dof_x, obj.dof_y, obj.dof_z, 0.0))
         # calculate the objects translation in the space of its parent
         translation = obj.matrix_parent_inverse @ translation
 
     # Other DOFs need their position set relative to their parent
-    elif obj.dof_type == DofType.ROTATE.name or obj.dof_type == DofType.SCALE.name:
+    elif dof.dof_type == DofType.ROTATE or dof.dof_type == DofType.SCALE:
 
         # However if they are the child of a TDOF, we can not use that position - we have to find the first non-TDOF
         # parent.
-        if (obj.parent and
-                get_bml_type(obj.parent) == BlenderNodeType.DOF and
-                obj.parent.dof_type == DofType.TRANSLATE.name):
-            non_translate_dof_parent = get_non_translate_dof_parent(obj.parent)
+        if metadata.is_dof_of_type(obj.parent, DofType.TRANSLATE):
+            non_translate_dof_parent = metadata.get_non_translate_dof_parent(obj.parent)
             if non_translate_dof_parent:
                 # We have found such a parent, calculate the objects position in relation to that parent
                 translation = (obj.matrix_world - non_translate_dof_parent.matrix_world).translation
@@ -224,7 +275,7 @@ def parse_dof(obj, nodes):
         else:
             translation = obj.matrix_parent_inverse @ obj.location
 
-    if obj.dof_type == DofType.ROTATE.name:
+    if dof.dof_type == DofType.ROTATE:
         # calculate the objects rotation and translation in the space of its parent
         rotation_matrix = obj.rotation_quaternion.to_matrix()
         rotation_matrix = obj.matrix_parent_inverse @ rotation_matrix.to_4x4()
@@ -235,29 +286,21 @@ def parse_dof(obj, nodes):
         )
         rotation_matrix = D3DMatrix(rotation_matrix_bms)
 
-        dof_min = math.radians(obj.dof_min)
-        dof_max = math.radians(obj.dof_max)
+        dof_min = math.radians(dof.dof_min)
+        dof_max = math.radians(dof.dof_max)
 
-    elif obj.dof_type == DofType.SCALE.name:
+    elif dof.dof_type == DofType.SCALE:
         scale_vector = to_bms_coords(Vector((obj.dof_x, obj.dof_y, obj.dof_z)))
         scale = Vector3(scale_vector.x, scale_vector.y, scale_vector.z)
 
 
     translation = to_bms_coords(translation)
 
-    dof_flags = 0
-    if obj.dof_check_limits:
-        dof_flags |= 0x00000001
-    if obj.dof_reverse:
-        dof_flags |= 0x00000002
-    if obj.dof_normalise:
-        dof_flags |= 0x00000004
-
     # min/max, multiplier
-    if obj.dof_multiply_min_max:
+    if dof.dof_multiply_min_max:
         min_max_multiplier = 1
     else:
-        min_max_multiplier = 1 / obj.dof_multiplier
+        min_max_multiplier = 1 / dof.dof_multiplier
     dof_min *= min_max_multiplier
     dof_max *= min_max_multiplier
 
@@ -266,12 +309,12 @@ def parse_dof(obj, nodes):
     nodes.append(
         Dof(
             node_index=len(nodes),
-            dof_number=dof.dof_number,
-            dof_type=DofType[obj.dof_type],
+            dof_number=dof_number,
+            dof_type=dof.dof_type,
             min_z=dof_min,
             max_z=dof_max,
-            multiplier_z=obj.dof_multiplier,
-            flags_z=dof_flags,
+            multiplier_z=dof.dof_multiplier,
+            flags_z=dof.dof_flags,
             scale=scale,
             translation=Vector3(translation.x, translation.y, translation.z),
             rotation=rotation_matrix,
@@ -0,0 +1,46 @@
+import numpy as np
+
+
+def is_clustering(max_triangles, max_size):
+    """Clustering is disabled if neither limit is set"""
+    return max_triangles > 0 or max_size > 0
+
+
+def get_triangle_clusters(triangle_positions, max_triangles=0, max_size=0.0):
+    """Splits a triangle list into spatially compact clusters, so the engine can cull each of them on its own.
+    The triangles are recursively split at the median of their centroids along the longest axis until each cluster
+    has at most max_triangles triangles and the centroids of its triangles span at most max_size on each axis
+    (0 = no limit). The centroids are used so single large triangles do not end up in clusters of their own.
+    triangle_positions is an array of shape (triangles, 3, 3).
+    Returns a list of triangle index arrays in a stable, spatially coherent order."""
+    triangle_count = len(triangle_positions)
+    if triangle_count == 0 or not is_clustering(max_triangles, max_size):
+        return [np.arange(triangle_count)]
+
+    centroids = triangle_positions.mean(axis=1)
+
+    clusters = []
+    pending = [np.arange(triangle_count)]
+    while pending:
+        triangles = pending.pop()
+
+        triangle_centroids = centroids[triangles]
+        extent = triangle_centroids.max(axis=0) - triangle_centroids.min(axis=0)
+
+        too_many = max_triangles > 0 and len(triangles) > max_triangles
+        too_big = max_size > 0 and np.max(extent) > max_size
+
+        if len(triangles) <= 1 or not (too_many or too_big):
+            # keep the original order of the triangles within a cluster
+            clusters.append(np.sort(triangles))
+            continue
+
+        axis = np.argmax(extent)
+        order = np.argsort(triangle_centroids[:, axis], kind="stable")
+        median = len(triangles) // 2
+
+        # the lower half is processed first
+        pending.append(triangles[order[median:]])
+        pending.append(triangles[order[:median]])
+
+    return clusters
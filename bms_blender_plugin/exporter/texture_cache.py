@@ -0,0 +1,99 @@
+import json
+import os
+import shutil
+import tempfile
+import time
+
+from bms_blender_plugin.exporter.export_manifest import get_hash, get_image_fingerprint
+
+TEXTURE_CACHE_VERSION = 2
+TEXTURE_CACHE_INDEX_FILE_NAME = "index.json"
+
+
+def get_default_texture_cache_directory():
+    return os.path.join(tempfile.gettempdir(), "bml_texture_cache")
+
+
+def link_file(source_path, file_path):
+    """Puts a file at file_path which has the content of source_path, as a hard link if possible"""
+    if os.path.exists(file_path):
+        os.remove(file_path)
+    try:
+        os.link(source_path, file_path)
+    except OSError:
+        # e.g. the files are on different drives
+        shutil.copyfile(source_path, file_path)
+
+
+class TextureCache:
+    """Cache of encoded DDS files which is shared by all exports. A DDS file is found by the content of its image
+    (pixels or source file) and all encoder options, so unchanged textures are never encoded twice.
+    The cache is bounded in size, the least recently used files are evicted first."""
+
+    def __init__(self, cache_directory, max_size_mb):
+        self.cache_directory = cache_directory or get_default_texture_cache_directory()
+        self.max_size = max_size_mb * 1024 * 1024
+        self.index_path = os.path.join(self.cache_directory, TEXTURE_CACHE_INDEX_FILE_NAME)
+        self.entries = {}
+        self.hits = 0
+        self.misses = 0
+
+        os.makedirs(self.cache_directory, exist_ok=True)
+        if os.path.exists(self.index_path):
+            try:
+                with open(self.index_path, "r") as index_file:
+                    index = json.load(index_file)
+                if index.get("version") == TEXTURE_CACHE_VERSION:
+                    self.entries = index["entries"]
+            except (OSError, ValueError, KeyError):
+                print(f"Could not read {self.index_path}, starting with an empty texture cache")
+
+    def get_key(self, image, dds_format, *options):
+        return get_hash(repr((get_image_fingerprint(image), dds_format, options)))
+
+    def get_cache_path(self, key):
+        return os.path.join(self.cache_directory, key + ".dds")
+
+    def fetch(self, key, file_path):
+        """Puts the cached DDS file of a key at the file path. Returns False if the key is not cached."""
+        cache_path = self.get_cache_path(key)
+        if key not in self.entries or not os.path.exists(cache_path):
+            self.entries.pop(key, None)
+            self.misses += 1
+            return False
+
+        link_file(cache_path, file_path)
+
+        self.entries[key]["last_used"] = time.time()
+        self.hits += 1
+        return True
+
+    def store(self, key, file_path):
+        """Adds a freshly encoded DDS file to the cache"""
+        cache_path = self.get_cache_path(key)
+        temp_cache_path = cache_path + ".tmp"
+        shutil.copyfile(file_path, temp_cache_path)
+        os.replace(temp_cache_path, cache_path)
+        self.entries[key] = {"size": os.path.getsize(cache_path), "last_used": time.time()}
+
+    def evict(self):
+        """Removes the least recently used files until the cache fits into its size limit"""
+        cache_size = sum(entry["size"] for entry in self.entries.values())
+        for key in sorted(self.entries, key=lambda entry_key: self.entries[entry_key]["last_used"]):
+            if cache_size <= self.max_size:
+                break
+            cache_size -= self.entries.pop(key)["size"]
+            try:
+                os.remove(self.get_cache_path(key))
+            except OSError:
+                pass
+
+    def save(self):
+        self.evict()
+        temp_index_path = self.index_path + ".tmp"
+        with open(temp_index_path, "w") as index_file:
+            json.dump({"version": TEXTURE_CACHE_VERSION, "entries": self.entries}, index_file)
+        os.replace(temp_index_path, self.index_path)
+
+    def get_report(self):
+        return f"texture cache {self.hits} hits, {self.misses} misses"
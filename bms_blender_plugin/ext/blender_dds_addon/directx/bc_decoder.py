@@ -0,0 +1,416 @@
+"""DDS decoder written in NumPy.
+
+Notes:
+    - Decodes the top mip level of BC1-BC5, BC7 and 8 bit RGBA textures without texconv.
+    - All blocks of a texture are decoded at once, each step is vectorized over the blocks.
+    - Format reference:
+      https://learn.microsoft.com/en-us/windows/win32/direct3d11/bc7-format
+"""
+
+import numpy as np
+
+from .dxgi_format import DXGI_FORMAT
+
+# bytes of a compressed 4x4 block
+BLOCK_SIZES = {
+    "BC1": 8,
+    "BC2": 16,
+    "BC3": 16,
+    "BC4": 8,
+    "BC5": 16,
+    "BC7": 16,
+}
+
+UNCOMPRESSED_FORMATS = [
+    "R8G8B8A8_UNORM",
+    "R8G8B8A8_UNORM_SRGB",
+    "B8G8R8A8_UNORM",
+    "B8G8R8A8_UNORM_SRGB",
+    "B8G8R8X8_UNORM",
+    "B8G8R8X8_UNORM_SRGB",
+]
+
+# BC7 modes: subsets, partition bits, rotation bits, index selection bit, color bits, alpha bits,
+# endpoint p-bits, shared p-bits, index bits, secondary index bits
+BC7_MODES = [
+    (3, 4, 0, 0, 4, 0, 1, 0, 3, 0),
+    (2, 6, 0, 0, 6, 0, 0, 1, 3, 0),
+    (3, 6, 0, 0, 5, 0, 0, 0, 2, 0),
+    (2, 6, 0, 0, 7, 0, 1, 0, 2, 0),
+    (1, 0, 2, 1, 5, 6, 0, 0, 2, 3),
+    (1, 0, 2, 0, 7, 8, 0, 0, 2, 2),
+    (1, 0, 0, 0, 7, 7, 1, 0, 4, 0),
+    (2, 6, 0, 0, 5, 5, 1, 0, 2, 0),
+]
+
+BC7_WEIGHTS = {
+    2: np.array([0, 21, 43, 64]),
+    3: np.array([0, 9, 18, 27, 37, 46, 55, 64]),
+    4: np.array([0, 4, 9, 13, 17, 21, 26, 30, 34, 38, 43, 47, 51, 55, 60, 64]),
+}
+
+
+def _get_table(rows):
+    return np.array([[int(digit) for digit in row.replace(" ", "")] for row in rows])
+
+
+# subset of each pixel for the 64 partitions with 2 and 3 subsets
+BC7_PARTITIONS_2 = _get_table([
+    "0011 0011 0011 0011", "0001 0001 0001 0001", "0111 0111 0111 0111", "0001 0011 0011 0111",
+    "0000 0001 0001 0011", "0011 0111 0111 1111", "0001 0011 0111 1111", "0000 0001 0011 0111",
+    "0000 0000 0001 0011", "0011 0111 1111 1111", "0000 0001 0111 1111", "0000 0000 0001 0111",
+    "0001 0111 1111 1111", "0000 0000 1111 1111", "0000 1111 1111 1111", "0000 0000 0000 1111",
+    "0000 1000 1110 1111", "0111 0001 0000 0000", "0000 0000 1000 1110", "0111 0011 0001 0000",
+    "0011 0001 0000 0000", "0000 1000 1100 1110", "0000 0000 1000 1100", "0111 0011 0011 0001",
+    "0011 0001 0001 0000", "0000 1000 1000 1100", "0110 0110 0110 0110", "0011 0110 0110 1100",
+    "0001 0111 1110 1000", "0000 1111 1111 0000", "0111 0001 1000 1110", "0011 1001 1001 1100",
+    "0101 0101 0101 0101", "0000 1111 0000 1111", "0101 1010 0101 1010", "0011 0011 1100 1100",
+    "0011 1100 0011 1100", "0101 0101 1010 1010", "0110 1001 0110 1001", "0101 1010 1010 0101",
+    "0111 0011 1100 1110", "0001 0011 1100 1000", "0011 0010 0100 1100", "0011 1011 1101 1100",
+    "0110 1001 1001 0110", "0011 1100 1100 0011", "0110 0110 1001 1001", "0000 0110 0110 0000",
+    "0100 1110 0100 0000", "0010 0111 0010 0000", "0000 0010 0111 0010", "0000 0100 1110 0100",
+    "0110 1100 1001 0011", "0011 0110 1100 1001", "0110 0011 1001 1100", "0011 1001 1100 0110",
+    "0110 1100 1100 1001", "0110 0011 0011 1001", "0111 1110 1000 0001", "0001 1000 1110 0111",
+    "0000 1111 0011 0011", "0011 0011 1111 0000", "0010 0010 1110 1110", "0100 0100 0111 0111",
+])
+
+BC7_PARTITIONS_3 = _get_table([
+    "0011 0011 0221 2222", "0001 0011 2211 2221", "0000 2001 2211 2211", "0222 0022 0011 0111",
+    "0000 0000 1122 1122", "0011 0011 0022 0022", "0022 0022 1111 1111", "0011 0011 2211 2211",
+    "0000 0000 1111 2222", "0000 1111 1111 2222", "0000 1111 2222 2222", "0012 0012 0012 0012",
+    "0112 0112 0112 0112", "0122 0122 0122 0122", "0011 0112 1122 1222", "0011 2001 2200 2220",
+    "0001 0011 0112 1122", "0111 0011 2001 2200", "0000 1122 1122 1122", "0022 0022 0022 1111",
+    "0111 0111 0222 0222", "0001 0001 2221 2221", "0000 0011 0122 0122", "0000 1100 2210 2210",
+    "0122 0122 0011 0000", "0012 0012 1122 2222", "0110 1221 1221 0110", "0000 0110 1221 1221",
+    "0022 1102 1102 0022", "0110 0110 2002 2222", "0011 0122 0122 0011", "0000 2000 2211 2221",
+    "0000 0002 1122 1222", "0222 0022 0012 0011", "0011 0012 0022 0222", "0120 0120 0120 0120",
+    "0000 1111 2222 0000", "0120 1201 2012 0120", "0120 2012 1201 0120", "0011 2200 1122 0011",
+    "0011 1122 2200 0011", "0101 0101 2222 2222", "0000 0000 2121 2121", "0022 1122 0022 1122",
+    "0022 0011 0022 0011", "0220 1221 0220 1221", "0101 2222 2222 0101", "0000 2121 2121 2121",
+    "0101 0101 0101 2222", "0222 0111 0222 0111", "0002 1112 0002 1112", "0000 2112 2112 2112",
+    "0222 0111 0111 0222", "0002 1112 1112 0002", "0110 0110 0110 2222", "0000 0000 2112 2112",
+    "0110 0110 2222 2222", "0022 0011 0011 0022", "0022 1122 1122 0022", "0000 0000 0000 2112",
+    "0002 0001 0002 0001", "0222 1222 0222 1222", "0101 2222 2222 2222", "0111 2011 2201 2220",
+])
+
+# anchor pixel of the second subset of the partitions with 2 subsets
+BC7_ANCHORS_2 = np.array([
+    15, 15, 15, 15, 15, 15, 15, 15, 15, 15, 15, 15, 15, 15, 15, 15,
+    15, 2, 8, 2, 2, 8, 8, 15, 2, 8, 2, 2, 8, 8, 2, 2,
+    15, 15, 6, 8, 2, 8, 15, 15, 2, 8, 2, 2, 2, 15, 15, 6,
+    6, 2, 6, 8, 15, 15, 2, 2, 15, 15, 15, 15, 15, 2, 2, 15,
+])
+
+# anchor pixels of the second and third subset of the partitions with 3 subsets
+BC7_ANCHORS_3 = np.array([
+    (3, 15), (3, 8), (15, 8), (15, 3), (8, 15), (3, 15), (15, 3), (15, 8),
+    (8, 15), (8, 15), (6, 15), (6, 15), (6, 15), (5, 15), (3, 15), (3, 8),
+    (3, 15), (3, 8), (8, 15), (15, 3), (3, 15), (3, 8), (6, 15), (10, 8),
+    (5, 3), (8, 15), (8, 6), (6, 10), (8, 15), (5, 15), (15, 10), (15, 8),
+    (8, 15), (15, 3), (3, 15), (5, 10), (6, 10), (10, 8), (8, 9), (15, 10),
+    (15, 6), (3, 15), (15, 8), (5, 15), (15, 3), (15, 6), (15, 6), (15, 8),
+    (3, 15), (15, 3), (5, 15), (5, 15), (5, 15), (8, 15), (5, 15), (10, 15),
+    (5, 15), (10, 15), (8, 15), (13, 15), (15, 3), (12, 15), (3, 15), (3, 8),
+])
+
+
+def is_supported(dxgi_format: DXGI_FORMAT):
+    name = dxgi_format.name
+    return name in UNCOMPRESSED_FORMATS or (name[:3] in BLOCK_SIZES and "UNORM" in name)
+
+
+def get_data_size(dxgi_format: DXGI_FORMAT, width, height):
+    """Size of the top mip level in bytes."""
+    name = dxgi_format.name
+    if name in UNCOMPRESSED_FORMATS:
+        return width * height * 4
+    return ((width + 3) // 4) * ((height + 3) // 4) * BLOCK_SIZES[name[:3]]
+
+
+def _from_blocks(blocks, width, height):
+    """(blocks, 16, channels) in row-major block order to an image of shape (height, width, channels)."""
+    blocks_x = (width + 3) // 4
+    blocks_y = (height + 3) // 4
+    channels = blocks.shape[-1]
+    image = blocks.reshape(blocks_y, blocks_x, 4, 4, channels).swapaxes(1, 2)
+    return image.reshape(blocks_y * 4, blocks_x * 4, channels)[:height, :width]
+
+
+def _read_indices(data, bits_per_index, count):
+    """Little endian bit fields of fixed size, e.g. the color indices of BC1."""
+    value = np.zeros(len(data), dtype=np.uint64)
+    for byte_index in range(data.shape[1]):
+        value |= data[:, byte_index].astype(np.uint64) << np.uint64(8 * byte_index)
+    shifts = (bits_per_index * np.arange(count)).astype(np.uint64)
+    return ((value[:, np.newaxis] >> shifts) & np.uint64((1 << bits_per_index) - 1)).astype(np.int64)
+
+
+def decode_bc1_colors(data, four_color_mode=False):
+    """Decode the 8 byte color blocks of BC1-BC3.
+
+    Args:
+        data (numpy.ndarray): uint8 array of shape (blocks, 8)
+        four_color_mode (bool): BC2 and BC3 always use 4 colors
+
+    Returns:
+        numpy.ndarray: float32 array of shape (blocks, 16, 4) with values from 0 to 255
+    """
+    endpoints = data[:, 0:4].copy().view("<u2").astype(np.int64)
+    palette = np.zeros((len(data), 4, 4), dtype=np.float32)
+    for endpoint in range(2):
+        color = endpoints[:, endpoint]
+        r = (color >> 11) & 31
+        g = (color >> 5) & 63
+        b = color & 31
+        palette[:, endpoint, 0] = (r << 3) | (r >> 2)
+        palette[:, endpoint, 1] = (g << 2) | (g >> 4)
+        palette[:, endpoint, 2] = (b << 3) | (b >> 2)
+    palette[:, 0:2, 3] = 255
+
+    four_colors = (endpoints[:, 0] > endpoints[:, 1]) | four_color_mode
+    color0 = palette[:, 0]
+    color1 = palette[:, 1]
+    palette[:, 2] = np.where(four_colors[:, np.newaxis], (2 * color0 + color1) / 3, (color0 + color1) / 2)
+    # the 3 color mode has transparent black as fourth color
+    palette[:, 3] = np.where(four_colors[:, np.newaxis], (color0 + 2 * color1) / 3, 0)
+
+    indices = _read_indices(data[:, 4:8], 2, 16)
+    return np.take_along_axis(palette, indices[:, :, np.newaxis], axis=1)
+
+
+def decode_bc4_values(data):
+    """Decode the 8 byte single channel blocks of BC3-BC5.
+
+    Args:
+        data (numpy.ndarray): uint8 array of shape (blocks, 8)
+
+    Returns:
+        numpy.ndarray: float32 array of shape (blocks, 16) with values from 0 to 255
+    """
+    value0 = data[:, 0].astype(np.float32)
+    value1 = data[:, 1].astype(np.float32)
+    eight_values = (value0 > value1)[:, np.newaxis]
+
+    palette = np.empty((len(data), 8), dtype=np.float32)
+    palette[:, 0] = value0
+    palette[:, 1] = value1
+    for step in range(1, 7):
+        eight_value = ((7 - step) * value0 + step * value1) / 7
+        six_value = ((5 - step) * value0 + step * value1) / 5 if step < 5 else 255 * (step - 5)
+        palette[:, step + 1] = np.where(eight_values[:, 0], eight_value, six_value)
+
+    indices = _read_indices(data[:, 2:8], 3, 16)
+    return np.take_along_axis(palette, indices, axis=1)
+
+
+def _read_bits(bits, offset, count):
+    """Read a bit field of a BC7 block.
+
+    Args:
+        bits (numpy.ndarray): uint8 array of shape (blocks, 128) with one bit per element
+        offset (int): first bit
+        count (int): number of bits
+
+    Returns:
+        numpy.ndarray: int64 array of shape (blocks,)
+    """
+    if count == 0:
+        return np.zeros(len(bits), dtype=np.int64)
+    return bits[:, offset:offset + count].astype(np.int64) @ (1 << np.arange(count))
+
+
+def _read_index_bits(bits, offset, index_bits, anchors):
+    """Read the 16 indices of BC7 blocks. Anchor pixels are stored with one bit less.
+
+    Args:
+        bits (numpy.ndarray): uint8 array of shape (blocks, 128) with one bit per element
+        offset (int): first bit of the indices
+        index_bits (int): bits per index
+        anchors (numpy.ndarray): bool array of shape (blocks, 16)
+
+    Returns:
+        numpy.ndarray: int64 array of shape (blocks, 16)
+    """
+    lengths = np.where(anchors, index_bits - 1, index_bits)
+    starts = offset + np.cumsum(lengths, axis=1) - lengths
+    positions = np.minimum(starts[:, :, np.newaxis] + np.arange(index_bits), 127)
+    values = np.take_along_axis(bits, positions.reshape(len(bits), -1), axis=1).reshape(len(bits), 16, index_bits)
+    values = np.where(np.arange(index_bits) < lengths[:, :, np.newaxis], values, 0)
+    return values.astype(np.int64) @ (1 << np.arange(index_bits))
+
+
+def _expand_bits(values, bit_count):
+    """Expand values with less than 8 bits to 8 bits by replicating the upper bits."""
+    values = values << (8 - bit_count)
+    return values | (values >> bit_count)
+
+
+def decode_bc7(data):
+    """Decode BC7 blocks.
+
+    Args:
+        data (numpy.ndarray): uint8 array of shape (blocks, 16)
+
+    Returns:
+        numpy.ndarray: float32 array of shape (blocks, 16, 4) with values from 0 to 255
+    """
+    bits = np.unpackbits(data, axis=1, bitorder="little")
+    # the mode is the number of zero bits before the first set bit, blocks without set bit are invalid
+    modes = np.where(data[:, 0] == 0, 8, np.argmax(bits[:, :8], axis=1))
+    output = np.zeros((len(data), 16, 4), dtype=np.float32)
+
+    for mode, (
+        subsets, partition_bits, rotation_bits, index_selection_bits, color_bits, alpha_bits,
+        endpoint_pbits, shared_pbits, index_bits, secondary_index_bits,
+    ) in enumerate(BC7_MODES):
+        mode_blocks = np.nonzero(modes == mode)[0]
+        if len(mode_blocks) == 0:
+            continue
+        mode_bits = bits[mode_blocks]
+        block_count = len(mode_blocks)
+        offset = mode + 1
+
+        partitions = _read_bits(mode_bits, offset, partition_bits)
+        offset += partition_bits
+        rotations = _read_bits(mode_bits, offset, rotation_bits)
+        offset += rotation_bits
+        index_selections = _read_bits(mode_bits, offset, index_selection_bits)
+        offset += index_selection_bits
+
+        # endpoints are stored by channel: all reds, all greens, all blues, all alphas
+        endpoint_count = subsets * 2
+        endpoints = np.full((block_count, endpoint_count, 4), 255, dtype=np.int64)
+        for channel in range(4):
+            channel_bits = color_bits if channel < 3 else alpha_bits
+            if channel_bits == 0:
+                continue
+            for endpoint in range(endpoint_count):
+                endpoints[:, endpoint, channel] = _read_bits(mode_bits, offset, channel_bits)
+                offset += channel_bits
+
+        if endpoint_pbits or shared_pbits:
+            pbits = np.empty((block_count, endpoint_count), dtype=np.int64)
+            if endpoint_pbits:
+                for endpoint in range(endpoint_count):
+                    pbits[:, endpoint] = _read_bits(mode_bits, offset, 1)
+                    offset += 1
+            else:
+                for subset in range(subsets):
+                    pbits[:, subset * 2:subset * 2 + 2] = _read_bits(mode_bits, offset, 1)[:, np.newaxis]
+                    offset += 1
+            channels = 4 if alpha_bits else 3
+            endpoints[:, :, :channels] = (endpoints[:, :, :channels] << 1) | pbits[:, :, np.newaxis]
+            endpoints[:, :, :3] = _expand_bits(endpoints[:, :, :3], color_bits + 1)
+            if alpha_bits:
+                endpoints[:, :, 3] = _expand_bits(endpoints[:, :, 3], alpha_bits + 1)
+        else:
+            endpoints[:, :, :3] = _expand_bits(endpoints[:, :, :3], color_bits)
+            if alpha_bits:
+                endpoints[:, :, 3] = _expand_bits(endpoints[:, :, 3], alpha_bits)
+
+        # subset and anchor of each pixel
+        anchors = np.zeros((block_count, 16), dtype=bool)
+        anchors[:, 0] = True
+        if subsets == 2:
+            pixel_subsets = BC7_PARTITIONS_2[partitions]
+            anchors[np.arange(block_count), BC7_ANCHORS_2[partitions]] = True
+        elif subsets == 3:
+            pixel_subsets = BC7_PARTITIONS_3[partitions]
+            anchors[np.arange(block_count), BC7_ANCHORS_3[partitions, 0]] = True
+            anchors[np.arange(block_count), BC7_ANCHORS_3[partitions, 1]] = True
+        else:
+            pixel_subsets = np.zeros((block_count, 16), dtype=np.int64)
+
+        color_indices = _read_index_bits(mode_bits, offset, index_bits, anchors)
+        offset += 16 * index_bits - subsets
+        color_weights = BC7_WEIGHTS[index_bits][color_indices]
+        alpha_weights = color_weights
+
+        if secondary_index_bits:
+            secondary_anchors = np.zeros((block_count, 16), dtype=bool)
+            secondary_anchors[:, 0] = True
+            secondary_indices = _read_index_bits(mode_bits, offset, secondary_index_bits, secondary_anchors)
+            secondary_weights = BC7_WEIGHTS[secondary_index_bits][secondary_indices]
+            # by default the secondary indices are used for alpha, the index selection bit swaps them
+            swap = (index_selections == 1)[:, np.newaxis]
+            color_weights, alpha_weights = (
+                np.where(swap, secondary_weights, color_weights),
+                np.where(swap, color_weights, secondary_weights),
+            )
+
+        endpoint0 = np.take_along_axis(endpoints, (pixel_subsets * 2)[:, :, np.newaxis], axis=1)
+        endpoint1 = np.take_along_axis(endpoints, (pixel_subsets * 2 + 1)[:, :, np.newaxis], axis=1)
+        weights = np.concatenate([
+            np.repeat(color_weights[:, :, np.newaxis], 3, axis=2),
+            alpha_weights[:, :, np.newaxis],
+        ], axis=2)
+        pixels = ((64 - weights) * endpoint0 + weights * endpoint1 + 32) >> 6
+
+        # the rotation swaps alpha with one of the color channels
+        for rotation in range(1, 4):
+            rotated = rotations == rotation
+            pixels[rotated, :, rotation - 1], pixels[rotated, :, 3] = (
+                pixels[rotated, :, 3].copy(), pixels[rotated, :, rotation - 1].copy()
+            )
+
+        output[mode_blocks] = pixels
+
+    return output
+
+
+def decode(data, dxgi_format: DXGI_FORMAT, width, height, reconstruct_z=True, invert_normals=False):
+    """Decode the top mip level of a texture.
+
+    Args:
+        data (bytes): data of the texture, starting at the top mip level
+        dxgi_format (DXGI_FORMAT): format of the data
+        width (int): width of the top mip level
+        height (int): height of the top mip level
+        reconstruct_z (bool): Calculate the blue channel of BC5 normal maps.
+        invert_normals (bool): Flip y axis of BC5 normal maps.
+
+    Returns:
+        numpy.ndarray: float32 array of shape (height, width, 4) with values from 0 to 1, rows from top to bottom
+    """
+    name = dxgi_format.name
+    if not is_supported(dxgi_format):
+        raise RuntimeError(f"The built-in decoder does not support {name}.")
+
+    data = np.frombuffer(data, dtype=np.uint8, count=get_data_size(dxgi_format, width, height))
+
+    if name in UNCOMPRESSED_FORMATS:
+        pixels = data.reshape(height, width, 4).astype(np.float32)
+        if name.startswith("B8G8R8"):
+            pixels = pixels[:, :, [2, 1, 0, 3]]
+        if "X8" in name:
+            pixels[:, :, 3] = 255
+        return pixels / 255
+
+    blocks = data.reshape(-1, BLOCK_SIZES[name[:3]])
+    if name.startswith("BC1"):
+        pixels = decode_bc1_colors(blocks)
+    elif name.startswith("BC2"):
+        pixels = decode_bc1_colors(blocks[:, 8:16], four_color_mode=True)
+        pixels[:, :, 3] = _read_indices(blocks[:, 0:8], 4, 16) * 17
+    elif name.startswith("BC3"):
+        pixels = decode_bc1_colors(blocks[:, 8:16], four_color_mode=True)
+        pixels[:, :, 3] = decode_bc4_values(blocks[:, 0:8])
+    elif name.startswith("BC4"):
+        pixels = np.full((len(blocks), 16, 4), 255, dtype=np.float32)
+        pixels[:, :, 0:3] = decode_bc4_values(blocks)[:, :, np.newaxis]
+    elif name.startswith("BC5"):
+        pixels = np.full((len(blocks), 16, 4), 255, dtype=np.float32)
+        pixels[:, :, 0] = decode_bc4_values(blocks[:, 0:8])
+        pixels[:, :, 1] = decode_bc4_values(blocks[:, 8:16])
+        if invert_normals:
+            pixels[:, :, 1] = 255 - pixels[:, :, 1]
+        if reconstruct_z:
+            x = pixels[:, :, 0] / 127.5 - 1
+            y = pixels[:, :, 1] / 127.5 - 1
+            pixels[:, :, 2] = (np.sqrt(np.clip(1 - x * x - y * y, 0, 1)) + 1) * 127.5
+        else:
+            pixels[:, :, 2] = 0
+    else:
+        pixels = decode_bc7(blocks)
+
+    return _from_blocks(pixels, width, height) / 255
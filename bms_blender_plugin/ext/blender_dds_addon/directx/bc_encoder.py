@@ -0,0 +1,256 @@
+"""Block compression encoder written in NumPy.
+
+Notes:
+    - A fallback for platforms without the texconv DLL. It supports BC1, BC3, BC4 and BC5.
+    - Blocks are encoded in batches, each step is vectorized over all blocks of a batch.
+    - Format reference:
+      https://learn.microsoft.com/en-us/windows/win32/direct3d10/d3d10-graphics-programming-guide-resources-block-compression
+"""
+
+import numpy as np
+
+from .dds import DDS, DDS_CAPS, DDS_CAPS2, DDS_FLAGS, DDSHeader
+from .dxgi_format import DXGI_FORMAT
+
+# bytes of a compressed 4x4 block
+BLOCK_SIZES = {
+    "BC1_UNORM": 8,
+    "BC1_UNORM_SRGB": 8,
+    "BC3_UNORM": 16,
+    "BC3_UNORM_SRGB": 16,
+    "BC4_UNORM": 8,
+    "BC5_UNORM": 16,
+}
+
+# blocks which are encoded at the same time, bounds the size of the temporary arrays
+BATCH_SIZE = 65536
+
+# BC1 index -> weight of color0 (index 0: color0, 1: color1, 2 and 3: interpolated)
+BC1_WEIGHTS = np.array([1, 0, 2 / 3, 1 / 3], dtype=np.float32)
+BC1_POSITION_TO_INDEX = np.array([1, 3, 2, 0])
+
+
+def is_supported(dds_fmt):
+    return dds_fmt in BLOCK_SIZES
+
+
+def get_fallback_format(dds_fmt, has_alpha):
+    """Get the closest format which the encoder supports.
+
+    Args:
+        dds_fmt (string): requested DXGI format
+        has_alpha (bool): the texture is not fully opaque
+
+    Returns:
+        string: supported DXGI format or None
+    """
+    if is_supported(dds_fmt):
+        return dds_fmt
+    if dds_fmt in ["BC7_UNORM", "BC2_UNORM"]:
+        return "BC3_UNORM" if has_alpha else "BC1_UNORM"
+    if dds_fmt in ["BC7_UNORM_SRGB", "BC2_UNORM_SRGB"]:
+        return "BC3_UNORM_SRGB" if has_alpha else "BC1_UNORM_SRGB"
+    return None
+
+
+def get_blocks(pixels):
+    """Split an image into 4x4 blocks. The image is padded by repeating its last row and column.
+
+    Args:
+        pixels (numpy.ndarray): array of shape (height, width, channels)
+
+    Returns:
+        numpy.ndarray: array of shape (blocks, 16, channels) with the blocks in row-major order
+    """
+    height, width, channels = pixels.shape
+    padded_height = (height + 3) // 4 * 4
+    padded_width = (width + 3) // 4 * 4
+    if padded_height != height or padded_width != width:
+        pixels = np.pad(pixels, ((0, padded_height - height), (0, padded_width - width), (0, 0)), mode="edge")
+    blocks = pixels.reshape(padded_height // 4, 4, padded_width // 4, 4, channels).swapaxes(1, 2)
+    return blocks.reshape(-1, 16, channels)
+
+
+def _quantize_565(colors):
+    """Float RGB (0-255) to packed RGB565 and the color which it decodes to."""
+    r = np.rint(np.clip(colors[..., 0], 0, 255) * (31 / 255)).astype(np.uint16)
+    g = np.rint(np.clip(colors[..., 1], 0, 255) * (63 / 255)).astype(np.uint16)
+    b = np.rint(np.clip(colors[..., 2], 0, 255) * (31 / 255)).astype(np.uint16)
+    packed = (r << 11) | (g << 5) | b
+    decoded = np.stack([(r << 3) | (r >> 2), (g << 2) | (g >> 4), (b << 3) | (b >> 2)], axis=-1)
+    return packed, decoded.astype(np.float32)
+
+
+def _get_bc1_indices(colors, color0, color1):
+    """Nearest palette entry of each color, found by projecting it onto the line between the endpoints."""
+    direction = color0 - color1
+    length = np.sum(direction * direction, axis=1)
+    projection = np.einsum("nki,ni->nk", colors - color1[:, np.newaxis], direction)
+    # position on the line from color1 (0) to color0 (3), mapped to the index order of BC1
+    positions = np.clip(
+        np.rint(projection * 3 / np.where(length > 0, length, 1)[:, np.newaxis]), 0, 3
+    ).astype(np.int64)
+    return BC1_POSITION_TO_INDEX[positions]
+
+
+def _get_principal_axis(colors):
+    """Principal axis of the colors of each block by power iteration."""
+    centered = colors - colors.mean(axis=1, keepdims=True)
+    covariance = np.einsum("nki,nkj->nij", centered, centered)
+    # start at the diagonal of the bounding box
+    axis = colors.max(axis=1) - colors.min(axis=1)
+    for _ in range(8):
+        axis = np.einsum("nij,nj->ni", covariance, axis)
+        length = np.linalg.norm(axis, axis=1, keepdims=True)
+        axis = np.where(length > 0, axis / np.maximum(length, 1e-12), 0)
+    return axis
+
+
+def encode_bc1_blocks(colors):
+    """Encode BC1 color blocks (always opaque 4 color mode).
+
+    Args:
+        colors (numpy.ndarray): float32 array of shape (blocks, 16, 3) with values from 0 to 255
+
+    Returns:
+        numpy.ndarray: uint8 array of shape (blocks, 8)
+    """
+    # endpoints at the extremes of the principal axis
+    axis = _get_principal_axis(colors)
+    projection = np.einsum("nki,ni->nk", colors, axis)
+    block_range = np.arange(len(colors))
+    color0 = colors[block_range, np.argmax(projection, axis=1)]
+    color1 = colors[block_range, np.argmin(projection, axis=1)]
+
+    # refine the endpoints once by least squares with the assigned interpolation weights
+    _, decoded0 = _quantize_565(color0)
+    _, decoded1 = _quantize_565(color1)
+    weights = BC1_WEIGHTS[_get_bc1_indices(colors, decoded0, decoded1)]
+    inverse_weights = 1 - weights
+    aa = np.sum(weights * weights, axis=1)
+    ab = np.sum(weights * inverse_weights, axis=1)
+    bb = np.sum(inverse_weights * inverse_weights, axis=1)
+    ax = np.einsum("nk,nki->ni", weights, colors)
+    bx = np.einsum("nk,nki->ni", inverse_weights, colors)
+    determinant = aa * bb - ab * ab
+    solvable = np.abs(determinant) > 1e-6
+    solvable = solvable[:, np.newaxis]
+    safe_determinant = np.where(solvable, determinant[:, np.newaxis], 1)
+    color0 = np.where(solvable, (bb[:, np.newaxis] * ax - ab[:, np.newaxis] * bx) / safe_determinant, color0)
+    color1 = np.where(solvable, (aa[:, np.newaxis] * bx - ab[:, np.newaxis] * ax) / safe_determinant, color1)
+
+    packed0, decoded0 = _quantize_565(color0)
+    packed1, decoded1 = _quantize_565(color1)
+
+    # the 4 color mode needs color0 > color1
+    swap = packed0 < packed1
+    packed0, packed1 = np.where(swap, packed1, packed0), np.where(swap, packed0, packed1)
+    decoded0, decoded1 = (
+        np.where(swap[:, np.newaxis], decoded1, decoded0),
+        np.where(swap[:, np.newaxis], decoded0, decoded1),
+    )
+
+    indices = _get_bc1_indices(colors, decoded0, decoded1).astype(np.uint32)
+    # equal endpoints would switch to the 3 color mode - only use color0
+    indices[packed0 == packed1] = 0
+
+    index_bits = np.sum(indices << (2 * np.arange(16, dtype=np.uint32)), axis=1, dtype=np.uint32)
+
+    output = np.empty(len(colors), dtype=[("color0", "<u2"), ("color1", "<u2"), ("indices", "<u4")])
+    output["color0"] = packed0
+    output["color1"] = packed1
+    output["indices"] = index_bits
+    return output.view(np.uint8).reshape(-1, 8)
+
+
+def encode_bc4_blocks(values):
+    """Encode BC4 blocks of a single channel (8 value mode).
+
+    Args:
+        values (numpy.ndarray): float32 array of shape (blocks, 16) with values from 0 to 255
+
+    Returns:
+        numpy.ndarray: uint8 array of shape (blocks, 8)
+    """
+    value0 = np.rint(values.max(axis=1))
+    value1 = np.rint(values.min(axis=1))
+    value_range = value0 - value1
+
+    # position on the line from value1 (0) to value0 (7), mapped to the index order of BC4
+    positions = np.rint(
+        (values - value1[:, np.newaxis]) * 7 / np.where(value_range > 0, value_range, 1)[:, np.newaxis]
+    ).astype(np.int64)
+    indices = np.select([positions == 7, positions == 0], [0, 1], 8 - positions).astype(np.uint64)
+    indices[value_range == 0] = 0
+
+    index_bits = np.sum(indices << (3 * np.arange(16, dtype=np.uint64)), axis=1, dtype=np.uint64)
+
+    output = np.empty((len(values), 8), dtype=np.uint8)
+    output[:, 0] = value0
+    output[:, 1] = value1
+    output[:, 2:] = index_bits.astype("<u8").view(np.uint8).reshape(-1, 8)[:, :6]
+    return output
+
+
+def encode_blocks(blocks, dds_fmt):
+    """Encode 4x4 blocks.
+
+    Args:
+        blocks (numpy.ndarray): uint8 array of shape (blocks, 16, 4)
+        dds_fmt (string): DXGI format
+
+    Returns:
+        bytes: compressed blocks
+    """
+    encoded = []
+    for start in range(0, len(blocks), BATCH_SIZE):
+        batch = blocks[start:start + BATCH_SIZE].astype(np.float32)
+        if dds_fmt.startswith("BC1"):
+            encoded.append(encode_bc1_blocks(batch[:, :, :3]))
+        elif dds_fmt.startswith("BC3"):
+            encoded.append(np.concatenate([
+                encode_bc4_blocks(batch[:, :, 3]),
+                encode_bc1_blocks(batch[:, :, :3]),
+            ], axis=1))
+        elif dds_fmt.startswith("BC4"):
+            encoded.append(encode_bc4_blocks(batch[:, :, 0]))
+        elif dds_fmt.startswith("BC5"):
+            encoded.append(np.concatenate([
+                encode_bc4_blocks(batch[:, :, 0]),
+                encode_bc4_blocks(batch[:, :, 1]),
+            ], axis=1))
+        else:
+            raise RuntimeError(f"The built-in encoder does not support {dds_fmt}.")
+    return b"".join(batch_data.tobytes() for batch_data in encoded)
+
+
+def encode_dds(levels, dds_fmt):
+    """Encode the mip levels of an image as a block compressed DDS.
+
+    Args:
+        levels (list[numpy.ndarray]): uint8 arrays of shape (height, width, 4), rows from top to bottom,
+            e.g. from mipmaps.get_mip_chain
+        dds_fmt (string): DXGI format (BC1, BC3, BC4 or BC5)
+
+    Returns:
+        DDS: the encoded texture
+    """
+    if not is_supported(dds_fmt):
+        raise RuntimeError(f"The built-in encoder does not support {dds_fmt}.")
+
+    height, width = levels[0].shape[:2]
+    data = b"".join(encode_blocks(get_blocks(level), dds_fmt) for level in levels)
+
+    header = DDSHeader()
+    header.width = width
+    header.height = height
+    header.depth = 1
+    header.mipmap_num = len(levels)
+    header.dxgi_format = DXGI_FORMAT[dds_fmt]
+    header.flags = DDS_FLAGS.get_flags(True, False)
+    header.pitch_or_linear_size = ((width + 3) // 4) * ((height + 3) // 4) * BLOCK_SIZES[dds_fmt]
+    header.caps = DDS_CAPS.get_caps(len(levels) > 1, False)
+    header.caps2 = DDS_CAPS2.get_caps2(False, False)
+    header.dx10_header.update(header.dxgi_format, False, False, 1)
+
+    return DDS(header, [data])
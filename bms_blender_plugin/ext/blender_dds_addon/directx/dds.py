@@ -5,10 +5,13 @@ Notes:
       https://learn.microsoft.com/en-us/windows/win32/direct3ddds/dds-header
     - Official repo for DDS
       https://github.com/microsoft/DirectXTex
+    - DDS.load(file, mmap_mode=True) maps the file instead of reading it.
+      Slices and mips are views over the mapping, so only the pages which are accessed are loaded.
 """
 
 import ctypes as c
 from enum import IntEnum
+import mmap
 import os
 
 from . import util
@@ -435,22 +438,66 @@ class DDS:
     def __init__(self, header, slices=None):
         self.header = header
         self.slice_bin_list = slices
+        self.mapped_file = None
 
     @staticmethod
-    def load(file, verbose=False):
+    def load(file, verbose=False, mmap_mode=False):
+        """Load a dds file.
+
+        Args:
+            file (string): file path to .dds file
+            verbose (bool): unused
+            mmap_mode (bool): Map the file instead of reading it. The slices are memoryviews over the mapping,
+                which stay valid until close() is called.
+
+        Returns:
+            DDS: loaded texture
+        """
         with open(file, 'rb') as f:
             header = DDSHeader.read(f)
-            data_size = util.get_size(f) - f.tell()
+            data_offset = f.tell()
+            data_size = util.get_size(f) - data_offset
             num_slices = header.get_num_slices()
             slice_size = data_size // num_slices
-            slices = [f.read(slice_size) for i in range(num_slices)]
-        return DDS(header, slices)
+            if not mmap_mode:
+                slices = [f.read(slice_size) for i in range(num_slices)]
+                return DDS(header, slices)
+            mapped_file = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        data = memoryview(mapped_file)
+        slices = [data[data_offset + i * slice_size: data_offset + (i + 1) * slice_size] for i in range(num_slices)]
+        data.release()
+        dds = DDS(header, slices)
+        dds.mapped_file = mapped_file
+        return dds
+
+    def close(self):
+        """Release the mapping of a dds file which was loaded with mmap_mode.
+        Views of the mapping which are still alive (e.g. in the traceback of an exception) keep it open, it is then
+        unmapped by the garbage collector once they are gone."""
+        if self.mapped_file is None:
+            return
+        try:
+            for d in self.slice_bin_list:
+                d.release()
+            self.mapped_file.close()
+        except BufferError:
+            pass
+        self.slice_bin_list = None
+        self.mapped_file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
 
     def save(self, file):
         folder = os.path.dirname(file)
         if folder not in ['.', ''] and not os.path.exists(folder):
             util.mkdir(folder)
 
+        # slices are written one by one, mapped slices are copied from the mapping without loading the whole file
         with open(file, 'wb') as f:
             self.header.write(f)
             for d in self.slice_bin_list:
@@ -462,7 +509,39 @@ class DDS:
     def get_array_size(self):
         return self.header.get_array_size()
 
+    def get_mip_sizes(self):
+        """Get the size of each mip level of a slice in bytes."""
+        width = self.header.width
+        height = self.header.height
+        units = []
+        for i in range(self.header.mipmap_num):
+            mip_width = max(1, width >> i)
+            mip_height = max(1, height >> i)
+            if self.header.is_compressed():
+                units.append(((mip_width + 3) // 4) * ((mip_height + 3) // 4))
+            else:
+                units.append(mip_width * mip_height)
+        # bytes per block or pixel
+        unit_size = len(self.slice_bin_list[0]) // sum(units)
+        return [u * unit_size for u in units]
+
+    def get_mip(self, slice_index=0, mip_level=0):
+        """Get a mip level of a slice without copying it.
+
+        Args:
+            slice_index (int): index of the slice (array element, cubemap face or depth slice)
+            mip_level (int): 0 for the full size texture
+
+        Returns:
+            memoryview: data of the mip level
+        """
+        mip_sizes = self.get_mip_sizes()
+        offset = sum(mip_sizes[:mip_level])
+        return memoryview(self.slice_bin_list[slice_index])[offset: offset + mip_sizes[mip_level]]
+
     def get_disassembled_dds_list(self):
+        """Split a texture array or volume texture into 2D textures. They share the slices of this texture, so mapped
+        slices are not copied."""
         new_dds_num = self.header.depth * self.get_array_size()
         num_slices = 1 + (5 * self.is_cube())
         self.header.disassemble()
@@ -477,6 +556,8 @@ class DDS:
 
     @staticmethod
     def assemble(dds_list, is_array=True):
+        """Combine textures into a texture array or volume texture. The slices are not copied, textures which were
+        loaded with mmap_mode are streamed from their files when the result is saved."""
         header = dds_list[0].header
         header.assemble(is_array, len(dds_list))
         for dds in dds_list[1:]:
@@ -0,0 +1,159 @@
+"""Mipmap generator written in NumPy.
+
+Notes:
+    - Each level is downsampled from the previous one by a factor of 2 with a separable filter.
+    - Colors of sRGB textures are filtered in linear space, normal maps are renormalized on each level.
+    - Generated mip chains are cached by the hash of their pixels and options.
+"""
+
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+# filter weights of the 2x downsampling, ordered by the distance to the new pixel center
+# BOX: average of 2 pixels, LINEAR: tent over 4 pixels, CUBIC: Catmull-Rom over 8 pixels
+MIP_FILTERS = {
+    "BOX": np.array([1.0]),
+    "LINEAR": np.array([3.0, 1.0]),
+    "CUBIC": np.array([0.8671875, 0.2265625, -0.0703125, -0.0234375]),
+}
+
+# upper bound of the memory which is used by cached mip chains
+MIP_CACHE_SIZE = 512 * 1024 * 1024
+
+_mip_cache = OrderedDict()
+_mip_cache_size = 0
+_mip_cache_lock = threading.Lock()
+
+
+def srgb_to_linear(values):
+    return np.where(values <= 0.04045, values / 12.92, np.power((values + 0.055) / 1.055, 2.4))
+
+
+def linear_to_srgb(values):
+    values = np.clip(values, 0, 1)
+    return np.where(values <= 0.0031308, values * 12.92, 1.055 * np.power(values, 1 / 2.4) - 0.055)
+
+
+def get_mip_count(width, height):
+    """Number of levels of a full mip chain down to 1x1"""
+    return int(max(width, height)).bit_length()
+
+
+def _downsample_axis(pixels, axis, weights):
+    """Halve the size of an axis. The image is extended by repeating its edge pixels.
+
+    Args:
+        pixels (numpy.ndarray): float32 array of shape (height, width, channels)
+        axis (int): 0 for rows, 1 for columns
+        weights (numpy.ndarray): normalized filter weights of one side
+
+    Returns:
+        numpy.ndarray: float32 array with half the size on the axis (at least 1)
+    """
+    size = pixels.shape[axis]
+    if size == 1:
+        return pixels
+    new_size = size // 2
+    taps = len(weights)
+
+    pad = [(0, 0)] * pixels.ndim
+    pad[axis] = (taps - 1, taps - 1 + size % 2)
+    padded = np.pad(pixels, pad, mode="edge")
+
+    # the new pixel i is centered between the old pixels 2i and 2i + 1
+    output = None
+    for tap, weight in enumerate(weights):
+        for start in (taps - 1 - tap, taps + tap):
+            samples = padded.take(np.arange(start, start + 2 * new_size, 2), axis=axis)
+            output = samples * weight if output is None else output + samples * weight
+    return output.astype(np.float32)
+
+
+def _normalize_normals(pixels):
+    """Renormalize tangent space normals which are stored in the RGB channels from 0 to 1"""
+    normals = pixels[:, :, :3] * 2 - 1
+    length = np.linalg.norm(normals, axis=2, keepdims=True)
+    normals = np.where(length > 1e-6, normals / np.maximum(length, 1e-6), np.array([0, 0, 1], dtype=np.float32))
+    pixels[:, :, :3] = (normals + 1) / 2
+    return pixels
+
+
+def _generate_mip_chain(pixels, mip_filter, is_srgb, is_normal_map, mip_count):
+    weights = MIP_FILTERS[mip_filter]
+    weights = (weights / (2 * weights.sum())).astype(np.float32)
+
+    level = pixels.astype(np.float32) / 255
+    if is_srgb:
+        # lookup table of the 256 possible values instead of a power per pixel
+        lookup = srgb_to_linear(np.arange(256) / 255).astype(np.float32)
+        level[:, :, :3] = lookup[pixels[:, :, :3]]
+
+    levels = [pixels]
+    while len(levels) < mip_count:
+        level = _downsample_axis(level, 0, weights)
+        level = _downsample_axis(level, 1, weights)
+        output = level
+        if is_normal_map:
+            level = _normalize_normals(level)
+            output = level
+        if is_srgb:
+            output = level.copy()
+            output[:, :, :3] = linear_to_srgb(output[:, :, :3])
+        levels.append(np.rint(np.clip(output, 0, 1) * 255).astype(np.uint8))
+    return levels
+
+
+def get_mip_chain(pixels, mip_filter="LINEAR", is_srgb=False, is_normal_map=False, no_mip=False):
+    """Generate a full mip chain of an image.
+
+    Args:
+        pixels (numpy.ndarray): uint8 array of shape (height, width, channels)
+        mip_filter (string): BOX, LINEAR or CUBIC
+        is_srgb (bool): the color channels are sRGB encoded and filtered in linear space
+        is_normal_map (bool): the RGB channels are normals which are renormalized on each level
+        no_mip (bool): only return the top level
+
+    Returns:
+        list[numpy.ndarray]: all mip levels down to 1x1, the first level is the input
+    """
+    if mip_filter not in MIP_FILTERS:
+        raise RuntimeError(f"Unknown mip filter {mip_filter}. Use one of {', '.join(MIP_FILTERS)}.")
+
+    height, width = pixels.shape[:2]
+    mip_count = 1 if no_mip else get_mip_count(width, height)
+    if mip_count == 1:
+        return [pixels]
+
+    pixels = np.ascontiguousarray(pixels)
+    key_hash = hashlib.blake2b(pixels.data, digest_size=16)
+    key_hash.update(repr((pixels.shape, mip_filter, is_srgb, is_normal_map)).encode())
+    key = key_hash.hexdigest()
+
+    global _mip_cache_size
+    with _mip_cache_lock:
+        if key in _mip_cache:
+            _mip_cache.move_to_end(key)
+            return list(_mip_cache[key])
+
+    levels = _generate_mip_chain(pixels, mip_filter, is_srgb, is_normal_map, mip_count)
+
+    levels_size = sum(level.nbytes for level in levels)
+    if levels_size <= MIP_CACHE_SIZE:
+        with _mip_cache_lock:
+            if key not in _mip_cache:
+                _mip_cache[key] = levels
+                _mip_cache_size += levels_size
+            while _mip_cache_size > MIP_CACHE_SIZE:
+                _, evicted = _mip_cache.popitem(last=False)
+                _mip_cache_size -= sum(level.nbytes for level in evicted)
+    return list(levels)
+
+
+def clear_mip_cache():
+    global _mip_cache_size
+    with _mip_cache_lock:
+        _mip_cache.clear()
+        _mip_cache_size = 0
@@ -1,5 +1,5 @@
 import bpy
-from bpy.props import StringProperty, BoolProperty, EnumProperty, FloatProperty
+from bpy.props import StringProperty, BoolProperty, EnumProperty, FloatProperty, IntProperty
 from bpy.types import Operator
 
 from bms_blender_plugin.common.blender_types import BlenderNodeType
@@ -30,12 +30,35 @@ class ExporterPreferences(bpy.types.AddonPreferences):
         default=True,
     )
 
+    do_not_merge_equivalent_materials: BoolProperty(
+        name="Do not merge equivalent materials",
+        description="Does not merge materials with the same textures, flags, shader parameters, template, samplers "
+                    "and blend into one material",
+        default=False,
+    )
+
     copy_to_clipboard_command: StringProperty(
         name="Alternative 'Copy to Clipboard' command",
         description="Override command to copy text to the clipboard (especially useful on Linux)",
         default=""
     )
 
+    texture_cache_directory: StringProperty(
+        name="Texture cache path",
+        description="Folder in which encoded DDS textures are cached between exports (empty: temporary folder)",
+        default="",
+        maxlen=1024,
+        subtype="DIR_PATH",
+    )
+
+    texture_cache_size: IntProperty(
+        name="Texture cache size (MB)",
+        description="Maximum size of the texture cache, the least recently used textures are removed first "
+                    "(0: disable the cache)",
+        default=2048,
+        min=0,
+    )
+
     empty_enum_items = (
                         ("PLAIN_AXES", "Plain Axes", "Plain Axes"),
                         ("ARROWS", "Arrows", "Arrows"),
@@ -97,6 +120,12 @@ class ExporterPreferences(bpy.types.AddonPreferences):
         box.prop(self, "editor_path", expand=True)
         box.prop(self, "copy_to_clipboard_command", expand=True)
 
+        layout.separator()
+        layout.label(text="Texture Export")
+        box = layout.box()
+        box.prop(self, "texture_cache_directory")
+        box.prop(self, "texture_cache_size")
+
         layout.separator()
         layout.label(text="DOF Display")
         box = layout.box()
@@ -120,6 +149,7 @@ class ExporterPreferences(bpy.types.AddonPreferences):
         box = layout.box()
         box.prop(self, "do_not_delete_export_collection", expand=True)
         box.prop(self, "do_not_join_materials", expand=True)
+        box.prop(self, "do_not_merge_equivalent_materials", expand=True)
 
 
 class ApplyEmptyDisplaysToDofs(Operator):
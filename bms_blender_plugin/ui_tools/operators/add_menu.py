@@ -6,6 +6,7 @@ from bms_blender_plugin.ui_tools.operators.create_dof import CreateDof
 from bms_blender_plugin.ui_tools.operators.create_hotspot import CreateHotspot
 from bms_blender_plugin.ui_tools.operators.create_pbr_light import CreatePBRLight
 from bms_blender_plugin.ui_tools.operators.create_switch import CreateSwitch
+from bms_blender_plugin.ui_tools.operators.generate_hitboxes_operator import GenerateHitboxes
 from bms_blender_plugin.ui_tools.operators.slot_operators import CreateSlot
 
 
@@ -23,6 +24,7 @@ class AddBMLSubmenu(bpy.types.Menu):
         layout.operator(CreateHotspot.bl_idname, text="Hotspot", icon_value=Icons.hotspot_icon_id)
         layout.operator(CreateSlot.bl_idname, text="Slot", icon_value=Icons.slot_icon_id)
         layout.operator(CreateBoundingBox.bl_idname, text="Bounding Box", icon="META_CUBE")
+        layout.operator(GenerateHitboxes.bl_idname, text="Hitboxes", icon="MOD_EXPLODE")
 
 
 def menu_func(self, context):
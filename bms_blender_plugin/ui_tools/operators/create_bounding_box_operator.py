@@ -63,9 +63,6 @@ def add_box(width, height, depth):
 def group_bounding_box():
     min_x, min_y, min_z = (999999.0,) * 3
     max_x, max_y, max_z = (-999999.0,) * 3
-    location = [
-        0.0,
-    ] * 3
     for obj in bpy.context.visible_objects:
         # exclude eg camera, lights
         if obj.type != "MESH":
@@ -90,10 +87,21 @@ def group_bounding_box():
             if v_world[2] > max_z:
                 max_z = v_world[2]
 
+    return create_bounding_box_object((min_x, min_y, min_z), (max_x, max_y, max_z))
+
+
+def create_bounding_box_object(min_corner, max_corner, name="Bounding Box"):
+    """Adds an axis aligned BBOX object between two corners (world coordinates) to the active collection"""
+    min_x, min_y, min_z = min_corner
+    max_x, max_y, max_z = max_corner
+    location = [
+        0.0,
+    ] * 3
+
     verts_loc, faces = add_box(
         (max_x - min_x) / 2, (max_z - min_z) / 2, (max_y - min_y) / 2
     )
-    mesh = bpy.data.meshes.new("Bounding Box")
+    mesh = bpy.data.meshes.new(name)
     bm = bmesh.new()
     for v_co in verts_loc:
         bm.verts.new(v_co)
@@ -0,0 +1,136 @@
+import bpy
+import numpy as np
+from bpy.props import BoolProperty, IntProperty
+from bpy.types import Operator
+
+from bms_blender_plugin.common.blender_types import BlenderNodeType
+from bms_blender_plugin.common.bounding_volumes import (
+    cluster_points,
+    get_connected_components,
+    transform_points,
+)
+from bms_blender_plugin.common.util import get_bml_type
+from bms_blender_plugin.ui_tools.operators.create_bounding_box_operator import create_bounding_box_object
+
+
+def get_hitbox_objects(collection):
+    """Returns all mesh objects of a collection and its child collections which are exported as primitives.
+    Like the exporter, collections and objects which are hidden in renders are skipped."""
+    objects = {}
+
+    def _collect_objects(coll):
+        if coll.hide_render:
+            return
+
+        for obj in coll.objects:
+            if (
+                obj.type == "MESH" and obj.data and len(obj.data.vertices) > 0
+                and not obj.hide_render and get_bml_type(obj) is None
+            ):
+                objects[obj.name] = obj
+
+        for child in coll.children:
+            _collect_objects(child)
+
+    _collect_objects(collection)
+    return list(objects.values())
+
+
+def get_hitbox_geometry(objects, depsgraph):
+    """Returns the world coordinates of the vertices of all objects as a float64 array of shape (n, 3) and their
+    edges as an int array of shape (m, 2) with indices into the vertices. The evaluated meshes are used, so
+    modifiers (e.g. Mirror or Array) are taken into account."""
+    vertex_arrays = []
+    edge_arrays = []
+    vertex_offset = 0
+    for obj in objects:
+        evaluated_obj = obj.evaluated_get(depsgraph)
+        mesh = evaluated_obj.to_mesh()
+        try:
+            vertices = np.empty(len(mesh.vertices) * 3, dtype=np.float32)
+            mesh.vertices.foreach_get("co", vertices)
+            edges = np.empty(len(mesh.edges) * 2, dtype=np.int64)
+            mesh.edges.foreach_get("vertices", edges)
+        finally:
+            evaluated_obj.to_mesh_clear()
+
+        vertices = transform_points(vertices.reshape(-1, 3).astype(np.float64), evaluated_obj.matrix_world)
+
+        vertex_arrays.append(vertices)
+        edge_arrays.append(edges.reshape(-1, 2) + vertex_offset)
+        vertex_offset += len(vertices)
+
+    return np.concatenate(vertex_arrays), np.concatenate(edge_arrays)
+
+
+class GenerateHitboxes(Operator):
+    """Clusters the visible geometry of the active collection and creates a tight bounding box for each cluster.
+    The first bounding box encloses the whole model (it is used for the Parent.dat), the others are the hitboxes."""
+    bl_idname = "bml.generate_hitboxes"
+    bl_label = "Generate Hitboxes"
+    bl_description = "Creates bounding boxes around the parts of the visible geometry of the active collection"
+    bl_options = {"REGISTER", "UNDO"}
+
+    hitbox_count: IntProperty(
+        name="Hitboxes",
+        description="Maximum amount of hitboxes (e.g. fuselage, wings, rudder and radar)",
+        default=4,
+        min=1,
+        max=32,
+    )
+    replace_existing: BoolProperty(
+        name="Replace existing Bounding Boxes",
+        description="Deletes the Bounding Boxes of the active collection first",
+        default=False,
+    )
+
+    @classmethod
+    def poll(cls, context):
+        return context.collection is not None
+
+    def invoke(self, context, event):
+        return context.window_manager.invoke_props_dialog(self)
+
+    def execute(self, context):
+        # only the geometry which is exported as a primitive
+        objects = get_hitbox_objects(context.collection)
+        if not objects:
+            self.report({"ERROR"}, f"No visible geometry in {context.collection.name}")
+            return {"CANCELLED"}
+
+        points, edges = get_hitbox_geometry(objects, context.evaluated_depsgraph_get())
+        if len(points) == 0:
+            self.report({"ERROR"}, f"No visible geometry in {context.collection.name}")
+            return {"CANCELLED"}
+
+        labels = cluster_points(points, get_connected_components(len(points), edges), self.hitbox_count)
+
+        if self.replace_existing:
+            for obj in [
+                obj for obj in context.collection.all_objects if get_bml_type(obj) == BlenderNodeType.BBOX
+            ]:
+                bpy.data.objects.remove(obj, do_unlink=True)
+
+        bpy.ops.object.select_all(action="DESELECT")
+        bounding_boxes = [create_bounding_box_object(points.min(axis=0), points.max(axis=0))]
+        if labels.max() > 0:
+            for index in range(labels.max() + 1):
+                cluster = points[labels == index]
+                bounding_boxes.append(
+                    create_bounding_box_object(cluster.min(axis=0), cluster.max(axis=0), f"Hitbox {index + 1}")
+                )
+
+        for bounding_box in bounding_boxes:
+            bounding_box.select_set(True)
+        context.view_layer.objects.active = bounding_boxes[0]
+
+        self.report({"INFO"}, f"Created {len(bounding_boxes)} Bounding Boxes from {len(points)} vertices")
+        return {"FINISHED"}
+
+
+def register():
+    bpy.utils.register_class(GenerateHitboxes)
+
+
+def unregister():
+    bpy.utils.unregister_class(GenerateHitboxes)
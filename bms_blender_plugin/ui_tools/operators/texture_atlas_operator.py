@@ -0,0 +1,293 @@
+import bpy
+import numpy as np
+from bpy.props import IntProperty, StringProperty
+from bpy.types import Operator
+
+from bms_blender_plugin.common.blender_types import BlenderNodeTreeType
+from bms_blender_plugin.common.bml_material import Slot
+from bms_blender_plugin.common.image_pixels import get_image_pixels
+from bms_blender_plugin.common.import_dds import new_texture
+from bms_blender_plugin.common.texture_atlas import (
+    ATLAS_DEFAULT_COLORS,
+    AtlasTile,
+    build_atlas,
+    is_uv_range_atlas_compatible,
+    pack_tiles,
+)
+from bms_blender_plugin.exporter.export_materials import get_all_materials, get_material_content_key
+from bms_blender_plugin.nodes_editor import MaterialNode
+from bms_blender_plugin.nodes_editor.material_nodes.material_util import (
+    create_shader_nodes_for_material,
+    get_albedo_texture,
+    get_armw_texture,
+    get_emissive_texture,
+    get_normal_texture,
+    set_albedo_texture,
+    set_armw_texture,
+    set_emissive_texture,
+    set_normal_texture,
+)
+from bms_blender_plugin.nodes_editor.util import (
+    find_material_node_by_material,
+    get_bml_node_tree_type,
+    get_farthest_x_location,
+)
+
+# getter and setter of the Blender image and the name suffix of each texture slot
+ATLAS_SLOTS = {
+    Slot.ALBEDO: (get_albedo_texture, set_albedo_texture, "Albedo"),
+    Slot.ARMW: (get_armw_texture, set_armw_texture, "ARMW"),
+    Slot.NORMAL_MAP: (get_normal_texture, set_normal_texture, "Normal"),
+    Slot.EMISSIVE: (get_emissive_texture, set_emissive_texture, "Emissive"),
+}
+
+# properties of a material node which are the same for all materials of an atlas
+MATERIAL_NODE_PROPERTIES = [
+    "templates",
+    "template_file",
+    "template_material_name",
+    "cull",
+    "depth_bias",
+    "slope_scaled_depth_bias",
+    "shadow_caster",
+    "blend_enabled",
+    "blend_src",
+    "blend_dest",
+    "blend_op",
+    "blend_alpha_src",
+    "blend_alpha_dest",
+    "blend_alpha_op",
+]
+
+
+def get_material_node_tree():
+    for tree in bpy.data.node_groups.values():
+        if get_bml_node_tree_type(tree) == BlenderNodeTreeType.MATERIAL_TREE:
+            return tree
+    return None
+
+
+def get_active_uvs(mesh):
+    """Returns the UVs of the UV map which is exported as a float32 array of shape (loops, 2) or None"""
+    if mesh.uv_layers.active is None:
+        return None
+    uvs = np.empty(len(mesh.loops) * 2, dtype=np.float32)
+    mesh.uv_layers.active.data.foreach_get("uv", uvs)
+    return uvs.reshape(-1, 2)
+
+
+def get_atlas_groups(context, objects):
+    """Groups the materials of the objects by the atlas they can share: all their properties except the textures
+    must be equal, all textures must be Blender images and the UVs of their meshes must not repeat the textures.
+    Returns a list of material lists (only groups with at least 2 materials) and a list of messages why materials were
+    skipped."""
+    materials_in_file_map = {material.Name: material for material in get_all_materials()}
+    has_material_sets = len(context.scene.bml_material_sets) > 1
+
+    # only the first material slot is exported
+    objects_by_material = {}
+    for obj in objects:
+        if obj.type == "MESH" and obj.material_slots and obj.material_slots[0].material:
+            objects_by_material.setdefault(obj.material_slots[0].material, []).append(obj)
+
+    skipped_messages = []
+    groups = {}
+    for material, material_objects in sorted(objects_by_material.items(), key=lambda item: item[0].name):
+        bml_material = materials_in_file_map.get(material.name)
+        if not bml_material:
+            skipped_messages.append(f"{material.name} has no node in the Material Node Tree")
+            continue
+
+        if has_material_sets and material.bml_is_base_material:
+            skipped_messages.append(f"{material.name} is part of the Material Sets")
+            continue
+
+        texture_slots = [texture.Slot for texture in bml_material.Textures]
+        if not texture_slots:
+            skipped_messages.append(f"{material.name} has no textures")
+            continue
+        if any(not ATLAS_SLOTS[slot][0](material) for slot in texture_slots):
+            skipped_messages.append(f"{material.name} uses texture files which are not loaded in Blender")
+            continue
+
+        if any(
+            get_active_uvs(obj.data) is None or not is_uv_range_atlas_compatible(get_active_uvs(obj.data))
+            for obj in material_objects
+        ):
+            skipped_messages.append(f"{material.name} has objects without UVs or with repeated textures")
+            continue
+
+        groups.setdefault(get_material_content_key(bml_material, include_textures=False), []).append(material)
+
+    return [group for group in groups.values() if len(group) > 1], skipped_messages
+
+
+def create_atlas_material(material_node_tree, materials, atlas_name, padding, max_size):
+    """Packs the textures of the materials into atlas textures and creates a material (with its node in the Material
+    Node Tree) which uses them. Returns the material, the tile of each original material by name and the size of the
+    atlas or None if the textures do not fit into the maximum size."""
+    # each material gets a tile of the size of its biggest texture
+    tiles = []
+    for material in materials:
+        texture_sizes = [
+            tuple(get_texture(material).size)
+            for get_texture, _, _ in ATLAS_SLOTS.values()
+            if get_texture(material)
+        ]
+        tiles.append(AtlasTile(
+            material.name,
+            max(width for width, _ in texture_sizes),
+            max(height for _, height in texture_sizes),
+        ))
+
+    atlas_size = pack_tiles(tiles, padding, max_size)
+    if atlas_size is None:
+        return None
+    atlas_width, atlas_height = atlas_size
+
+    atlas_material = bpy.data.materials.new(atlas_name)
+    create_shader_nodes_for_material(atlas_material)
+
+    for slot, (get_texture, set_texture, suffix) in ATLAS_SLOTS.items():
+        textures = {material.name: get_texture(material) for material in materials}
+        if not any(textures.values()):
+            continue
+
+        tile_pixels = {
+            material_name: get_image_pixels(texture) if texture else None
+            for material_name, texture in textures.items()
+        }
+        atlas_pixels = build_atlas(
+            tiles, tile_pixels, atlas_width, atlas_height, padding, ATLAS_DEFAULT_COLORS[slot]
+        )
+
+        color_space = next(texture for texture in textures.values() if texture).colorspace_settings.name
+        # new_texture expects the rows from top to bottom
+        set_texture(atlas_material, new_texture(atlas_pixels[::-1], f"{atlas_name}_{suffix}", color_space))
+
+    # the node of the first material holds the properties which are shared by all of them
+    source_node = find_material_node_by_material(material_node_tree, materials[0])
+    material_node = material_node_tree.nodes.new(MaterialNode.__name__)
+    material_node.material = atlas_material
+    for property_name in MATERIAL_NODE_PROPERTIES:
+        setattr(material_node, property_name, getattr(source_node, property_name))
+
+    # Samplers and Shader Parameters
+    for socket_input in source_node.inputs:
+        for link in socket_input.links:
+            material_node_tree.links.new(link.from_socket, material_node.inputs[0])
+
+    material_node.location.x = get_farthest_x_location(material_node_tree) + 50 + material_node.width
+
+    return atlas_material, {tile.name: tile for tile in tiles}, atlas_size
+
+
+def remap_objects_to_atlas(objects_by_material, atlas_material, tiles, atlas_size):
+    """Moves the UVs of all objects into the tile of their material and replaces the material by the atlas"""
+    atlas_width, atlas_height = atlas_size
+    remapped_meshes = set()
+
+    for material_name, material_objects in objects_by_material.items():
+        tile = tiles[material_name]
+        for obj in material_objects:
+            # meshes which are shared with objects of other materials are copied first
+            if any(user.data == obj.data and user not in material_objects for user in bpy.data.objects):
+                obj.data = obj.data.copy()
+
+            if obj.data.name not in remapped_meshes:
+                remapped_meshes.add(obj.data.name)
+                uvs = tile.remap_uvs(get_active_uvs(obj.data), atlas_width, atlas_height)
+                obj.data.uv_layers.active.data.foreach_set("uv", uvs.ravel())
+                obj.data.update()
+
+            obj.material_slots[0].material = atlas_material
+
+
+class CreateTextureAtlas(Operator):
+    """Packs the textures of compatible materials of the selected objects into shared atlas textures. The UVs of their
+    meshes are moved into the atlas and the materials are replaced by a single atlas material, so the objects can be
+    merged into a single primitive."""
+    bl_idname = "bml.create_texture_atlas"
+    bl_label = "Create Texture Atlas"
+    bl_description = "Packs the textures of compatible materials of the selected objects into one atlas material"
+    bl_options = {"REGISTER", "UNDO"}
+
+    atlas_name: StringProperty(name="Name", default="Atlas")
+    padding: IntProperty(
+        name="Padding",
+        description="Pixels around each texture which repeat its edge, so neither filtering nor mipmaps bleed into "
+                    "the neighbouring textures",
+        default=8,
+        min=1,
+        max=64,
+    )
+    max_size: IntProperty(
+        name="Maximum size",
+        description="Maximum width and height of the atlas textures",
+        default=4096,
+        min=256,
+        max=16384,
+    )
+
+    @classmethod
+    def poll(cls, context):
+        return any(obj.type == "MESH" for obj in context.selected_objects)
+
+    def invoke(self, context, event):
+        return context.window_manager.invoke_props_dialog(self)
+
+    def execute(self, context):
+        material_node_tree = get_material_node_tree()
+        if not material_node_tree:
+            self.report({"ERROR"}, "No Material Node Tree found")
+            return {"CANCELLED"}
+
+        groups, skipped_messages = get_atlas_groups(context, context.selected_objects)
+        for message in skipped_messages:
+            print(f"Texture atlas: skipping {message}")
+
+        if not groups:
+            self.report({"WARNING"}, "No compatible materials found - see the console for details")
+            return {"CANCELLED"}
+
+        atlas_materials = []
+        atlased_material_count = 0
+        for materials in groups:
+            atlas = create_atlas_material(material_node_tree, materials, self.atlas_name, self.padding, self.max_size)
+            if not atlas:
+                self.report(
+                    {"WARNING"},
+                    f"The textures of {', '.join(material.name for material in materials)} do not fit into "
+                    f"{self.max_size}x{self.max_size}",
+                )
+                continue
+
+            objects_by_material = {material.name: [] for material in materials}
+            for obj in context.selected_objects:
+                if obj.type == "MESH" and obj.material_slots and obj.material_slots[0].material in materials:
+                    objects_by_material[obj.material_slots[0].material.name].append(obj)
+
+            atlas_material, tiles, atlas_size = atlas
+            remap_objects_to_atlas(objects_by_material, atlas_material, tiles, atlas_size)
+
+            print(f"Texture atlas {atlas_material.name}: {list(tiles.values())}")
+            atlas_materials.append(atlas_material)
+            atlased_material_count += len(materials)
+
+        if not atlas_materials:
+            return {"CANCELLED"}
+
+        self.report(
+            {"INFO"},
+            f"Created {len(atlas_materials)} texture atlas materials from "
+            f"{atlased_material_count} materials",
+        )
+        return {"FINISHED"}
+
+
+def register():
+    bpy.utils.register_class(CreateTextureAtlas)
+
+
+def unregister():
+    bpy.utils.unregister_class(CreateTextureAtlas)
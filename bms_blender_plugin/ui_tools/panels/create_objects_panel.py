@@ -11,6 +11,7 @@ from bms_blender_plugin.ui_tools.operators.create_hotspot import CreateHotspot
 from bms_blender_plugin.ui_tools.operators.create_pbr_light import CreatePBRLight
 from bms_blender_plugin.ui_tools.operators.create_switch import CreateSwitch
 from bms_blender_plugin.ui_tools.operators.create_bounding_box_operator import CreateBoundingBox
+from bms_blender_plugin.ui_tools.operators.generate_hitboxes_operator import GenerateHitboxes
 from bms_blender_plugin.ui_tools.operators.slot_operators import CreateSlot
 
 
@@ -34,6 +35,8 @@ class CreateObjectsPanel(BasePanel, bpy.types.Panel):
         row.operator(CreateSlot.bl_idname, text="Slot", icon_value=Icons.slot_icon_id)
         row = layout.row()
         row.operator(CreateBoundingBox.bl_idname, text="Bounding Box", icon="META_CUBE")
+        row = layout.row()
+        row.operator(GenerateHitboxes.bl_idname, text="Hitboxes", icon="MOD_EXPLODE")
 
 
 def register():
@@ -11,6 +11,21 @@ class LodListItem(bpy.types.PropertyGroup):
     file_suffix: bpy.props.StringProperty(name="Suffix")
     viewing_distance: bpy.props.IntProperty(name="Viewing Distance (ft)")
     collection: bpy.props.PointerProperty(name="Collection", type=bpy.types.Collection)
+    cluster_max_triangles: bpy.props.IntProperty(
+        name="Max Cluster Triangles",
+        description="Splits primitives into spatially compact clusters with at most this many triangles, so the "
+                    "engine can cull them separately (0 = no limit)",
+        default=0,
+        min=0,
+    )
+    cluster_max_size: bpy.props.FloatProperty(
+        name="Max Cluster Size",
+        description="Splits primitives into spatially compact clusters which are at most this large on each axis, so "
+                    "the engine can cull them separately (0 = no limit)",
+        default=0,
+        min=0,
+        subtype="DISTANCE",
+    )
 
 
 class LodList(UIList):
@@ -97,6 +112,11 @@ class LodPanel(BasePanel, bpy.types.Panel):
             layout.prop(selected_lod, "viewing_distance")
             layout.prop(selected_lod, "file_suffix")
 
+            box = layout.box()
+            box.label(text="Primitive Clustering")
+            box.prop(selected_lod, "cluster_max_triangles")
+            box.prop(selected_lod, "cluster_max_size")
+
         layout.separator()
         layout.row().operator(AddLod.bl_idname, icon="ADD")
 
@@ -257,9 +257,14 @@ def revert_to_base_material_set(context, start_collection):
                 for material_alternative in active_material_set.material_alternatives:
                     if (
                         material_alternative.alternative_material
-                        == obj.data.materials[0]
+                        == obj.material_slots[0].material
                     ):
-                        obj.data.materials[0] = material_alternative.base_material
+                        if obj.data.users > 1:
+                            # linked duplicate - only remap the material of this object, not of the shared mesh
+                            obj.material_slots[0].link = "OBJECT"
+                            obj.material_slots[0].material = material_alternative.base_material
+                        else:
+                            obj.data.materials[0] = material_alternative.base_material
 
         for child in collection.children:
             _revert_recursive(child)
@@ -4,6 +4,7 @@ import bpy
 
 from bms_blender_plugin.common.blender_types import BlenderNodeType
 from bms_blender_plugin.common.util import get_bml_type
+from bms_blender_plugin.exporter.merge_plan import get_cached_merge_plan
 from bms_blender_plugin.ui_tools.panels.base_panel import BasePanel
 
 
@@ -28,58 +29,13 @@ class StatisticsPanel(BasePanel, bpy.types.Panel):
         return "%.2f%s" % (number / k**magnitude, units[magnitude])
 
     @classmethod
-    def get_draw_calls(cls, collection):
-        materials = set()
-        unmerged_objects = 0
-        bbl_lights_present = False
-
-        def _parse_collection_recursive(coll):
-            nonlocal materials
-            nonlocal unmerged_objects
-            nonlocal bbl_lights_present
-
-            if coll.hide_render:
-                return
-
-            for obj in coll.objects:
-                if obj.hide_render:
-                    continue
-                if len(obj.material_slots) > 0:
-                    materials.add(obj.material_slots[0].name)
-                else:
-                    materials.add("Default Material")
-
-                if obj.bml_do_not_merge:
-                    unmerged_objects += 1
-                if get_bml_type(obj) == BlenderNodeType.PBR_LIGHT:
-                    bbl_lights_present = True
-                if get_bml_type(obj) == BlenderNodeType.DOF or get_bml_type(obj) == BlenderNodeType.SWITCH:
-                    unmerged_objects += 1
-
-            for child in coll.children:
-                _parse_collection_recursive(child)
-
-        _parse_collection_recursive(collection)
-
-        draw_calls = len(materials) + unmerged_objects
-        if bbl_lights_present:
-            draw_calls += 1
-
-        return draw_calls
+    def get_draw_calls(cls, context, collection):
+        """Each primitive of the MergePlan is a draw call"""
+        return get_cached_merge_plan(context, collection).primitive_count
 
     @classmethod
-    def get_triangles(cls, collection):
-        triangles = 0
-        if collection.hide_render:
-            return 0
-
-        for coll_obj in collection.objects:
-            triangles += cls.get_triangles_for_object_recursive(coll_obj)
-
-        for child in collection.children:
-            triangles += cls.get_triangles(child)
-
-        return triangles
+    def get_triangles(cls, context, collection):
+        return get_cached_merge_plan(context, collection).triangle_count
 
     @classmethod
     def get_triangles_for_object_recursive(cls, obj):
@@ -125,7 +81,7 @@ class StatisticsPanel(BasePanel, bpy.types.Panel):
         box = layout.box()
         row = box.row()
         col = row.column()
-        draw_calls = StatisticsPanel.get_draw_calls(active_collection)
+        draw_calls = StatisticsPanel.get_draw_calls(context, active_collection)
         col.label(text="Estimated draw calls")
         col = row.column()
         col.label(text=f"{draw_calls}")
@@ -133,7 +89,7 @@ class StatisticsPanel(BasePanel, bpy.types.Panel):
 
         col = row.column()
         vertices = StatisticsPanel.human_format(
-            StatisticsPanel.get_triangles(active_collection) * 3
+            StatisticsPanel.get_triangles(context, active_collection) * 3
         )
         col.label(text="Vertices")
         col = row.column()
@@ -8,6 +8,7 @@ from bpy.props import StringProperty
 from bms_blender_plugin.common.coordinates import to_bms_coords
 from bms_blender_plugin.ext.blender_dds_addon.directx import util
 from bms_blender_plugin.ui_tools.operators.dof_operators import ResetAllDofs
+from bms_blender_plugin.ui_tools.operators.texture_atlas_operator import CreateTextureAtlas
 from bms_blender_plugin.ui_tools.panels.base_panel import BasePanel
 
 
@@ -56,6 +57,7 @@ class ToolsPanel(BasePanel, bpy.types.Panel):
 
         layout.separator()
         layout.row().operator(ResetAllDofs.bl_idname, icon="LOOP_BACK")
+        layout.row().operator(CreateTextureAtlas.bl_idname, icon="TEXTURE")
 
 
 class CopyTextToClipboard(Operator):